@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'QuizWhiz_backend.settings')
+# Serve the read endpoints that have async versions natively, instead of through a thread per request
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
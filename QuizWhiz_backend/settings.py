@@ -20,13 +20,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
+# PRODUCTION=True switches to the production profile: DEBUG off and pooled database connections (the selfcheck
+# command reports the effective values). Each of these settings can still be overridden on its own.
+PRODUCTION = os.getenv('PRODUCTION', 'False') == 'True'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-_(o4(ju)bew@@i9-2j68(ys3l+b61!es_-ah#42-k(_*qb-u24'
+INSECURE_SECRET_KEY = 'django-insecure-_(o4(ju)bew@@i9-2j68(ys3l+b61!es_-ah#42-k(_*qb-u24'
+SECRET_KEY = os.getenv('SECRET_KEY') or INSECURE_SECRET_KEY
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DEBUG also keeps every SQL query of a request in memory
+DEBUG = os.getenv('DEBUG', str(not PRODUCTION)) == 'True'
 
-ALLOWED_HOSTS = ['*']
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '*').split(',')
 
 # Application definition
 
@@ -50,9 +56,12 @@ INSTALLED_APPS = [
     'rest_framework_swagger',
     'flashcards',
     'rest_framework_simplejwt.token_blacklist',
+    'profiling',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'profiling.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -131,8 +140,25 @@ DATABASES = {
     # }
 }
 
-# Test database setup
-if 'test' in sys.argv or 'test_coverage' in sys.argv:
+# Reuse database connections instead of paying a new Postgres connect on every request. The production default is a
+# psycopg connection pool per worker process, the only safe option under ASGI, where requests run on short-lived
+# threads. WSGI deployments can use persistent per-thread connections instead (DB_POOL=False, DB_CONN_MAX_AGE=600),
+# checked before reuse so a connection dropped by the server does not fail a request.
+if os.getenv('DB_POOL', str(PRODUCTION)) == 'True':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 0))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+# Test database setup. Tests run on an in-memory sqlite database unless TEST_DATABASE=postgres, which keeps the
+# Postgres settings above (Django creates a test_ database next to POSTGRES_DB) so the Postgres-only tests run too.
+if ('test' in sys.argv or 'test_coverage' in sys.argv) and os.getenv('TEST_DATABASE', 'sqlite') != 'postgres':
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': ':memory:',  # Use in-memory database for tests
@@ -156,6 +182,19 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Django's hashers, with PASSWORD_HASHER (any of them, e.g. ScryptPasswordHasher) moved first when set. Passwords
+# stored with another hasher are rehashed with the first one at their next login.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if os.getenv('PASSWORD_HASHER'):
+    PASSWORD_HASHER = f"django.contrib.auth.hashers.{os.getenv('PASSWORD_HASHER')}"
+    PASSWORD_HASHERS = [PASSWORD_HASHER] + [hasher for hasher in PASSWORD_HASHERS if hasher != PASSWORD_HASHER]
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -183,12 +222,28 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1)
 }
+# Rows of authenticated users kept in-process by users.cache
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+# Bloom filter in front of the refresh token blacklist, see users.blacklist
+TOKEN_BLACKLIST_SYNC_INTERVAL = int(os.getenv('TOKEN_BLACKLIST_SYNC_INTERVAL', 10))
+TOKEN_BLACKLIST_BLOOM_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_BLOOM_CAPACITY', 100000))
+TOKEN_BLACKLIST_BLOOM_ERROR_RATE = float(os.getenv('TOKEN_BLACKLIST_BLOOM_ERROR_RATE', 0.001))
+TOKEN_PRUNE_BATCH_SIZE = int(os.getenv('TOKEN_PRUNE_BATCH_SIZE', 1000))
+# Rows removed per transaction by the process_user_deletions command (see users.deletion)
+USER_DELETION_BATCH_SIZE = int(os.getenv('USER_DELETION_BATCH_SIZE', 1000))
+# Seconds a running deletion may go without progress before another worker takes it over
+USER_DELETION_STALE_AFTER = int(os.getenv('USER_DELETION_STALE_AFTER', 900))
 # REST FRAMEWORK SETTINGS
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.JWTClaimsAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': (
+        'lessons.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 SWAGGER_SETTINGS = {
@@ -202,4 +257,98 @@ SWAGGER_SETTINGS = {
             'in': 'header'
       }
    }
-}
\ No newline at end of file
+}
+
+# LOGIN SETTINGS
+# Password checks of the login endpoint run on this many threads per process (0 runs them in the request), with
+# at most LOGIN_HASH_QUEUE_SIZE waiting. Logins finding the queue full or waiting longer than LOGIN_HASH_TIMEOUT
+# seconds get a 503 (see users.hashing).
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', 2))
+LOGIN_HASH_QUEUE_SIZE = int(os.getenv('LOGIN_HASH_QUEUE_SIZE', 16))
+LOGIN_HASH_TIMEOUT = float(os.getenv('LOGIN_HASH_TIMEOUT', 5))
+# Token buckets of login attempts per client IP and per username: the burst allowed, then attempts per minute
+LOGIN_RATE_LIMIT_ENABLED = os.getenv('LOGIN_RATE_LIMIT_ENABLED', 'True') == 'True'
+LOGIN_IP_BURST = int(os.getenv('LOGIN_IP_BURST', 20))
+LOGIN_IP_PER_MINUTE = float(os.getenv('LOGIN_IP_PER_MINUTE', 10))
+LOGIN_USERNAME_BURST = int(os.getenv('LOGIN_USERNAME_BURST', 5))
+LOGIN_USERNAME_PER_MINUTE = float(os.getenv('LOGIN_USERNAME_PER_MINUTE', 2))
+
+if 'test' in sys.argv or 'test_coverage' in sys.argv:
+    # Hashing with MD5 keeps creating users in tests cheap. Checks run inline, as test data is not committed where a
+    # pool thread's connection could see it, and the suite logs in more often than the rate limits allow.
+    PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    LOGIN_HASH_WORKERS = 0
+    LOGIN_RATE_LIMIT_ENABLED = False
+
+# PAGINATION SETTINGS
+# Default and maximum number of lessons returned per page by the lesson listings
+LESSONS_PAGE_SIZE = int(os.getenv('LESSONS_PAGE_SIZE', 20))
+LESSONS_MAX_PAGE_SIZE = int(os.getenv('LESSONS_MAX_PAGE_SIZE', 100))
+# Number of flashcards embedded in each lesson of a listing with include=preview
+LESSON_PREVIEW_SIZE = int(os.getenv('LESSON_PREVIEW_SIZE', 3))
+
+# TOP CATEGORIES SETTINGS
+# Number of seconds the top categories leaderboard is cached in-process, and the largest n that can be requested
+TOP_CATEGORIES_CACHE_TTL = int(os.getenv('TOP_CATEGORIES_CACHE_TTL', 60))
+TOP_CATEGORIES_MAX = 50
+
+# COUNTER SETTINGS
+# Rows recounted per transaction by the reconcile_counters command (see lessons.counters)
+COUNTER_RECONCILE_BATCH_SIZE = int(os.getenv('COUNTER_RECONCILE_BATCH_SIZE', 1000))
+
+# FLASHCARD SETTINGS
+# Largest number of flashcards accepted by one call to the bulk endpoints
+FLASHCARD_BULK_MAX_ITEMS = int(os.getenv('FLASHCARD_BULK_MAX_ITEMS', 1000))
+# Position keys longer than this are respread by the rebalance_positions command and by appends that would hand one
+# out (see flashcards.positions). The command updates this many cards per query
+FLASHCARD_POSITION_REBALANCE_LENGTH = int(os.getenv('FLASHCARD_POSITION_REBALANCE_LENGTH', 32))
+FLASHCARD_POSITION_REBALANCE_BATCH_SIZE = int(os.getenv('FLASHCARD_POSITION_REBALANCE_BATCH_SIZE', 1000))
+# Default and maximum number of cards returned by the due cards queue
+REVIEW_QUEUE_SIZE = 20
+REVIEW_QUEUE_MAX_SIZE = 200
+# Default and maximum number of questions and of choices per question of a quiz
+QUIZ_SIZE = int(os.getenv('QUIZ_SIZE', 10))
+QUIZ_MAX_SIZE = int(os.getenv('QUIZ_MAX_SIZE', 100))
+QUIZ_CHOICES = int(os.getenv('QUIZ_CHOICES', 4))
+QUIZ_MAX_CHOICES = int(os.getenv('QUIZ_MAX_CHOICES', 6))
+# Number of lessons whose card id index is kept in memory by each server process (see flashcards.quiz)
+QUIZ_INDEX_SIZE = int(os.getenv('QUIZ_INDEX_SIZE', 1000))
+
+# CACHE SETTINGS
+# Rendered decks are cached in the 'decks' alias (see flashcards.deck_cache). The local memory default is per
+# process, point DECK_CACHE_BACKEND and DECK_CACHE_LOCATION at a shared cache (Redis, Memcached) when running several.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'decks': {
+        'BACKEND': os.getenv('DECK_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DECK_CACHE_LOCATION', 'decks'),
+        # Seconds a deck stays cached. Invalidation does not wait for it, but it bounds how long another process
+        # with its own local memory cache can serve a deck that was changed elsewhere
+        'TIMEOUT': int(os.getenv('DECK_CACHE_TTL', 60)),
+    },
+    # Login rate limit buckets (see users.ratelimit), to be shared by every process as well
+    'ratelimit': {
+        'BACKEND': os.getenv('RATELIMIT_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RATELIMIT_CACHE_LOCATION', 'ratelimit'),
+    },
+}
+
+# EXPORT SETTINGS
+# Number of rows fetched per round trip while streaming an export
+EXPORT_CHUNK_SIZE = 2000
+
+# IMPORT SETTINGS
+# Number of flashcards inserted and committed together while importing a deck
+IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+
+# PROFILING SETTINGS
+# Record query counts and database time per request (see profiling.middleware)
+QUERY_PROFILING_ENABLED = os.getenv('QUERY_PROFILING_ENABLED', 'False') == 'True'
+# Number of slowest statements kept per request and per endpoint
+QUERY_PROFILING_SLOWEST = 5
+
+# ASYNC SETTINGS
+# Route the hottest read endpoints to their async views (see lessons.async_views). asgi.py turns this on.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
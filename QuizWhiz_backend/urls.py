@@ -43,5 +43,6 @@ urlpatterns = [
     path('users/', include(users_urls)),
     path('lessons/', include(lessons_urls)),
     path('flashcards/', include('flashcards.urls')),
+    path('profiling/', include('profiling.urls')),
 ]
 
@@ -0,0 +1,66 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from flashcards.models import Flashcard
+from lessons import counters, leaderboard
+from lessons.models import Lesson
+from lessons.search import get_search_backend
+from users.models import User
+
+PASSWORD = 'benchmark-password'
+CATEGORIES = ['Math', 'History', 'Biology', 'Chemistry', 'Physics', 'Languages', 'Music', 'Programming',
+              'Geography', 'Art', 'Economics', 'Literature']
+WORDS = ['python', 'cell', 'atom', 'river', 'empire', 'verb', 'chord', 'matrix', 'enzyme', 'treaty', 'orbit',
+         'poem', 'market', 'glacier', 'vector', 'protein', 'sonata', 'canyon', 'theorem', 'dynasty']
+
+
+@transaction.atomic
+def seed(users=10, lessons_per_user=20, cards_per_lesson=30, public_ratio=0.7, random_seed=0, batch_size=2000):
+    """
+    Fill the database with generated users, lessons and flashcards using bulk inserts.
+
+    Every user gets PASSWORD (hashed once and shared, so seeding does not pay for one hash per user). The derived
+    tables and columns that bulk inserts bypass, the category counts, the search index and the lesson and card
+    counters, are rebuilt at the end.
+    """
+    rng = random.Random(random_seed)
+    password = make_password(PASSWORD)
+    start = User.objects.count()
+
+    created_users = User.objects.bulk_create(
+        [User(username=f'bench{start + i}', email=f'bench{start + i}@example.com', password=password)
+         for i in range(users)],
+        batch_size=batch_size,
+    )
+    lessons = Lesson.objects.bulk_create(
+        [Lesson(title=f'{" ".join(rng.sample(WORDS, 3)).title()} {i}',
+                description=' '.join(rng.sample(WORDS, 8)),
+                category=rng.choice(CATEGORIES),
+                created_by=user,
+                is_public=rng.random() < public_ratio)
+         for user in created_users for i in range(lessons_per_user)],
+        batch_size=batch_size,
+    )
+    flashcards = (
+        Flashcard(front_text=f'What is {rng.choice(WORDS)} #{i}?', back_text=' '.join(rng.sample(WORDS, 5)),
+                  lesson=lesson, created_by_id=lesson.created_by_id)
+        for lesson in lessons for i in range(cards_per_lesson)
+    )
+    batch = []
+    for flashcard in flashcards:
+        batch.append(flashcard)
+        if len(batch) == batch_size:
+            Flashcard.objects.bulk_create(batch)
+            batch = []
+    Flashcard.objects.bulk_create(batch)
+
+    leaderboard.rebuild()
+    get_search_backend().reindex_all()
+    counters.reconcile(batch_size=batch_size)
+    return {
+        'users': len(created_users),
+        'lessons': len(lessons),
+        'flashcards': len(lessons) * cards_per_lesson,
+    }
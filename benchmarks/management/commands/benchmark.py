@@ -0,0 +1,93 @@
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from benchmarks import datagen, runner
+from benchmarks.scenarios import SCENARIOS, BenchmarkContext
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and benchmark every lessons, flashcards and users endpoint, reporting '
+            'p50/p95/p99 latency, queries per request and peak allocations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users to seed')
+        parser.add_argument('--lessons-per-user', type=int, default=20, help='Number of lessons seeded per user')
+        parser.add_argument('--cards-per-lesson', type=int, default=30, help='Number of flashcards seeded per lesson')
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per endpoint')
+        parser.add_argument('--only', help='Only run the scenarios whose name contains this string')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', metavar='PATH', help='Show the change from a previous --output file')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        scenarios = [scenario for scenario in SCENARIOS if not options['only'] or options['only'] in scenario.name]
+        if not scenarios:
+            raise CommandError(f'No scenario matches {options["only"]!r}')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)['results']
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            volumes = datagen.seed(users=options['users'], lessons_per_user=options['lessons_per_user'],
+                                   cards_per_lesson=options['cards_per_lesson'])
+            self.stdout.write(f'Seeded {volumes["users"]} users, {volumes["lessons"]} lessons and '
+                              f'{volumes["flashcards"]} flashcards')
+            ctx = BenchmarkContext()
+            # Every timed login comes from the same client for the same user, so the rate limits would refuse most
+            with override_settings(LOGIN_RATE_LIMIT_ENABLED=False):
+                results = runner.run(scenarios, ctx, options['iterations'], options['warmup'], progress=self.report)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'git_commit': git_commit(),
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'volumes': volumes,
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+        if baseline is not None:
+            self.stdout.write('\nChange from baseline (%):')
+            for row in runner.compare(baseline, results):
+                changes = ' '.join(f'{metric} {"n/a" if row[metric] is None else f"{row[metric]:+.1f}":>7}'
+                                   for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request',
+                                                  'peak_alloc_kb'))
+                self.stdout.write(f'{row["name"]:<45} {changes}')
+
+    def report(self, result):
+        line = (f'{result["name"]:<45} p50 {result["p50_ms"]:>9.3f}ms p95 {result["p95_ms"]:>9.3f}ms '
+                f'p99 {result["p99_ms"]:>9.3f}ms {result["queries_per_request"]:>6} queries '
+                f'{result["peak_alloc_kb"]:>9.1f}KB')
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f'{line} {result["errors"]} errors'))
+        else:
+            self.stdout.write(line)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from time import perf_counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.runner import percentile
+
+
+async def _send(host, port, request, trickle=0.0):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        if trickle:
+            # A slow client: the request arrives a few bytes at a time
+            for i in range(0, len(request), 8):
+                writer.write(request[i:i + 8])
+                await writer.drain()
+                await asyncio.sleep(trickle)
+        else:
+            writer.write(request)
+            await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1]) if status_line else 0
+
+
+class Command(BaseCommand):
+    help = ('Measure throughput and latency of running servers under concurrent clients, e.g. the WSGI and the '
+            'ASGI deployment side by side, optionally while slow clients hold connections open')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                            help='Server to benchmark, e.g. wsgi=http://localhost:8000 (repeatable)')
+        parser.add_argument('--path', action='append', help='Path to request (repeatable, default /lessons/public)')
+        parser.add_argument('--token', help='Access token sent as a Bearer Authorization header')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path and target')
+        parser.add_argument('--slow-clients', type=int, default=0,
+                            help='Connections trickling their request in while the benchmark runs')
+        parser.add_argument('--slow-delay', type=float, default=0.5,
+                            help='Seconds slow clients wait between every 8 bytes they send')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency and --requests must be at least 1')
+        targets = []
+        for target in options['target']:
+            name, _, url = target.partition('=')
+            url = urlsplit(url)
+            if not name or url.scheme != 'http' or not url.hostname:
+                raise CommandError(f'Expected NAME=http://host:port, got {target!r}')
+            targets.append((name, url.hostname, url.port or 80))
+
+        results = []
+        for name, host, port in targets:
+            for path in options['path'] or ['/lessons/public']:
+                result = asyncio.run(self.run_target(host, port, path, options))
+                result = {'target': name, 'path': path, **result}
+                self.stdout.write(
+                    f'{name:<10} {path:<30} {result["requests_per_second"]:>9.1f} req/s  p50 {result["p50_ms"]:>9.3f}ms'
+                    f'  p95 {result["p95_ms"]:>9.3f}ms  p99 {result["p99_ms"]:>9.3f}ms  {result["errors"]} errors')
+                results.append(result)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'options': {key: options[key] for key in ('concurrency', 'requests', 'slow_clients',
+                                                                     'slow_delay')},
+                           'results': results}, f, indent=2)
+
+    async def run_target(self, host, port, path, options):
+        headers = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        if options['token']:
+            headers.append(f'Authorization: Bearer {options["token"]}')
+        request = ('\r\n'.join(headers) + '\r\n\r\n').encode()
+
+        done = asyncio.Event()
+
+        async def slow_client():
+            while not done.is_set():
+                try:
+                    await _send(host, port, request, trickle=options['slow_delay'])
+                except OSError:
+                    await asyncio.sleep(options['slow_delay'])
+
+        slow_clients = [asyncio.create_task(slow_client()) for _ in range(options['slow_clients'])]
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            async with semaphore:
+                start = perf_counter()
+                try:
+                    status = await _send(host, port, request)
+                except OSError:
+                    status = 0
+                latencies.append(perf_counter() - start)
+                if not 200 <= status < 400:
+                    errors += 1
+
+        start = perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['requests'])))
+        elapsed = perf_counter() - start
+        done.set()
+        for task in slow_clients:
+            task.cancel()
+        await asyncio.gather(*slow_clients, return_exceptions=True)
+
+        return {
+            'requests': options['requests'],
+            'errors': errors,
+            'requests_per_second': round(options['requests'] / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        }
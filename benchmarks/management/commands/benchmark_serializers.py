@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from benchmarks import datagen, serialization
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and compare the ModelSerializers with the .values() serializers used by '
+            'the list endpoints, on lists of --rows lessons, flashcards and users')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Number of rows in each list')
+        parser.add_argument('--iterations', type=int, default=5, help='Timed runs per list, the median is reported')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['iterations'] < 1:
+            raise CommandError('--rows and --iterations must be at least 1')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            datagen.seed(users=options['rows'], lessons_per_user=1, cards_per_lesson=1)
+            results = serialization.run(options['iterations'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        for result in results:
+            line = (f'{result["name"]:<12} {result["rows"]:>7} rows  ModelSerializer '
+                    f'{result["model_serializer_ms"]:>9.1f}ms  values {result["values_serializer_ms"]:>9.1f}ms  '
+                    f'{result["speedup"]:>5.1f}x')
+            if result['identical']:
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.ERROR(f'{line}  output differs'))
+        if not all(result['identical'] for result in results):
+            raise CommandError('The .values() serializers do not produce the same output')
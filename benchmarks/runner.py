@@ -0,0 +1,111 @@
+import math
+import statistics
+import tracemalloc
+from time import perf_counter
+
+from django.db import connection
+from rest_framework.test import APIClient
+
+from profiling.stats import QueryRecorder
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of a non-empty list
+    """
+    values = sorted(values)
+    return values[max(math.ceil(p / 100 * len(values)) - 1, 0)]
+
+
+def _request(client, scenario, ctx):
+    # Building the request may create the objects it consumes, so it happens before the clock starts
+    path = scenario.path(ctx)
+    data = scenario.data(ctx)
+    headers = {}
+    if scenario.user:
+        headers['HTTP_AUTHORIZATION'] = f'Bearer {ctx.tokens[scenario.user]}'
+    method = getattr(client, scenario.method.lower())
+
+    def send():
+        response = method(path, data, format=scenario.format, **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    return send
+
+
+def run_scenario(scenario, ctx, iterations=20, warmup=2):
+    """
+    Send scenario's request warmup + iterations times and return its latency percentiles, the average number of
+    queries per request and the peak memory allocated while serving it.
+
+    Allocations are measured on one extra request under tracemalloc, so tracing does not inflate the latencies.
+    """
+    client = APIClient()
+    latencies = []
+    queries = []
+    errors = 0
+    for i in range(warmup + iterations):
+        send = _request(client, scenario, ctx)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            start = perf_counter()
+            response = send()
+            elapsed = perf_counter() - start
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        queries.append(recorder.count)
+        if response.status_code >= 400:
+            errors += 1
+
+    send = _request(client, scenario, ctx)
+    tracemalloc.start()
+    try:
+        send()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': scenario.name,
+        'app': scenario.app,
+        'route': scenario.route,
+        'method': scenario.method,
+        'iterations': iterations,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'queries_per_request': round(statistics.fmean(queries), 2),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def run(scenarios, ctx, iterations=20, warmup=2, progress=None):
+    results = []
+    for scenario in scenarios:
+        result = run_scenario(scenario, ctx, iterations, warmup)
+        if progress:
+            progress(result)
+        results.append(result)
+    return results
+
+
+def compare(baseline, results):
+    """
+    Pair every result with the baseline run's result of the same name and return the relative change of each metric
+    """
+    previous = {result['name']: result for result in baseline}
+    rows = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        row = {'name': result['name']}
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'peak_alloc_kb'):
+            row[metric] = round((result[metric] - before[metric]) / before[metric] * 100, 1) if before[metric] else None
+        rows.append(row)
+    return rows
@@ -0,0 +1,161 @@
+import itertools
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from flashcards import quiz
+from flashcards.models import Flashcard, QuizSession
+from lessons.models import ImportJob, Lesson
+from users.models import User, UserDeletionJob
+from users.tokens import RefreshToken
+
+from .datagen import PASSWORD
+
+
+class BenchmarkContext:
+    """
+    Fixtures the scenarios point at: the first seeded user (the owner) with one of their public lessons and one of
+    its flashcards, plus a staff user. Scenarios that consume an object (deletes, logout, signup) get a fresh one
+    from the new_* helpers, which run outside the timed section.
+    """
+
+    def __init__(self):
+        self.owner = User.objects.filter(username__startswith='bench').order_by('id').first()
+        self.staff = User.objects.create_user(username='bench-staff', password=PASSWORD, is_staff=True)
+        self.lesson = Lesson.objects.filter(created_by=self.owner).order_by('id').first()
+        Lesson.objects.filter(id=self.lesson.id).update(is_public=True)
+        self.flashcard = Flashcard.objects.filter(lesson=self.lesson).order_by('id').first()
+        self.keyword = self.lesson.title.split()[0]
+        self.import_job = ImportJob.objects.create(lesson=self.lesson, created_by=self.owner, file_format='csv',
+                                                   chunk_size=1000, status=ImportJob.COMPLETED)
+        self.deletion_job = UserDeletionJob.objects.create(user_id=0, username='bench-deleted')
+        self.tokens = {
+            'owner': str(RefreshToken.for_user(self.owner).access_token),
+            'staff': str(RefreshToken.for_user(self.staff).access_token),
+        }
+        self.refresh_token = str(RefreshToken.for_user(self.owner))
+        self.counter = itertools.count()
+
+    def new_lesson(self):
+        return Lesson.objects.create(title='Scratch', category='Scratch', created_by=self.owner)
+
+    def new_flashcards(self, count=1):
+        return Flashcard.objects.bulk_create(
+            Flashcard(front_text='Scratch', back_text='Scratch', lesson=self.lesson, created_by=self.owner)
+            for _ in range(count)
+        )
+
+    def new_quiz(self):
+        questions = quiz.generate(self.lesson.id, settings.QUIZ_SIZE, settings.QUIZ_CHOICES)
+        # Kept for the data of the same scenario, which is built right after its path
+        self.quiz_session = QuizSession.objects.create(user=self.owner, lesson=self.lesson, questions=[
+            [question['flashcard'], question['answer']] for question in questions])
+        return self.quiz_session
+
+    def new_user(self):
+        return User.objects.create_user(username=f'bench-scratch-{next(self.counter)}', password=PASSWORD)
+
+    def new_username(self):
+        return f'bench-signup-{next(self.counter)}'
+
+
+def _cards(count):
+    return [{'front_text': f'Question {i}', 'back_text': f'Answer {i}'} for i in range(count)]
+
+
+@dataclass
+class Scenario:
+    """
+    One request to benchmark. `route` is the pattern as written in `app`'s urls.py, `path` and `data` build the
+    actual request from the context, and `user` names the token to authenticate with (None for anonymous).
+    """
+    app: str
+    route: str
+    method: str
+    path: Callable[[BenchmarkContext], str]
+    data: Callable[[BenchmarkContext], Optional[dict]] = field(default=lambda ctx: None)
+    user: Optional[str] = None
+    format: str = 'json'
+
+    @property
+    def name(self):
+        return f'{self.method} /{self.app}/{self.route}'
+
+
+SCENARIOS = [
+    # lessons/urls.py
+    Scenario('lessons', '', 'GET', lambda ctx: '/lessons/', user='staff'),
+    Scenario('lessons', 'id/<int:id>', 'GET', lambda ctx: f'/lessons/id/{ctx.lesson.id}'),
+    Scenario('lessons', 'public', 'GET', lambda ctx: '/lessons/public'),
+    Scenario('lessons', 'user/<int:user_id>', 'GET', lambda ctx: f'/lessons/user/{ctx.owner.id}', user='owner'),
+    Scenario('lessons', 'category/<str:category>', 'GET', lambda ctx: f'/lessons/category/{ctx.lesson.category}'),
+    Scenario('lessons', 'keywords/<str:keywords>', 'GET', lambda ctx: f'/lessons/keywords/{ctx.keyword}'),
+    Scenario('lessons', 'new', 'POST', lambda ctx: '/lessons/new', user='owner',
+             data=lambda ctx: {'title': 'New', 'description': 'New', 'category': 'Scratch'}),
+    Scenario('lessons', 'update', 'PATCH', lambda ctx: '/lessons/update', user='owner',
+             data=lambda ctx: {'lesson_id': ctx.lesson.id, 'description': 'Updated', 'is_public': True}),
+    Scenario('lessons', 'delete', 'DELETE', lambda ctx: '/lessons/delete', user='owner',
+             data=lambda ctx: {'lesson_id': ctx.new_lesson().id}),
+    Scenario('lessons', 'fork', 'POST', lambda ctx: '/lessons/fork', user='staff',
+             data=lambda ctx: {'lesson_id': ctx.lesson.id}),
+    Scenario('lessons', 'top-categories', 'GET', lambda ctx: '/lessons/top-categories'),
+    Scenario('lessons', 'export', 'GET', lambda ctx: '/lessons/export', user='owner'),
+    Scenario('lessons', 'import', 'POST', lambda ctx: '/lessons/import', user='owner', format='multipart',
+             data=lambda ctx: {'file': SimpleUploadedFile('deck.csv', b'Q,A\n' * 100), 'title': 'Imported',
+                               'category': 'Scratch'}),
+    Scenario('lessons', 'import/<int:job_id>', 'GET', lambda ctx: f'/lessons/import/{ctx.import_job.id}',
+             user='owner'),
+
+    # flashcards/urls.py
+    Scenario('flashcards', '<int:id>/', 'GET', lambda ctx: f'/flashcards/{ctx.flashcard.id}/'),
+    Scenario('flashcards', '<int:id>/', 'PUT', lambda ctx: f'/flashcards/{ctx.flashcard.id}/', user='owner',
+             data=lambda ctx: {'back_text': 'Updated'}),
+    Scenario('flashcards', '<int:id>/', 'DELETE', lambda ctx: f'/flashcards/{ctx.new_flashcards()[0].id}/',
+             user='owner'),
+    Scenario('flashcards', '', 'POST', lambda ctx: '/flashcards/', user='owner',
+             data=lambda ctx: {'front_text': 'Q', 'back_text': 'A', 'lesson': ctx.lesson.id,
+                               'created_by': ctx.owner.id}),
+    Scenario('flashcards', 'public/', 'GET', lambda ctx: '/flashcards/public/'),
+    Scenario('flashcards', 'by-lesson/<int:id>/', 'GET', lambda ctx: f'/flashcards/by-lesson/{ctx.lesson.id}/'),
+    Scenario('flashcards', 'bulk/', 'POST', lambda ctx: '/flashcards/bulk/', user='owner',
+             data=lambda ctx: {'lesson': ctx.lesson.id, 'cards': _cards(100)}),
+    Scenario('flashcards', 'bulk/', 'PATCH', lambda ctx: '/flashcards/bulk/', user='owner',
+             data=lambda ctx: {'lesson': ctx.lesson.id, 'cards': [{'id': ctx.flashcard.id, 'back_text': 'Bulk'}]}),
+    Scenario('flashcards', 'bulk/', 'DELETE', lambda ctx: '/flashcards/bulk/', user='owner',
+             data=lambda ctx: {'lesson': ctx.lesson.id, 'ids': [card.id for card in ctx.new_flashcards(100)]}),
+    Scenario('flashcards', '<int:id>/review/', 'POST', lambda ctx: f'/flashcards/{ctx.flashcard.id}/review/',
+             user='owner', data=lambda ctx: {'quality': 4}),
+    Scenario('flashcards', '<int:id>/move/', 'POST', lambda ctx: f'/flashcards/{ctx.flashcard.id}/move/',
+             user='owner', data=lambda ctx: {'after': ctx.new_flashcards()[0].id}),
+    Scenario('flashcards', 'due/', 'GET', lambda ctx: '/flashcards/due/', user='owner'),
+    Scenario('flashcards', 'cache-stats/', 'GET', lambda ctx: '/flashcards/cache-stats/', user='staff'),
+    Scenario('flashcards', 'by-lesson/<int:id>/quiz/', 'POST',
+             lambda ctx: f'/flashcards/by-lesson/{ctx.lesson.id}/quiz/', user='owner', data=lambda ctx: {}),
+    Scenario('flashcards', 'quiz/<int:id>/answers/', 'POST',
+             lambda ctx: f'/flashcards/quiz/{ctx.new_quiz().id}/answers/', user='owner',
+             data=lambda ctx: {'answers': [0] * len(ctx.quiz_session.questions)}),
+    Scenario('flashcards', 'attempts/', 'POST', lambda ctx: '/flashcards/attempts/', user='owner',
+             data=lambda ctx: {'attempts': [{'flashcard': ctx.flashcard.id, 'correct': i % 3 > 0,
+                                             'response_time_ms': 1500} for i in range(20)]}),
+    Scenario('flashcards', 'stats/', 'GET', lambda ctx: '/flashcards/stats/', user='owner'),
+
+    # users/urls.py
+    Scenario('users', '', 'GET', lambda ctx: '/users/', user='owner'),
+    Scenario('users', 'list', 'GET', lambda ctx: '/users/list', user='staff'),
+    Scenario('users', 'login', 'POST', lambda ctx: '/users/login',
+             data=lambda ctx: {'username': ctx.owner.username, 'password': PASSWORD}),
+    Scenario('users', 'logout', 'POST', lambda ctx: '/users/logout', user='owner',
+             data=lambda ctx: {'refresh': str(RefreshToken.for_user(ctx.owner))}),
+    Scenario('users', 'refresh', 'POST', lambda ctx: '/users/refresh',
+             data=lambda ctx: {'refresh': ctx.refresh_token}),
+    Scenario('users', 'signup', 'POST', lambda ctx: '/users/signup',
+             data=lambda ctx: {'username': ctx.new_username(), 'password': PASSWORD, 'email': 'new@example.com'}),
+    Scenario('users', 'update', 'PATCH', lambda ctx: '/users/update', user='owner',
+             data=lambda ctx: {'bio': 'Updated bio'}),
+    Scenario('users', 'delete', 'DELETE', lambda ctx: '/users/delete', user='staff',
+             data=lambda ctx: {'user_id': ctx.new_user().id}),
+    Scenario('users', 'delete/<int:job_id>', 'GET', lambda ctx: f'/users/delete/{ctx.deletion_job.id}', user='staff'),
+    Scenario('users', 'user/<int:user_id>', 'GET', lambda ctx: f'/users/user/{ctx.owner.id}', user='owner'),
+]
@@ -0,0 +1,57 @@
+import statistics
+from time import perf_counter
+
+from rest_framework.renderers import JSONRenderer
+
+from flashcards.models import Flashcard
+from flashcards.serializers import FlashcardSerializer, flashcard_values_serializer
+from lessons.models import Lesson
+from lessons.renderers import render_json
+from lessons.serializers import LessonSerializer, lesson_values_serializer
+from users.models import User
+from users.serializers import UserSerializer, user_values_serializer
+
+# (name, queryset, ModelSerializer, its ValuesSerializer)
+LISTS = [
+    ('lessons', lambda: Lesson.objects.order_by('id'), LessonSerializer, lesson_values_serializer),
+    ('flashcards', lambda: Flashcard.objects.order_by('id'), FlashcardSerializer, flashcard_values_serializer),
+    ('users', lambda: User.objects.order_by('id'), UserSerializer, user_values_serializer),
+]
+
+
+def model_serializer_body(queryset, serializer_class):
+    return JSONRenderer().render(serializer_class(queryset, many=True).data)
+
+
+def values_serializer_body(queryset, values_serializer):
+    return render_json(values_serializer.serialize(values_serializer.values(queryset)))
+
+
+def _median_ms(build, iterations):
+    timings = []
+    body = None
+    for _ in range(iterations):
+        start = perf_counter()
+        body = build()
+        timings.append((perf_counter() - start) * 1000)
+    return statistics.median(timings), body
+
+
+def run(iterations=5):
+    """
+    Time loading, serializing and rendering every row of each list both ways and check the bodies are identical
+    """
+    results = []
+    for name, queryset, serializer_class, values_serializer in LISTS:
+        model_ms, model_body = _median_ms(lambda: model_serializer_body(queryset(), serializer_class), iterations)
+        values_ms, values_body = _median_ms(lambda: values_serializer_body(queryset(), values_serializer),
+                                            iterations)
+        results.append({
+            'name': name,
+            'rows': queryset().count(),
+            'model_serializer_ms': round(model_ms, 3),
+            'values_serializer_ms': round(values_ms, 3),
+            'speedup': round(model_ms / values_ms, 2) if values_ms else None,
+            'identical': model_body == values_body,
+        })
+    return results
@@ -0,0 +1,66 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import LiveServerTestCase, TestCase
+from django.urls import URLPattern
+
+from flashcards import urls as flashcard_urls
+from flashcards.models import Flashcard
+from lessons import urls as lesson_urls
+from lessons.models import CategoryCount, Lesson
+from users import urls as user_urls
+
+from . import datagen, runner, serialization
+from .scenarios import SCENARIOS, BenchmarkContext
+
+
+class ScenarioCoverageTest(TestCase):
+    def test_every_route_has_a_scenario(self):
+        covered = {(scenario.app, scenario.route) for scenario in SCENARIOS}
+        for app, module in (('lessons', lesson_urls), ('flashcards', flashcard_urls), ('users', user_urls)):
+            for pattern in module.urlpatterns:
+                if isinstance(pattern, URLPattern):
+                    self.assertIn((app, str(pattern.pattern)), covered)
+
+
+class BenchmarkRunTest(TestCase):
+    def test_seed(self):
+        volumes = datagen.seed(users=2, lessons_per_user=3, cards_per_lesson=4)
+        self.assertEqual(volumes, {'users': 2, 'lessons': 6, 'flashcards': 24})
+        self.assertEqual(Lesson.objects.count(), 6)
+        self.assertEqual(Flashcard.objects.count(), 24)
+        self.assertEqual(sum(CategoryCount.objects.values_list('lesson_count', flat=True)), 6)
+
+    def test_every_scenario_succeeds(self):
+        datagen.seed(users=2, lessons_per_user=3, cards_per_lesson=4)
+        results = runner.run(SCENARIOS, BenchmarkContext(), iterations=2, warmup=0)
+
+        for result in results:
+            self.assertEqual(result['errors'], 0, result['name'])
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['peak_alloc_kb'], 0)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(runner.percentile(values, 50), 50)
+        self.assertEqual(runner.percentile(values, 99), 99)
+        self.assertEqual(runner.percentile([7], 95), 7)
+
+
+class SerializationBenchmarkTest(TestCase):
+    def test_values_serializers_match_model_serializers(self):
+        datagen.seed(users=20, lessons_per_user=1, cards_per_lesson=1)
+        results = serialization.run(iterations=1)
+        self.assertEqual([result['name'] for result in results], ['lessons', 'flashcards', 'users'])
+        for result in results:
+            self.assertEqual(result['rows'], 20)
+            self.assertTrue(result['identical'], result['name'])
+
+
+class ConcurrencyBenchmarkTest(LiveServerTestCase):
+    def test_benchmark_live_server(self):
+        output = StringIO()
+        call_command('benchmark_concurrency', target=[f'live={self.live_server_url}'], concurrency=4, requests=8,
+                     slow_clients=1, slow_delay=0.01, stdout=output)
+        self.assertIn('req/s', output.getvalue())
+        self.assertIn(' 0 errors', output.getvalue())
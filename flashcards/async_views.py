@@ -0,0 +1,11 @@
+"""
+Async twins of read views in views.py, routed instead of them under ASGI (see lessons.async_views)
+"""
+from users.async_api import async_api_view
+
+from . import deck_cache
+
+
+@async_api_view()
+async def flashcards_by_lesson(request, id):
+    return deck_cache.deck_response(request, await deck_cache.aget_deck(id))
@@ -0,0 +1,157 @@
+"""
+Cache of rendered decks (the by-lesson flashcard list), so studying a popular lesson is served without a query or a
+serializer pass.
+
+Entries live in the 'decks' cache alias and hold the response body as JSON bytes together with its ETag and
+Last-Modified, so conditional requests are answered from the cache as well. Every lesson has a version token stored
+next to its entry, and an entry is only served while its version is still the current one. invalidate() drops the
+version, so an entry built from data read before a write can never be served after it, even if it is stored late.
+
+The signal receivers in signals.py invalidate a lesson whenever one of its cards is saved or deleted, its cards are
+written in bulk (deck_changed) or its visibility changes. With the default local memory backend every server process
+has its own cache and only sees its own invalidations, so multi process deployments should point DECK_CACHE_BACKEND
+at a shared backend such as Redis or Memcached.
+"""
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from lessons.conditional import row_validators, set_validator_headers
+from lessons.models import Lesson
+from lessons.renderers import render_json
+
+from .models import Flashcard
+from .serializers import flashcard_values_serializer
+
+ALIAS = 'decks'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def deck_validators(id):
+    # Adding or editing a card moves the latest update, deleting one changes the count
+    return Lesson.objects.filter(id=id).values('id').annotate(cards=Count('flashcards'),
+                                                              last_modified=Max('flashcards__updated_at'))
+
+
+def _deck_rows(lesson_id):
+    return flashcard_values_serializer.values(Flashcard.objects.filter(lesson=lesson_id).order_by('position', 'id'))
+
+
+def _keys(lesson_id):
+    return f'deck-version:{lesson_id}', f'deck:{lesson_id}'
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _entry(version, row, flashcards):
+    etag, last_modified = row_validators(row) if row else (None, None)
+    body = render_json(flashcard_values_serializer.serialize(flashcards))
+    return {'version': version, 'body': body, 'etag': etag, 'last_modified': last_modified}
+
+
+def get_deck(lesson_id):
+    """
+    Return the cache entry of a lesson's deck, building and storing it on a miss
+    """
+    cache = caches[ALIAS]
+    version_key, key = _keys(lesson_id)
+    cached = cache.get_many([version_key, key])
+    version, entry = cached.get(version_key), cached.get(key)
+    if version is not None and entry is not None and entry['version'] == version:
+        _count('hits')
+        return entry
+
+    _count('misses')
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex)
+        version = cache.get(version_key)
+    entry = _entry(version, deck_validators(lesson_id).first(),
+                   _deck_rows(lesson_id))
+    cache.set(key, entry)
+    return entry
+
+
+async def aget_deck(lesson_id):
+    """
+    Async get_deck()
+    """
+    cache = caches[ALIAS]
+    version_key, key = _keys(lesson_id)
+    cached = await cache.aget_many([version_key, key])
+    version, entry = cached.get(version_key), cached.get(key)
+    if version is not None and entry is not None and entry['version'] == version:
+        _count('hits')
+        return entry
+
+    _count('misses')
+    if version is None:
+        await cache.aadd(version_key, uuid.uuid4().hex)
+        version = await cache.aget(version_key)
+    entry = _entry(version, await deck_validators(lesson_id).afirst(),
+                   [row async for row in _deck_rows(lesson_id)])
+    await cache.aset(key, entry)
+    return entry
+
+
+def version(lesson_id):
+    """
+    The current version token of a lesson's deck, which changes whenever the deck is invalidated. Other in-process
+    caches derived from a deck (see flashcards.quiz) tag their entries with it.
+    """
+    cache = caches[ALIAS]
+    version_key, _ = _keys(lesson_id)
+    current = cache.get(version_key)
+    if current is None:
+        cache.add(version_key, uuid.uuid4().hex)
+        current = cache.get(version_key)
+    return current
+
+
+def deck_response(request, entry):
+    """
+    The response for a deck entry: 304 Not Modified if the client's copy is current, the cached body otherwise
+    """
+    response = None
+    if entry['etag']:
+        response = get_conditional_response(request, etag=entry['etag'], last_modified=entry['last_modified'])
+    if response is None:
+        response = HttpResponse(entry['body'], content_type='application/json')
+    return set_validator_headers(response, entry['etag'], entry['last_modified'])
+
+
+def _invalidate(lesson_id):
+    caches[ALIAS].delete_many(_keys(lesson_id))
+
+
+def invalidate(lesson_id):
+    """
+    Drop a lesson's deck now and once more when the current transaction commits, so a reader that rebuilt the entry
+    from the old rows in between does not keep serving them
+    """
+    _count('invalidations')
+    _invalidate(lesson_id)
+    transaction.on_commit(lambda: _invalidate(lesson_id))
+
+
+def stats():
+    with _lock:
+        snapshot = dict(_stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_rate'] = round(snapshot['hits'] / lookups, 4) if lookups else None
+    return snapshot
+
+
+def reset_stats():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
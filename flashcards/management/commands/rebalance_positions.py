@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flashcards import rebalance
+
+
+class Command(BaseCommand):
+    help = ('Respread the position keys of every lesson with a key longer than FLASHCARD_POSITION_REBALANCE_LENGTH, '
+            'one lesson per transaction, keeping the order of the cards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.FLASHCARD_POSITION_REBALANCE_BATCH_SIZE,
+                            help='Cards updated per query')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        lessons = 0
+        for lesson_id in list(rebalance.lessons_to_rebalance()):
+            cards = rebalance.rebalance(lesson_id, options['batch_size'])
+            lessons += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Lesson {lesson_id}: {cards} cards')
+        self.stdout.write(self.style.SUCCESS(f'Rebalanced {lessons} lessons'))
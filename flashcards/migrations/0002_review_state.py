@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease', models.FloatField(default=2.5)),
+                ('interval', models.PositiveIntegerField(default=0)),
+                ('repetitions', models.PositiveIntegerField(default=0)),
+                ('due_at', models.DateTimeField()),
+                ('last_reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('flashcard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to='flashcards.flashcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_at'], name='review_state_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'flashcard'), name='unique_review_state')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0002_review_state'),
+        ('lessons', '0006_listing_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Create the composite index before dropping the plain foreign key index it replaces
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['lesson', 'id'], name='flashcard_lesson_idx'),
+        ),
+        migrations.AlterField(
+            model_name='flashcard',
+            name='lesson',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='flashcards', to='lessons.lesson'),
+        ),
+    ]
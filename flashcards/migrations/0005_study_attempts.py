@@ -0,0 +1,49 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0004_quiz_session'),
+        ('lessons', '0007_lesson_card_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LessonStudyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct', models.PositiveIntegerField(default=0)),
+                ('total_response_time_ms', models.PositiveBigIntegerField(default=0)),
+                ('current_streak', models.PositiveIntegerField(default=0)),
+                ('best_streak', models.PositiveIntegerField(default=0)),
+                ('last_studied_at', models.DateTimeField(blank=True, null=True)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_stats', to='lessons.lesson')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'lesson'), name='unique_lesson_study_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StudyAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct', models.BooleanField()),
+                ('response_time_ms', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('flashcard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_attempts', to='flashcards.flashcard')),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_attempts', to='lessons.lesson')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='study_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'lesson', 'id'], name='study_attempt_user_idx')],
+            },
+        ),
+    ]
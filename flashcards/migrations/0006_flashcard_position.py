@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+from flashcards.positions import respread
+
+
+def position_existing(apps, schema_editor):
+    # Existing decks keep the id order they were served in so far
+    Flashcard = apps.get_model('flashcards', 'Flashcard')
+    lesson_ids = Flashcard.objects.order_by('lesson').values_list('lesson', flat=True).distinct()
+    for lesson_id in lesson_ids.iterator():
+        ids = list(Flashcard.objects.filter(lesson=lesson_id).order_by('id').values_list('id', flat=True))
+        Flashcard.objects.bulk_update([Flashcard(id=flashcard_id, position=key)
+                                       for flashcard_id, key in zip(ids, respread(len(ids)))],
+                                      ['position'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0005_study_attempts'),
+        ('lessons', '0007_lesson_card_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='position',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.RunPython(position_existing, migrations.RunPython.noop),
+        # Create the new index before dropping the one it replaces
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['lesson', 'position'], name='flashcard_position_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='flashcard',
+            name='flashcard_lesson_idx',
+        ),
+    ]
@@ -1,16 +1,164 @@
 from django.db import models
+from django.db.models import Max
 from django.conf import settings #reference AUTH_USER_MODEL
 
+from . import positions
+
+
 # Create your models here.
+class FlashcardQuerySet(models.QuerySet):
+    def assign_positions(self, flashcards):
+        """
+        Give flashcards without a position keys after the last card of their lesson, in list order. One query reads
+        the last positions of all the lessons involved.
+
+        A lesson whose new keys would be longer than FLASHCARD_POSITION_REBALANCE_LENGTH is rebalanced first. Once
+        the room kept for appends is used up every append halves what is left, and respreading the deck leaves room
+        for as many appends again as it has cards, so keys only grow with the logarithm of the deck's size.
+        """
+        # flashcards.rebalance imports this module
+        from .rebalance import rebalance
+
+        by_lesson = {}
+        for flashcard in flashcards:
+            if not flashcard.position:
+                by_lesson.setdefault(flashcard.lesson_id, []).append(flashcard)
+        if not by_lesson:
+            return
+        last = dict(self.model.objects.filter(lesson__in=by_lesson).order_by().values('lesson').annotate(
+            last=Max('position')).values_list('lesson', 'last'))
+        for lesson_id, cards in by_lesson.items():
+            keys = positions.spread(last.get(lesson_id), None, len(cards))
+            if max(map(len, keys)) > settings.FLASHCARD_POSITION_REBALANCE_LENGTH:
+                rebalance(lesson_id)
+                keys = positions.spread(self.model.objects.filter(lesson=lesson_id).aggregate(
+                    last=Max('position'))['last'], None, len(cards))
+            for flashcard, key in zip(cards, keys):
+                flashcard.position = key
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # Cards created in bulk (bulk endpoint, imports) are appended to their decks like single ones
+        objs = list(objs)
+        self.assign_positions(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Flashcard(models.Model):
     front_text = models.TextField()
     back_text = models.TextField()
-    lesson = models.ForeignKey('lessons.Lesson', on_delete=models.CASCADE, related_name='flashcards') #link to lesson
+    lesson = models.ForeignKey('lessons.Lesson', on_delete=models.CASCADE, related_name='flashcards', db_index=False) #link to lesson, indexed by flashcard_position_idx
+    # Fractional key ordering the cards of a lesson (see flashcards.positions), set when the card is created or moved
+    # to another lesson
+    position = models.CharField(max_length=255, default='', blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE) #link to user
 
     #Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FlashcardQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Cards are always read a lesson at a time (or joined to their lessons) in deck order
+            models.Index(fields=['lesson', 'position'], name='flashcard_position_idx'),
+        ]
+
     def __str__(self):
         return self.front_text
+
+    def save(self, *args, **kwargs):
+        # _saved_lesson_id is kept by lessons.signals. A key orders a card among the cards of its lesson only, so a
+        # card moved to another lesson is appended to that deck.
+        moved = not self._state.adding and getattr(self, '_saved_lesson_id', None) not in (None, self.lesson_id)
+        if moved:
+            self.position = ''
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'position'}
+        if moved or self._state.adding and not self.position:
+            Flashcard.objects.assign_positions([self])
+        super().save(*args, **kwargs)
+
+
+class ReviewState(models.Model):
+    """
+    Spaced repetition state of one flashcard for one user, advanced by flashcards.scheduler on every review
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='review_states')
+    flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='review_states')
+    ease = models.FloatField(default=2.5)
+    interval = models.PositiveIntegerField(default=0) #days until the next review
+    repetitions = models.PositiveIntegerField(default=0) #successful reviews in a row
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'flashcard'], name='unique_review_state'),
+        ]
+        indexes = [
+            # A study session is a single range scan: WHERE user_id = ? AND due_at <= now ORDER BY due_at
+            models.Index(fields=['user', 'due_at'], name='review_state_due_idx'),
+        ]
+
+
+class QuizSession(models.Model):
+    """
+    A multiple choice quiz generated by flashcards.quiz, kept until its answers are graded
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_sessions')
+    lesson = models.ForeignKey('lessons.Lesson', on_delete=models.CASCADE, related_name='quiz_sessions')
+    # [flashcard id, index of the right choice] per question, in question order. The choices themselves are not
+    # stored, grading only needs the index.
+    questions = models.JSONField()
+    score = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    graded_at = models.DateTimeField(null=True, blank=True)
+
+
+class StudyAttempt(models.Model):
+    """
+    One answer given while studying a card. Append only: rows are written in bulk by the attempts endpoint and
+    rolled up into LessonStudyStats as they are, and never updated.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='study_attempts',
+                             db_index=False) #indexed by study_attempt_user_idx
+    flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='study_attempts')
+    lesson = models.ForeignKey('lessons.Lesson', on_delete=models.CASCADE, related_name='study_attempts')
+    correct = models.BooleanField()
+    response_time_ms = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # A user's history, per lesson, in the order the answers were recorded
+            models.Index(fields=['user', 'lesson', 'id'], name='study_attempt_user_idx'),
+        ]
+
+
+class LessonStudyStats(models.Model):
+    """
+    Running totals of a user's StudyAttempts on one lesson, updated with every batch of attempts (see
+    flashcards.study) so dashboards never aggregate the attempts themselves
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='study_stats')
+    lesson = models.ForeignKey('lessons.Lesson', on_delete=models.CASCADE, related_name='study_stats')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+    total_response_time_ms = models.PositiveBigIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0) #correct answers in a row, up to the latest one
+    best_streak = models.PositiveIntegerField(default=0)
+    last_studied_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'lesson'], name='unique_lesson_study_stats'),
+        ]
+
+    @property
+    def accuracy(self):
+        return round(self.correct / self.attempts, 4) if self.attempts else None
+
+    @property
+    def average_response_time_ms(self):
+        return round(self.total_response_time_ms / self.attempts) if self.attempts else None
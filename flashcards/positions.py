@@ -0,0 +1,74 @@
+"""
+Fractional position keys ordering the flashcards of a lesson.
+
+A key is a string of base 36 digits read as the fraction 0.<digits>, so keys compare like the numbers they stand
+for, and there is always room for another key between two different ones. Moving a card only gives it a key between
+its new neighbours: a single row is updated, whatever the size of the deck. Keys never end with a 0, which keeps
+every number to a single key. The digits and lowercase letters sort the same way under the C collation and the usual
+linguistic ones, so the (lesson, position) index returns decks in order on any database.
+
+Keys are handed out KEY_LENGTH digits long at least, and appended cards leave room for 36 ** 2 keys before the next
+one, so a deck built one card at a time keeps short keys for its first thousand cards. Past those, or when repeatedly
+inserting into the same gap, keys grow a digit every five cards or so; flashcards.rebalance spreads the keys of a
+lesson evenly again once they grow past FLASHCARD_POSITION_REBALANCE_LENGTH, which appends and moves do on their own.
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+KEY_LENGTH = 4
+# Room left after an appended key, in units of its last digit
+APPEND_GAP = BASE ** 2
+
+
+def _to_int(key, length):
+    value = 0
+    for digit in key.ljust(length, '0'):
+        value = value * BASE + DIGITS.index(digit)
+    return value
+
+
+def _to_key(value, length):
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, BASE)
+        digits.append(DIGITS[digit])
+    return ''.join(reversed(digits)).rstrip('0')
+
+
+def spread(after, before, count):
+    """
+    Return `count` increasing keys between the keys `after` and `before`, either of which may be None for the start
+    or the end of the deck. They are evenly spaced, or APPEND_GAP apart when appended at the end.
+    """
+    after = after or ''
+    if before is not None and before <= after:
+        raise ValueError(f'No key between {after!r} and {before!r}')
+    length = max(KEY_LENGTH, len(after), len(before or ''))
+    while True:
+        low = _to_int(after, length)
+        high = _to_int(before, length) if before is not None else BASE ** length
+        if before is None and low + APPEND_GAP * (count + 1) <= high:
+            step = APPEND_GAP
+        else:
+            step = (high - low) // (count + 1)
+        if step:
+            return [_to_key(low + step * i, length) for i in range(1, count + 1)]
+        length += 1
+
+
+def between(after, before):
+    """
+    A key between `after` and `before` (see spread())
+    """
+    return spread(after, before, 1)[0]
+
+
+def respread(count):
+    """
+    Keys for a deck of `count` cards, APPEND_GAP apart at least and spread evenly over the first half of the key
+    space, which leaves the second half for appends
+    """
+    length = KEY_LENGTH
+    while BASE ** length < APPEND_GAP * (count + 1) * 2:
+        length += 1
+    step = BASE ** length // 2 // (count + 1)
+    return [_to_key(step * i, length) for i in range(1, count + 1)]
@@ -0,0 +1,90 @@
+"""
+Multiple choice quizzes generated from a lesson's deck.
+
+Every lesson quizzed in this process has an index of its card ids, kept in an array of 64 bit integers (8 bytes a
+card, so 800 KB for a deck of 100k cards) in an LRU of QUIZ_INDEX_SIZE lessons. A quiz samples its questions and the
+cards it takes distractors from out of that array and fetches just those cards by primary key, so generating one costs
+O(questions x choices) whatever the size of the deck, and the database never sorts the deck randomly.
+
+An index is tagged with the deck's version token from flashcards.deck_cache and rebuilt when the token changed, so
+every write that invalidates the deck (see signals.py) invalidates the index as well, in every process that shares
+the deck cache.
+"""
+import random
+import threading
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import deck_cache
+from .models import Flashcard
+
+_lock = threading.Lock()
+# lesson id -> (deck version, array of card ids), least recently used first
+_indexes = OrderedDict()
+
+
+def card_ids(lesson_id):
+    """
+    The ids of a lesson's cards, from the index of the current version of its deck
+    """
+    # Read the version before the rows, an index built from rows older than a write is then tagged with the version
+    # that write dropped and never matches again
+    version = deck_cache.version(lesson_id)
+    with _lock:
+        entry = _indexes.get(lesson_id)
+        if entry is not None and entry[0] == version:
+            _indexes.move_to_end(lesson_id)
+            return entry[1]
+
+    ids = array('q', Flashcard.objects.filter(lesson=lesson_id).order_by('position').values_list('id', flat=True))
+    with _lock:
+        _indexes[lesson_id] = (version, ids)
+        _indexes.move_to_end(lesson_id)
+        while len(_indexes) > settings.QUIZ_INDEX_SIZE:
+            _indexes.popitem(last=False)
+    return ids
+
+
+def generate(lesson_id, size, choices):
+    """
+    Sample up to `size` cards of a lesson and return them as questions, each a dict with the card, its front_text and
+    up to `choices` distinct answers: its own back_text and other cards' back_text in random order. The index of the
+    right answer is returned as 'answer'.
+    """
+    ids = card_ids(lesson_id)
+    # Questions come first in the sample, the whole sample is the pool of distractors
+    sample = random.sample(ids, min(len(ids), size * choices))
+    # Filtering on the lesson too skips cards moved away since the index was built, deleted ones are simply missing
+    cards = Flashcard.objects.filter(lesson=lesson_id, id__in=sample).in_bulk(field_name='id')
+    answers = list(dict.fromkeys(card.back_text for card in cards.values()))
+
+    questions = []
+    for flashcard_id in sample[:size]:
+        card = cards.get(flashcard_id)
+        if card is None:
+            continue
+        # At most one of the sampled answers is the right one, so this leaves choices - 1 distractors when the pool
+        # has enough distinct answers
+        options = [text for text in random.sample(answers, min(len(answers), choices)) if text != card.back_text]
+        options = options[:choices - 1] + [card.back_text]
+        random.shuffle(options)
+        questions.append({'flashcard': card.id, 'front_text': card.front_text, 'choices': options,
+                          'answer': options.index(card.back_text)})
+    return questions
+
+
+def grade(questions, answers):
+    """
+    Grade the answers to the questions of a QuizSession, a list of chosen choice indexes in question order (None for
+    a skipped question)
+    """
+    results = [{'flashcard': flashcard_id, 'answer': answer, 'correct': chosen == answer}
+               for (flashcard_id, answer), chosen in zip(questions, answers)]
+    return sum(result['correct'] for result in results), results
+
+
+def reset():
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,42 @@
+"""
+Rebalancing the position keys of decks whose keys grew long from many insertions into the same gaps (see
+flashcards.positions). The rebalance_positions command runs it for every lesson with a key longer than
+FLASHCARD_POSITION_REBALANCE_LENGTH, appending cards (Flashcard.objects.assign_positions) for a lesson whose new
+keys would grow past it, and the move endpoint for a lesson that has no room left at all.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from lessons.models import Lesson
+
+from . import positions
+from .models import Flashcard
+from .signals import deck_changed
+
+
+def lessons_to_rebalance():
+    """
+    Ids of the lessons with a key longer than FLASHCARD_POSITION_REBALANCE_LENGTH
+    """
+    return Flashcard.objects.annotate(key_length=Length('position')).filter(
+        key_length__gt=settings.FLASHCARD_POSITION_REBALANCE_LENGTH).order_by('lesson').values_list(
+        'lesson', flat=True).distinct()
+
+
+def rebalance(lesson_id, batch_size=1000):
+    """
+    Give the cards of a lesson evenly spread keys in their current order, and return the number of cards. The lesson
+    row is locked meanwhile, so moves in the lesson wait for it.
+    """
+    with transaction.atomic():
+        Lesson.objects.select_for_update().filter(id=lesson_id).first()
+        ids = list(Flashcard.objects.filter(lesson=lesson_id).order_by('position', 'id').values_list('id', flat=True))
+        # bulk_update does not apply auto_now, and the deck and card ETags are built from updated_at
+        now = timezone.now()
+        Flashcard.objects.bulk_update([Flashcard(id=flashcard_id, position=key, updated_at=now)
+                                       for flashcard_id, key in zip(ids, positions.respread(len(ids)))],
+                                      ['position', 'updated_at'], batch_size=batch_size)
+        deck_changed.send(sender=Flashcard, lesson_id=lesson_id)
+    return len(ids)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+MIN_EASE = 1.3
+
+
+def review(state, quality, now):
+    """
+    Advance a ReviewState after a review graded from 0 (complete blackout) to 5 (perfect recall), following SM-2.
+
+    A failed review (quality below 3) restarts the card at a one day interval; a successful one grows the interval
+    from 1 day to 6 days and then by the ease factor. The ease factor is adjusted by every review and never drops
+    below MIN_EASE.
+    """
+    if quality < 3:
+        state.repetitions = 0
+        state.interval = 1
+    else:
+        if state.repetitions == 0:
+            state.interval = 1
+        elif state.repetitions == 1:
+            state.interval = 6
+        else:
+            state.interval = round(state.interval * state.ease)
+        state.repetitions += 1
+
+    state.ease = max(MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    state.last_reviewed_at = now
+    state.due_at = now + timedelta(days=state.interval)
+    return state
@@ -1,7 +1,37 @@
 from rest_framework import serializers
-from .models import Flashcard
+from lessons.serializers import ValuesSerializer
+from .models import Flashcard, LessonStudyStats, ReviewState
 
 class FlashcardSerializer(serializers.ModelSerializer):
     class Meta:
         model = Flashcard
-        fields = ['id', 'front_text', 'back_text', 'lesson', 'created_by', 'created_at', 'updated_at']
+        fields = ['id', 'front_text', 'back_text', 'lesson', 'position', 'created_by', 'created_at', 'updated_at']
+        # Cards are appended to their lesson when created and reordered with the move endpoint
+        read_only_fields = ['position']
+
+flashcard_values_serializer = ValuesSerializer(FlashcardSerializer)
+
+class FlashcardBulkSerializer(FlashcardSerializer):
+    # The bulk endpoints set lesson and created_by once for the whole batch, which also saves looking them up per card
+    class Meta(FlashcardSerializer.Meta):
+        read_only_fields = ['lesson', 'position', 'created_by']
+
+class ReviewStateSerializer(serializers.ModelSerializer):
+    flashcard = FlashcardSerializer(read_only=True)
+
+    class Meta:
+        model = ReviewState
+        fields = ['flashcard', 'ease', 'interval', 'repetitions', 'due_at', 'last_reviewed_at']
+
+class StudyAttemptSerializer(serializers.Serializer):
+    # A plain id rather than a related field, the attempts endpoint looks all the cards of a batch up in one query
+    flashcard = serializers.IntegerField()
+    correct = serializers.BooleanField()
+    # The largest value the column holds on every database
+    response_time_ms = serializers.IntegerField(min_value=0, max_value=2147483647)
+
+class LessonStudyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LessonStudyStats
+        fields = ['lesson', 'attempts', 'correct', 'accuracy', 'average_response_time_ms', 'current_streak',
+                  'best_streak', 'last_studied_at']
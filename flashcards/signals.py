@@ -0,0 +1,46 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import Signal, receiver
+
+from lessons.models import Lesson
+
+from . import deck_cache
+from .models import Flashcard
+
+# Sent with lesson_id after flashcards of a lesson were written in bulk (bulk_create, bulk_update or a queryset
+# delete), which skips the per-instance post_save and post_delete signals
+deck_changed = Signal()
+
+
+@receiver(post_save, sender=Flashcard)
+def invalidate_saved_flashcard_deck(sender, instance, **kwargs):
+    deck_cache.invalidate(instance.lesson_id)
+
+
+@receiver(post_delete, sender=Flashcard)
+def invalidate_deleted_flashcard_deck(sender, instance, origin=None, **kwargs):
+    # Cascades from a lesson (or its owner) invalidate once per lesson in invalidate_deleted_lesson_deck instead
+    if isinstance(origin, Flashcard):
+        deck_cache.invalidate(instance.lesson_id)
+
+
+@receiver(deck_changed)
+def invalidate_changed_deck(sender, lesson_id, **kwargs):
+    deck_cache.invalidate(lesson_id)
+
+
+@receiver(post_init, sender=Lesson)
+def remember_visibility(sender, instance, **kwargs):
+    instance._saved_is_public = instance.__dict__.get('is_public')
+
+
+@receiver(post_save, sender=Lesson)
+def invalidate_lesson_deck(sender, instance, created, **kwargs):
+    # New lessons too, as the ids of deleted lessons can be reused (sqlite) and their decks may still be cached
+    if created or instance._saved_is_public != instance.is_public:
+        deck_cache.invalidate(instance.id)
+    instance._saved_is_public = instance.is_public
+
+
+@receiver(post_delete, sender=Lesson)
+def invalidate_deleted_lesson_deck(sender, instance, **kwargs):
+    deck_cache.invalidate(instance.id)
@@ -0,0 +1,52 @@
+"""
+Recording study results: a batch of StudyAttempts is inserted with one bulk_create and folded into the
+LessonStudyStats rollups of its lessons in the same transaction, so the rollups always match the attempts.
+
+A batch costs the same four queries whatever its size: the insert, one to create the missing rollup rows, one to lock
+and read the rollups of the lessons involved and one bulk_update. Locking the rollups serializes concurrent batches of
+one user on one lesson, which keeps the streaks in order.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LessonStudyStats, StudyAttempt
+
+
+def fold(stats, attempts, now):
+    """
+    Add attempts, in the order they were given, to a LessonStudyStats
+    """
+    for attempt in attempts:
+        stats.attempts += 1
+        stats.total_response_time_ms += attempt.response_time_ms
+        if attempt.correct:
+            stats.correct += 1
+            stats.current_streak += 1
+            stats.best_streak = max(stats.best_streak, stats.current_streak)
+        else:
+            stats.current_streak = 0
+    stats.last_studied_at = now
+    return stats
+
+
+def record(user_id, attempts):
+    """
+    Save unsaved StudyAttempts of one user and update their rollups. Returns the rollups of the lessons involved.
+    """
+    by_lesson = {}
+    for attempt in attempts:
+        by_lesson.setdefault(attempt.lesson_id, []).append(attempt)
+
+    now = timezone.now()
+    with transaction.atomic():
+        StudyAttempt.objects.bulk_create(attempts)
+        LessonStudyStats.objects.bulk_create(
+            [LessonStudyStats(user_id=user_id, lesson_id=lesson_id) for lesson_id in by_lesson], ignore_conflicts=True)
+        # Locked in lesson order, so two batches touching the same lessons cannot deadlock
+        rollups = list(LessonStudyStats.objects.select_for_update().filter(
+            user=user_id, lesson__in=by_lesson).order_by('lesson'))
+        for stats in rollups:
+            fold(stats, by_lesson[stats.lesson_id], now)
+        LessonStudyStats.objects.bulk_update(rollups, ['attempts', 'correct', 'total_response_time_ms',
+                                                       'current_streak', 'best_streak', 'last_studied_at'])
+    return rollups
@@ -1,9 +1,23 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.utils import timezone
 
 # Create your tests here.
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
 from lessons.models import Lesson
-from flashcards.models import Flashcard
+from flashcards import async_views, deck_cache, positions, quiz, rebalance, scheduler
+from flashcards.models import Flashcard, QuizSession, ReviewState, StudyAttempt
+from flashcards.signals import deck_changed
 
 class FlashcardModelTest(TestCase):
     def setUp(self):
@@ -40,3 +54,492 @@ class FlashcardModelTest(TestCase):
     def test_flashcard_str_representation(self):
         # test the string representation of the Flashcard model
         self.assertEqual(str(self.flashcard), "What is Python?")
+
+
+class FlashcardBulkViewTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.other_user = get_user_model().objects.create_user(username='otheruser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_create(self):
+        cards = [{'front_text': f'Question {i}', 'back_text': f'Answer {i}'} for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(Flashcard.objects.filter(lesson=self.lesson, created_by=self.user).count(), 50)
+
+    def test_bulk_create_reports_errors_per_card(self):
+        cards = [{'front_text': 'Question', 'back_text': 'Answer'}, {'front_text': 'No answer'}]
+        response = self.client.post('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('back_text', response.data[1])
+        self.assertFalse(Flashcard.objects.exists())
+
+    def test_bulk_create_in_someone_elses_lesson(self):
+        self.client.force_authenticate(user=self.other_user)
+        cards = [{'front_text': 'Question', 'back_text': 'Answer'}]
+        response = self.client.post('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_request_with_invalid_lesson(self):
+        cards = [{'front_text': 'Question', 'back_text': 'Answer'}]
+        for lesson in [None, 'abc', [self.lesson.id], True]:
+            response = self.client.post('/flashcards/bulk/', {'lesson': lesson, 'cards': cards}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete('/flashcards/bulk/', {'lesson': self.lesson.id, 'ids': [True]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Flashcard.objects.exists())
+
+    def test_bulk_update(self):
+        first, second = [Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer', lesson=self.lesson,
+                                                  created_by=self.user) for i in range(2)]
+        cards = [{'id': first.id, 'back_text': 'New answer'}, {'id': second.id, 'front_text': 'New question'}]
+        response = self.client.patch('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.front_text, first.back_text), ('Question 0', 'New answer'))
+        self.assertEqual((second.front_text, second.back_text), ('New question', 'Answer'))
+
+    def test_bulk_update_unknown_card(self):
+        other_lesson = Lesson.objects.create(title="Other Lesson", category="Category", created_by=self.user)
+        flashcard = Flashcard.objects.create(front_text='Question', back_text='Answer', lesson=other_lesson,
+                                             created_by=self.user)
+        cards = [{'id': flashcard.id, 'back_text': 'New answer'}]
+        response = self.client.patch('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data[0])
+
+    def test_bulk_delete(self):
+        flashcards = [Flashcard.objects.create(front_text='Question', back_text='Answer', lesson=self.lesson,
+                                               created_by=self.user) for _ in range(3)]
+        ids = [flashcards[0].id, flashcards[1].id]
+        response = self.client.delete('/flashcards/bulk/', {'lesson': self.lesson.id, 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'deleted': 2})
+        self.assertEqual(list(Flashcard.objects.values_list('id', flat=True)), [flashcards[2].id])
+
+
+class SchedulerTest(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.state = ReviewState(due_at=self.now)
+
+    def test_successful_reviews_grow_the_interval(self):
+        intervals = [scheduler.review(self.state, 5, self.now).interval for _ in range(4)]
+        self.assertEqual(intervals[:2], [1, 6])
+        self.assertGreater(intervals[2], 6)
+        self.assertGreater(intervals[3], intervals[2])
+        self.assertEqual(self.state.due_at, self.now + timedelta(days=intervals[3]))
+
+    def test_failed_review_restarts_the_card(self):
+        for _ in range(3):
+            scheduler.review(self.state, 4, self.now)
+        scheduler.review(self.state, 1, self.now)
+        self.assertEqual((self.state.repetitions, self.state.interval), (0, 1))
+
+    def test_ease_has_a_floor(self):
+        for _ in range(20):
+            scheduler.review(self.state, 0, self.now)
+        self.assertEqual(self.state.ease, scheduler.MIN_EASE)
+
+
+class ReviewViewTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.flashcards = [Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer',
+                                                    lesson=self.lesson, created_by=self.user) for i in range(3)]
+        self.client.force_authenticate(user=self.user)
+
+    def test_review_schedules_the_card(self):
+        response = self.client.post(f'/flashcards/{self.flashcards[0].id}/review/', {'quality': 5}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['interval'], 1)
+        state = ReviewState.objects.get(user=self.user, flashcard=self.flashcards[0])
+        self.assertGreater(state.due_at, timezone.now())
+
+    def test_review_invalid_quality(self):
+        for quality in [9, True, '5']:
+            response = self.client.post(f'/flashcards/{self.flashcards[0].id}/review/', {'quality': quality},
+                                        format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ReviewState.objects.exists())
+
+    def test_due_queue_puts_overdue_cards_before_new_ones(self):
+        overdue = self.flashcards[2]
+        ReviewState.objects.create(user=self.user, flashcard=overdue, due_at=timezone.now() - timedelta(days=1))
+        self.client.post(f'/flashcards/{self.flashcards[0].id}/review/', {'quality': 5}, format='json')
+
+        response = self.client.get('/flashcards/due/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['flashcard']['id'] for item in response.data], [overdue.id, self.flashcards[1].id])
+
+    def test_due_queue_limit(self):
+        response = self.client.get('/flashcards/due/', {'limit': 2})
+        self.assertEqual(len(response.data), 2)
+        for limit in [0, 'abc', '\u00b2']:
+            response = self.client.get('/flashcards/due/', {'limit': limit})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncFlashcardViewTests(APITestCase):
+    def test_by_lesson_matches_sync_view(self):
+        user = get_user_model().objects.create_user(username='testuser', password='password123')
+        lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=user)
+        for i in range(3):
+            Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer', lesson=lesson, created_by=user)
+
+        path = f'/flashcards/by-lesson/{lesson.id}/'
+        response = async_to_sync(async_views.flashcards_by_lesson)(AsyncRequestFactory().get(path), id=lesson.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, self.client.get(path).content)
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.flashcards = [Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer',
+                                                    lesson=self.lesson, created_by=self.user) for i in range(3)]
+        self.deck_url = f'/flashcards/by-lesson/{self.lesson.id}/'
+
+    def test_unchanged_deck_is_not_modified(self):
+        etag = self.client.get(self.deck_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.deck_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_any_deck_change_changes_the_etag(self):
+        etags = [self.client.get(self.deck_url)['ETag']]
+        self.client.put(f'/flashcards/{self.flashcards[0].id}/', {'back_text': 'Changed'}, format='json')
+        etags.append(self.client.get(self.deck_url)['ETag'])
+        self.flashcards[1].delete()
+        etags.append(self.client.get(self.deck_url)['ETag'])
+        Flashcard.objects.create(front_text='New', back_text='Answer', lesson=self.lesson, created_by=self.user)
+        etags.append(self.client.get(self.deck_url)['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+        response = self.client.get(self.deck_url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_flashcard_detail(self):
+        url = f'/flashcards/{self.flashcards[0].id}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.client.get('/flashcards/0/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class DeckCacheTests(APITestCase):
+    def setUp(self):
+        caches[deck_cache.ALIAS].clear()
+        deck_cache.reset_stats()
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.flashcards = [Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer',
+                                                    lesson=self.lesson, created_by=self.user) for i in range(3)]
+        self.deck_url = f'/flashcards/by-lesson/{self.lesson.id}/'
+
+    def test_deck_is_served_from_the_cache(self):
+        first = self.client.get(self.deck_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.deck_url)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual([card['id'] for card in second.json()], [card.id for card in self.flashcards])
+        self.assertEqual((deck_cache.stats()['hits'], deck_cache.stats()['misses']), (1, 1))
+
+    def test_writes_invalidate_the_deck(self):
+        self.client.get(self.deck_url)
+        self.client.force_authenticate(user=self.user)
+        self.client.put(f'/flashcards/{self.flashcards[0].id}/', {'back_text': 'Changed'}, format='json')
+        self.assertEqual(self.client.get(self.deck_url).json()[0]['back_text'], 'Changed')
+
+        self.client.post('/flashcards/bulk/', {'lesson': self.lesson.id, 'cards': [
+            {'front_text': 'Bulk', 'back_text': 'Answer'}]}, format='json')
+        self.assertEqual(len(self.client.get(self.deck_url).json()), 4)
+
+        self.flashcards[1].delete()
+        self.assertEqual(len(self.client.get(self.deck_url).json()), 3)
+        self.assertEqual(deck_cache.stats()['hits'], 0)
+
+    def test_visibility_change_invalidates_the_deck(self):
+        self.client.get(self.deck_url)
+        self.lesson.title = 'Renamed'
+        self.lesson.save()
+        self.client.get(self.deck_url)
+        self.lesson.is_public = True
+        self.lesson.save()
+        self.client.get(self.deck_url)
+        self.assertEqual((deck_cache.stats()['hits'], deck_cache.stats()['misses']), (1, 2))
+
+    def test_entry_built_before_an_invalidation_is_not_served(self):
+        entry = deck_cache.get_deck(self.lesson.id)
+        deck_cache.invalidate(self.lesson.id)
+        caches[deck_cache.ALIAS].set(f'deck:{self.lesson.id}', entry)
+        with self.assertNumQueries(2):
+            deck_cache.get_deck(self.lesson.id)
+
+    def test_async_view_uses_the_cache(self):
+        self.client.get(self.deck_url)
+        request = AsyncRequestFactory().get(self.deck_url)
+        response = async_to_sync(async_views.flashcards_by_lesson)(request, id=self.lesson.id)
+        self.assertEqual(response.content, self.client.get(self.deck_url).content)
+        self.assertEqual(deck_cache.stats()['hits'], 2)
+
+    def test_stats_are_staff_only(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get('/flashcards/cache-stats/').status_code, status.HTTP_403_FORBIDDEN)
+        staff = get_user_model().objects.create_user(username='staff', password='password123', is_staff=True)
+        self.client.force_authenticate(user=staff)
+        self.client.get(self.deck_url)
+        self.assertEqual(self.client.get('/flashcards/cache-stats/').data['misses'], 1)
+        self.client.delete('/flashcards/cache-stats/')
+        self.assertEqual(self.client.get('/flashcards/cache-stats/').data['hit_rate'], None)
+
+
+class QuizTests(APITestCase):
+    def setUp(self):
+        caches[deck_cache.ALIAS].clear()
+        quiz.reset()
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.flashcards = [Flashcard.objects.create(front_text=f'Question {i}', back_text=f'Answer {i}',
+                                                    lesson=self.lesson, created_by=self.user) for i in range(10)]
+        self.quiz_url = f'/flashcards/by-lesson/{self.lesson.id}/quiz/'
+        self.client.force_authenticate(user=self.user)
+
+    def test_quiz_questions_have_the_right_answer_among_distinct_choices(self):
+        response = self.client.post(self.quiz_url, {'questions': 5, 'choices': 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        backs = {card.id: card.back_text for card in self.flashcards}
+        session = QuizSession.objects.get(id=response.data['id'])
+        self.assertEqual(len(response.data['questions']), 5)
+        self.assertEqual(len({question['flashcard'] for question in response.data['questions']}), 5)
+        for question, (flashcard_id, answer) in zip(response.data['questions'], session.questions):
+            self.assertNotIn('answer', question)
+            self.assertEqual(question['flashcard'], flashcard_id)
+            self.assertEqual(len(set(question['choices'])), 3)
+            self.assertEqual(question['choices'][answer], backs[flashcard_id])
+
+    def test_quiz_size_is_capped_by_the_deck(self):
+        response = self.client.post(self.quiz_url, {'questions': 50}, format='json')
+        self.assertEqual(len(response.data['questions']), 10)
+        self.assertEqual(self.client.post(self.quiz_url, {'choices': 1}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_deck_writes(self):
+        with self.assertNumQueries(1):
+            quiz.card_ids(self.lesson.id)
+        with self.assertNumQueries(0):
+            quiz.card_ids(self.lesson.id)
+        self.flashcards[0].delete()
+        Flashcard.objects.bulk_create([Flashcard(front_text='New', back_text='New', lesson=self.lesson,
+                                                 created_by=self.user)])
+        deck_changed.send(sender=Flashcard, lesson_id=self.lesson.id)
+        ids = quiz.card_ids(self.lesson.id)
+        self.assertEqual(list(ids), list(Flashcard.objects.filter(lesson=self.lesson).order_by('id')
+                                         .values_list('id', flat=True)))
+
+    def test_answers_are_graded_once(self):
+        response = self.client.post(self.quiz_url, {'questions': 4}, format='json')
+        session = QuizSession.objects.get(id=response.data['id'])
+        answers = [answer for _, answer in session.questions]
+        answers[0] = None
+        url = f'/flashcards/quiz/{session.id}/answers/'
+
+        self.assertEqual(self.client.post(url, {'answers': answers[:2]}, format='json').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, {'answers': answers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['score'], response.data['total']), (3, 4))
+        self.assertEqual([result['correct'] for result in response.data['results']], [False, True, True, True])
+        self.assertEqual(self.client.post(url, {'answers': answers}, format='json').status_code,
+                         status.HTTP_409_CONFLICT)
+
+    def test_private_lessons_and_other_users_sessions(self):
+        other = get_user_model().objects.create_user(username='other', password='password123')
+        session_id = self.client.post(self.quiz_url, {}, format='json').data['id']
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.post(self.quiz_url, {}, format='json').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.post(f'/flashcards/quiz/{session_id}/answers/', {'answers': []},
+                                          format='json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StudyAttemptTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.other = get_user_model().objects.create_user(username='other', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.public = Lesson.objects.create(title="Public", category="Category", created_by=self.other,
+                                            is_public=True)
+        self.private = Lesson.objects.create(title="Private", category="Category", created_by=self.other)
+        self.card = Flashcard.objects.create(front_text='Q', back_text='A', lesson=self.lesson, created_by=self.user)
+        self.public_card = Flashcard.objects.create(front_text='Q', back_text='A', lesson=self.public,
+                                                    created_by=self.other)
+        self.private_card = Flashcard.objects.create(front_text='Q', back_text='A', lesson=self.private,
+                                                     created_by=self.other)
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, *results, card=None):
+        return self.client.post('/flashcards/attempts/', {'attempts': [
+            {'flashcard': (card or self.card).id, 'correct': correct, 'response_time_ms': 1000 * (i + 1)}
+            for i, correct in enumerate(results)]}, format='json')
+
+    def test_batch_updates_the_rollup(self):
+        response = self.post(True, True, False, True)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(StudyAttempt.objects.filter(user=self.user).count(), 4)
+        stats = response.data['stats'][0]
+        self.assertEqual((stats['attempts'], stats['correct'], stats['accuracy']), (4, 3, 0.75))
+        self.assertEqual((stats['current_streak'], stats['best_streak']), (1, 2))
+        self.assertEqual(stats['average_response_time_ms'], 2500)
+
+        stats = self.post(True, True).data['stats'][0]
+        self.assertEqual((stats['attempts'], stats['current_streak'], stats['best_streak']), (6, 3, 3))
+
+    def test_batch_costs_the_same_queries_whatever_its_size(self):
+        self.post(True)
+        with CaptureQueriesContext(connection) as small:
+            self.post(True, False)
+        with CaptureQueriesContext(connection) as large:
+            self.post(*[True] * 100, card=self.public_card)
+        self.assertEqual(len(large), len(small))
+
+    def test_private_cards_reject_the_whole_batch(self):
+        response = self.client.post('/flashcards/attempts/', {'attempts': [
+            {'flashcard': self.card.id, 'correct': True, 'response_time_ms': 10},
+            {'flashcard': self.private_card.id, 'correct': True, 'response_time_ms': 10},
+            {'flashcard': self.card.id, 'correct': True, 'response_time_ms': -1},
+            {'flashcard': self.card.id, 'correct': True, 'response_time_ms': 2 ** 31},
+            {'flashcard': True, 'correct': True, 'response_time_ms': 10},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([sorted(error) for error in response.data],
+                         [[], ['flashcard'], ['response_time_ms'], ['response_time_ms'], ['flashcard']])
+        self.assertFalse(StudyAttempt.objects.exists())
+
+    def test_stats_are_per_user_and_lesson(self):
+        self.post(True)
+        self.post(False, card=self.public_card)
+        response = self.client.get('/flashcards/stats/')
+        self.assertEqual([stats['lesson'] for stats in response.data], [self.public.id, self.lesson.id])
+        response = self.client.get('/flashcards/stats/', {'lesson': self.lesson.id})
+        self.assertEqual(response.data[0]['accuracy'], 1.0)
+        for lesson in ['abc', '\u00b2']:
+            response = self.client.get('/flashcards/stats/', {'lesson': lesson})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.force_authenticate(user=self.other)
+        self.assertEqual(self.client.get('/flashcards/stats/').data, [])
+
+
+class PositionTests(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title="Sample Lesson", category="Category", created_by=self.user)
+        self.flashcards = [Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer',
+                                                    lesson=self.lesson, created_by=self.user) for i in range(4)]
+        self.client.force_authenticate(user=self.user)
+
+    def deck(self):
+        return list(Flashcard.objects.filter(lesson=self.lesson).order_by('position', 'id').values_list('id', flat=True))
+
+    def test_keys_sort_between_their_neighbours(self):
+        keys = [positions.between(None, None)]
+        for _ in range(200):
+            # Always inserting into the same gap is the worst case for key length
+            keys.insert(1, positions.between(keys[0], keys[1] if len(keys) > 1 else None))
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertTrue(all(not key.endswith('0') for key in keys))
+        spread = positions.spread('a', 'b', 100)
+        self.assertEqual(spread, sorted(spread))
+        self.assertTrue('a' < spread[0] and spread[-1] < 'b')
+
+    def test_new_cards_are_appended(self):
+        bulk = Flashcard.objects.bulk_create(Flashcard(front_text='Bulk', back_text='Answer', lesson=self.lesson,
+                                                       created_by=self.user) for _ in range(3))
+        self.assertEqual(self.deck(), [card.id for card in self.flashcards + bulk])
+
+    def test_appended_keys_stay_short(self):
+        for i in range(3000):
+            Flashcard.objects.create(front_text=f'Card {i}', back_text='Answer', lesson=self.lesson,
+                                     created_by=self.user)
+        Flashcard.objects.bulk_create(Flashcard(front_text='Bulk', back_text='Answer', lesson=self.lesson,
+                                                created_by=self.user) for _ in range(1000))
+        keys = list(Flashcard.objects.filter(lesson=self.lesson).order_by('id').values_list('position', flat=True))
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertLessEqual(max(map(len, keys)), settings.FLASHCARD_POSITION_REBALANCE_LENGTH)
+
+    def test_cards_moved_to_another_lesson_are_appended(self):
+        other = Lesson.objects.create(title="Other Lesson", category="Category", created_by=self.user)
+        last = Flashcard.objects.create(front_text='Last', back_text='Answer', lesson=other, created_by=self.user)
+        # The first card's key sorts before every key of the other lesson
+        moved = self.flashcards[0]
+        response = self.client.put(f'/flashcards/{moved.id}/', {'lesson': other.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        moved.refresh_from_db()
+        self.assertGreater(moved.position, last.position)
+        self.assertEqual(list(Flashcard.objects.filter(lesson=other).order_by('position').values_list('id', flat=True)),
+                         [last.id, moved.id])
+        self.assertEqual(self.deck(), [card.id for card in self.flashcards[1:]])
+
+    def test_move_updates_one_row(self):
+        first, second, third, fourth = self.flashcards
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f'/flashcards/{fourth.id}/move/', {'after': first.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(self.deck(), [first.id, fourth.id, second.id, third.id])
+
+        self.client.post(f'/flashcards/{third.id}/move/', {'after': None}, format='json')
+        self.assertEqual(self.deck(), [third.id, first.id, fourth.id, second.id])
+        self.assertEqual([card['id'] for card in self.client.get(f'/flashcards/by-lesson/{self.lesson.id}/').json()],
+                         self.deck())
+
+    def test_move_validation(self):
+        other = Lesson.objects.create(title="Other", category="Category", created_by=self.user)
+        elsewhere = Flashcard.objects.create(front_text='Q', back_text='A', lesson=other, created_by=self.user)
+        url = f'/flashcards/{self.flashcards[0].id}/move/'
+        for data in ({}, {'after': elsewhere.id}, {'after': self.flashcards[0].id}, {'after': 'x'},
+                     {'after': True}):
+            self.assertEqual(self.client.post(url, data, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        stranger = get_user_model().objects.create_user(username='stranger', password='password123')
+        self.client.force_authenticate(user=stranger)
+        self.assertEqual(self.client.post(url, {'after': None}, format='json').status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+    def test_tied_keys_are_rebalanced(self):
+        Flashcard.objects.filter(lesson=self.lesson).update(position='i')
+        first, second, third, fourth = self.flashcards
+        self.client.post(f'/flashcards/{fourth.id}/move/', {'after': first.id}, format='json')
+        self.assertEqual(self.deck(), [first.id, fourth.id, second.id, third.id])
+
+    def test_rebalance_changes_the_etags(self):
+        urls = [f'/flashcards/by-lesson/{self.lesson.id}/', f'/flashcards/{self.flashcards[0].id}/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        rebalance.rebalance(self.lesson.id)
+        for url, etag in zip(urls, etags):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    @override_settings(FLASHCARD_POSITION_REBALANCE_LENGTH=5)
+    def test_rebalance_command_shortens_long_keys(self):
+        first, second = self.flashcards[:2]
+        for _ in range(30):
+            self.client.post(f'/flashcards/{second.id}/move/', {'after': first.id}, format='json')
+            first, second = second, first
+        order = self.deck()
+        self.assertEqual(list(rebalance.lessons_to_rebalance()), [self.lesson.id])
+        call_command('rebalance_positions', stdout=StringIO())
+        self.assertEqual(self.deck(), order)
+        self.assertEqual(list(rebalance.lessons_to_rebalance()), [])
@@ -1,9 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from .views import FlashcardDetailView, FlashcardCreateView,FlashcardListView, FlashcardByLessonView
+from .async_views import flashcards_by_lesson
+from .views import FlashcardDetailView, FlashcardCreateView,FlashcardListView, FlashcardByLessonView, FlashcardBulkView, \
+    FlashcardReviewView, DueFlashcardsView, DeckCacheStatsView, \
+    QuizView, QuizAnswersView, StudyAttemptsView, StudyStatsView, FlashcardMoveView
 
 urlpatterns = [
     path('<int:id>/', FlashcardDetailView.as_view(), name='flashcard-detail'),  # For GET, PUT, DELETE
     path('', FlashcardCreateView.as_view(), name='flashcard-create'),  # for POST
     path('public/', FlashcardListView.as_view(), name='flashcard-list'),  # for GET
-    path('by-lesson/<int:id>/', FlashcardByLessonView.as_view(), name='flashcard-by-lesson'),  # for GET
+    path('by-lesson/<int:id>/', flashcards_by_lesson if settings.ASYNC_VIEWS else FlashcardByLessonView.as_view(),
+         name='flashcard-by-lesson'),  # for GET
+    path('bulk/', FlashcardBulkView.as_view(), name='flashcard-bulk'),  # for POST, PATCH, DELETE
+    path('<int:id>/review/', FlashcardReviewView.as_view(), name='flashcard-review'),  # for POST
+    path('<int:id>/move/', FlashcardMoveView.as_view(), name='flashcard-move'),  # for POST
+    path('due/', DueFlashcardsView.as_view(), name='flashcard-due'),  # for GET
+    path('cache-stats/', DeckCacheStatsView.as_view(), name='flashcard-cache-stats'),  # for GET, DELETE
+    path('by-lesson/<int:id>/quiz/', QuizView.as_view(), name='flashcard-quiz'),  # for POST
+    path('quiz/<int:id>/answers/', QuizAnswersView.as_view(), name='flashcard-quiz-answers'),  # for POST
+    path('attempts/', StudyAttemptsView.as_view(), name='flashcard-attempts'),  # for POST
+    path('stats/', StudyStatsView.as_view(), name='flashcard-stats'),  # for GET
 ]
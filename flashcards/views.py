@@ -1,14 +1,35 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
 from django.shortcuts import render
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 
 # Create your views here.
 from rest_framework.views import APIView
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Flashcard
-from .serializers import FlashcardSerializer
+from lessons.conditional import conditional
+from lessons.models import Lesson
+from . import deck_cache, positions, quiz, rebalance, scheduler, study
+from .models import Flashcard, LessonStudyStats, QuizSession, ReviewState, StudyAttempt
+from .serializers import FlashcardBulkSerializer, FlashcardSerializer, LessonStudyStatsSerializer, \
+    ReviewStateSerializer, StudyAttemptSerializer, flashcard_values_serializer
+from .signals import deck_changed
 from django.shortcuts import get_object_or_404
 
+def _is_id(value):
+    # JSON true and false parse to bools, which are ints to Python
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def flashcard_validators(id):
+    return Flashcard.objects.filter(id=id).values('id', last_modified=F('updated_at'))
+
+
 class FlashcardDetailView(APIView):
+    @method_decorator(conditional(flashcard_validators))
     def get(self, request, id):
         flashcard = get_object_or_404(Flashcard, id=id)
         serializer = FlashcardSerializer(flashcard)
@@ -18,7 +39,8 @@ class FlashcardDetailView(APIView):
         flashcard = get_object_or_404(Flashcard, id=id)
         serializer = FlashcardSerializer(flashcard, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -31,18 +53,357 @@ class FlashcardCreateView(APIView):
     def post(self, request):
         serializer = FlashcardSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            # Lesson.card_count is adjusted by lessons.signals, in the same transaction
+            with transaction.atomic():
+                serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class FlashcardListView(APIView):
     def get(self, request):
-        flashcards = Flashcard.objects.filter(lesson__is_public=True)
-        serializer = FlashcardSerializer(flashcards, many=True)
-        return Response(serializer.data)
+        flashcards = flashcard_values_serializer.values(Flashcard.objects.filter(lesson__is_public=True))
+        return Response(flashcard_values_serializer.serialize(flashcards))
 
 class FlashcardByLessonView(APIView):
     def get(self, request, id):
-        flashcards = Flashcard.objects.filter(lesson=id)
-        serializer = FlashcardSerializer(flashcards, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        # Served from the deck cache, which holds the rendered JSON (see deck_cache)
+        return deck_cache.deck_response(request, deck_cache.get_deck(id))
+
+
+class DeckCacheStatsView(APIView):
+    """
+    Deck cache hits, misses and invalidations counted by this server process (staff only). DELETE resets them.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(deck_cache.stats())
+
+    def delete(self, request):
+        deck_cache.reset_stats()
+        return Response({'message': 'Deck cache stats reset'})
+
+
+class FlashcardBulkView(APIView):
+    """
+    Create, update or delete many flashcards of one lesson in a single request and a single transaction.
+
+    The body always names the lesson, plus either a list of cards ('cards') or a list of flashcard ids ('ids').
+    Validation errors are returned as a list with one entry per card, in request order, and nothing is written.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_lesson(self, request):
+        lesson_id = request.data.get('lesson')
+        if not _is_id(lesson_id):
+            return None, Response({'error': 'lesson must be a lesson id'}, status=status.HTTP_400_BAD_REQUEST)
+        lesson = get_object_or_404(Lesson, id=lesson_id)
+        if lesson.created_by_id != request.user.id and not request.user.is_staff:
+            return None, Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+        return lesson, None
+
+    def get_items(self, request, key):
+        items = request.data.get(key)
+        if not isinstance(items, list) or not items:
+            return None, Response({'error': f'Please provide a non-empty list of {key}'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.FLASHCARD_BULK_MAX_ITEMS:
+            return None, Response({'error': f'At most {settings.FLASHCARD_BULK_MAX_ITEMS} {key} per request'},
+                                  status=status.HTTP_400_BAD_REQUEST)
+        return items, None
+
+    def post(self, request):
+        lesson, error = self.get_lesson(request)
+        if error:
+            return error
+        cards, error = self.get_items(request, 'cards')
+        if error:
+            return error
+
+        serializer = FlashcardBulkSerializer(data=cards, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            flashcards = Flashcard.objects.bulk_create(
+                Flashcard(lesson=lesson, created_by_id=request.user.id, **card) for card in serializer.validated_data
+            )
+            deck_changed.send(sender=Flashcard, lesson_id=lesson.id)
+        return Response(FlashcardSerializer(flashcards, many=True).data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        lesson, error = self.get_lesson(request)
+        if error:
+            return error
+        cards, error = self.get_items(request, 'cards')
+        if error:
+            return error
+
+        serializer = FlashcardBulkSerializer(data=cards, many=True, partial=True)
+        valid = serializer.is_valid()
+        errors = serializer.errors if not valid else [{} for _ in cards]
+
+        ids = [card.get('id') if isinstance(card, dict) else None for card in cards]
+        flashcards = Flashcard.objects.filter(lesson=lesson, id__in=[i for i in ids if _is_id(i)]).in_bulk()
+        seen = set()
+        for index, flashcard_id in enumerate(ids):
+            if not _is_id(flashcard_id) or flashcard_id not in flashcards or flashcard_id in seen:
+                errors[index] = {**errors[index], 'id': ['Not a flashcard of this lesson, or listed twice']}
+                valid = False
+            seen.add(flashcard_id)
+        if not valid:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        for flashcard_id, changes in zip(ids, serializer.validated_data):
+            flashcard = flashcards[flashcard_id]
+            for field, value in changes.items():
+                setattr(flashcard, field, value)
+            # bulk_update does not apply auto_now
+            flashcard.updated_at = now
+        with transaction.atomic():
+            Flashcard.objects.bulk_update(flashcards.values(), ['front_text', 'back_text', 'updated_at'])
+            deck_changed.send(sender=Flashcard, lesson_id=lesson.id)
+        return Response(FlashcardSerializer([flashcards[i] for i in ids], many=True).data)
+
+    def delete(self, request):
+        lesson, error = self.get_lesson(request)
+        if error:
+            return error
+        ids, error = self.get_items(request, 'ids')
+        if error:
+            return error
+        if not all(_is_id(flashcard_id) for flashcard_id in ids):
+            return Response({'error': 'ids must be a list of flashcard ids'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            _, deleted = Flashcard.objects.filter(lesson=lesson, id__in=ids).delete()
+            deck_changed.send(sender=Flashcard, lesson_id=lesson.id)
+        return Response({'deleted': deleted.get(Flashcard._meta.label, 0)})
+
+
+class FlashcardReviewView(APIView):
+    """
+    Record a review of a flashcard, graded from 0 (forgotten) to 5 (perfect recall), and schedule the next one
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        flashcard = get_object_or_404(Flashcard.objects.select_related('lesson'), id=id)
+        if not flashcard.lesson.is_public and flashcard.lesson.created_by_id != request.user.id:
+            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+
+        quality = request.data.get('quality')
+        if not isinstance(quality, int) or isinstance(quality, bool) or not 0 <= quality <= 5:
+            return Response({'error': 'quality must be an integer from 0 to 5'}, status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        with transaction.atomic():
+            state, _ = ReviewState.objects.select_for_update().get_or_create(
+                user_id=request.user.id, flashcard=flashcard, defaults={'due_at': now}
+            )
+            scheduler.review(state, quality, now)
+            state.save()
+        return Response(ReviewStateSerializer(state).data)
+
+
+class FlashcardMoveView(APIView):
+    """
+    Move a flashcard within its lesson: right after the card `after`, or to the top of the deck when `after` is null.
+
+    The card gets a position key between its new neighbours, so only its own row is updated. The lesson is locked
+    meanwhile, so concurrent moves in a deck cannot hand out the same key.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get_key(self, flashcard, after_id):
+        # None when there is no room between the neighbours: cards sharing a key (appended concurrently), or a key
+        # that would not fit the column
+        others = Flashcard.objects.filter(lesson=flashcard.lesson_id).exclude(id=flashcard.id)
+        after = None
+        if after_id is not None:
+            after = others.filter(id=after_id).values_list('position', flat=True).get()
+            others = others.filter(Q(position__gt=after) | Q(position=after, id__gt=after_id))
+        before = others.order_by('position', 'id').values_list('position', flat=True).first()
+        try:
+            key = positions.between(after, before)
+        except ValueError:
+            return None
+        return key if len(key) <= Flashcard._meta.get_field('position').max_length else None
+
+    def post(self, request, id):
+        if 'after' not in request.data:
+            return Response({'error': 'Please provide after, the id of the card to move this one after, or null'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        after_id = request.data['after']
+        with transaction.atomic():
+            flashcard = get_object_or_404(Flashcard.objects.select_related('lesson'), id=id)
+            if flashcard.lesson.created_by_id != request.user.id and not request.user.is_staff:
+                return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+            if after_id is not None and (
+                    not _is_id(after_id) or after_id == flashcard.id
+                    or not Flashcard.objects.filter(id=after_id, lesson=flashcard.lesson_id).exists()):
+                return Response({'error': 'after must be the id of another card of the same lesson, or null'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            Lesson.objects.select_for_update().filter(id=flashcard.lesson_id).first()
+
+            key = self.get_key(flashcard, after_id)
+            if key is None:
+                rebalance.rebalance(flashcard.lesson_id)
+                key = self.get_key(flashcard, after_id)
+            flashcard.position = key
+            flashcard.save(update_fields=['position', 'updated_at'])
+        return Response(FlashcardSerializer(flashcard).data)
+
+
+class DueFlashcardsView(APIView):
+    """
+    The next flashcards the user should study, most overdue first.
+
+    Cards already studied come from one range scan of the (user, due_at) index. If fewer than `limit` of them are
+    due, the queue is topped up with cards of the user's own lessons that were never reviewed.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', settings.REVIEW_QUEUE_SIZE))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= settings.REVIEW_QUEUE_MAX_SIZE:
+            return Response({'error': f'limit must be between 1 and {settings.REVIEW_QUEUE_MAX_SIZE}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        states = list(ReviewState.objects.filter(user=request.user.id, due_at__lte=now)
+                      .select_related('flashcard').order_by('due_at')[:limit])
+        if len(states) < limit:
+            new_flashcards = Flashcard.objects.filter(lesson__created_by=request.user.id).exclude(
+                review_states__user=request.user.id).order_by('lesson', 'position', 'id')[:limit - len(states)]
+            states += [ReviewState(user_id=request.user.id, flashcard=flashcard, due_at=now)
+                       for flashcard in new_flashcards]
+        return Response(ReviewStateSerializer(states, many=True).data)
+
+
+def _int_parameter(data, name, default, maximum, minimum=1):
+    value = data.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or not minimum <= value <= maximum:
+        return None, Response({'error': f'{name} must be an integer from {minimum} to {maximum}'},
+                              status=status.HTTP_400_BAD_REQUEST)
+    return value, None
+
+
+class QuizView(APIView):
+    """
+    Generate a multiple choice quiz of a lesson: `questions` random cards (QUIZ_SIZE by default), each with its own
+    back_text and up to `choices` - 1 other cards' back_text as choices (QUIZ_CHOICES by default).
+
+    The quiz is kept as a QuizSession whose answers are graded by QuizAnswersView. The right choices are not part of
+    the response.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        lesson = get_object_or_404(Lesson, id=id)
+        if not lesson.is_public and lesson.created_by_id != request.user.id:
+            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+        size, error = _int_parameter(request.data, 'questions', settings.QUIZ_SIZE, settings.QUIZ_MAX_SIZE)
+        if error:
+            return error
+        choices, error = _int_parameter(request.data, 'choices', settings.QUIZ_CHOICES,
+                                            settings.QUIZ_MAX_CHOICES, minimum=2)
+        if error:
+            return error
+
+        questions = quiz.generate(lesson.id, size, choices)
+        if not questions:
+            return Response({'error': 'This lesson has no flashcards'}, status=status.HTTP_400_BAD_REQUEST)
+        session = QuizSession.objects.create(user_id=request.user.id, lesson=lesson, questions=[
+            [question['flashcard'], question.pop('answer')] for question in questions])
+        return Response({'id': session.id, 'lesson': lesson.id, 'questions': questions},
+                        status=status.HTTP_201_CREATED)
+
+
+class QuizAnswersView(APIView):
+    """
+    Grade all the answers to a quiz at once. The body lists the index of the chosen choice of every question, in
+    question order, or null for a skipped one. A quiz can only be graded once.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, id):
+        answers = request.data.get('answers')
+        with transaction.atomic():
+            session = get_object_or_404(QuizSession.objects.select_for_update(), id=id, user=request.user.id)
+            if session.graded_at is not None:
+                return Response({'error': 'This quiz was already graded'}, status=status.HTTP_409_CONFLICT)
+            if not isinstance(answers, list) or len(answers) != len(session.questions) or not all(
+                    answer is None or (isinstance(answer, int) and not isinstance(answer, bool)) for answer in answers):
+                return Response({'error': f'answers must be a list of {len(session.questions)} choice indexes or null'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            session.score, results = quiz.grade(session.questions, answers)
+            session.graded_at = timezone.now()
+            session.save(update_fields=['score', 'graded_at'])
+        return Response({'id': session.id, 'score': session.score, 'total': len(results), 'results': results})
+
+
+class StudyAttemptsView(APIView):
+    """
+    Record the answers of a study session in one request: a list of attempts, each with the flashcard, whether it
+    was answered correctly and the response time in milliseconds, in the order they were given.
+
+    Every card must belong to a public lesson or one of the user's own. Errors are returned as a list with one entry
+    per attempt and nothing is recorded. The response holds the updated study statistics of the lessons involved.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        attempts = request.data.get('attempts')
+        if not isinstance(attempts, list) or not attempts:
+            return Response({'error': 'Please provide a non-empty list of attempts'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(attempts) > settings.FLASHCARD_BULK_MAX_ITEMS:
+            return Response({'error': f'At most {settings.FLASHCARD_BULK_MAX_ITEMS} attempts per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = StudyAttemptSerializer(data=attempts, many=True)
+        valid = serializer.is_valid()
+        errors = serializer.errors if not valid else [{} for _ in attempts]
+
+        ids = [attempt.get('flashcard') if isinstance(attempt, dict) else None for attempt in attempts]
+        lessons = dict(Flashcard.objects.filter(
+            Q(lesson__is_public=True) | Q(lesson__created_by=request.user.id),
+            id__in=[i for i in ids if _is_id(i)]).values_list('id', 'lesson'))
+        for index, flashcard_id in enumerate(ids):
+            if not _is_id(flashcard_id) or flashcard_id not in lessons:
+                errors[index] = {**errors[index], 'flashcard': ['Not a flashcard of a public lesson or of yours']}
+                valid = False
+        if not valid:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = study.record(request.user.id, [
+            StudyAttempt(user_id=request.user.id, flashcard_id=attempt['flashcard'],
+                         lesson_id=lessons[attempt['flashcard']], correct=attempt['correct'],
+                         response_time_ms=attempt['response_time_ms'])
+            for attempt in serializer.validated_data
+        ])
+        return Response({'recorded': len(attempts), 'stats': LessonStudyStatsSerializer(rollups, many=True).data},
+                        status=status.HTTP_201_CREATED)
+
+
+class StudyStatsView(APIView):
+    """
+    The user's study statistics, one entry per lesson studied, most recently studied first. Read from the rollups
+    kept by the attempts endpoint. Filter on a lesson with ?lesson=<id>.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        rollups = LessonStudyStats.objects.filter(user=request.user.id).order_by('-last_studied_at', 'lesson')
+        lesson = request.query_params.get('lesson')
+        if lesson is not None:
+            try:
+                rollups = rollups.filter(lesson=int(lesson))
+            except ValueError:
+                return Response({'error': 'lesson must be a lesson id'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(LessonStudyStatsSerializer(rollups, many=True).data)
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the production profile, every value overridable from the environment:
+
+    gunicorn -c gunicorn.conf.py QuizWhiz_backend.asgi:application
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+# Uvicorn workers serve the ASGI application, so the async read views run natively (see lessons.async_views). The
+# export still streams there, through an async iterator (see lessons.export.aiter_sync).
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Threads only matter for the sync worker classes
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then so slow leaks cannot grow forever, staggered so they do not all restart together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    server.log.info('Starting %s %s workers on %s (timeout %ss, keepalive %ss, max_requests %s)', workers,
+                    worker_class, bind, timeout, keepalive, max_requests)
@@ -0,0 +1,56 @@
+"""
+Async twins of the hottest read views in views.py, routed instead of them when the project is served under ASGI
+(settings.ASYNC_VIEWS). They use the async ORM, so a worker keeps serving other requests while one waits on the
+database or on a slow client. Responses are the same as the DRF views'.
+"""
+from users.async_api import async_api_view, is_authenticated, json_response
+
+from .conditional import conditional
+from .models import Lesson
+from .includes import IncludeError, aadd_previews, get_includes
+from .pagination import KeysetPaginator, PaginationError
+from .serializers import LessonSerializer, lesson_values_serializer
+from .views import lesson_validators
+
+
+async def paginated_lessons_response(request, lessons):
+    paginator = KeysetPaginator(request)
+    try:
+        includes = get_includes(request)
+        page = await paginator.apaginate_queryset(lesson_values_serializer.values(lessons))
+    except (PaginationError, IncludeError) as e:
+        return json_response({'error': str(e)}, status=400)
+    rows = lesson_values_serializer.serialize(page)
+    if 'preview' in includes:
+        await aadd_previews(rows)
+    return json_response(paginator.get_paginated_data(rows))
+
+
+@async_api_view(permission=is_authenticated)
+async def list_lessons(request):
+    """
+    List all lessons
+    """
+    if not request.user.is_staff:
+        return json_response({'error': 'Unauthorized'}, status=401)
+    return await paginated_lessons_response(request, Lesson.objects.all())
+
+
+@async_api_view()
+async def list_public_lessons(request):
+    """
+    List all public lessons
+    """
+    return await paginated_lessons_response(request, Lesson.objects.filter(is_public=True))
+
+
+@async_api_view()
+@conditional(lesson_validators)
+async def get_lesson_by_id(request, id):
+    """
+    Get a lesson by ID
+    """
+    lesson = await Lesson.objects.filter(id=id).afirst()
+    if lesson is None:
+        return json_response({'error': 'Lesson not found'}, status=404)
+    return json_response(LessonSerializer(lesson).data)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def row_validators(row):
+    # The ETag joins every value of the row, Last-Modified is its last_modified value
+    etag = quote_etag('-'.join(str(value.timestamp()) if isinstance(value, datetime) else str(value)
+                               for value in row.values()))
+    last_modified = row.get('last_modified')
+    return etag, last_modified and int(last_modified.timestamp())
+
+
+def _respond(request, row):
+    if row is None:
+        return None, None, None
+    etag, last_modified = row_validators(row)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified), etag, last_modified
+
+
+def set_validator_headers(response, etag, last_modified):
+    # Also set on 304 responses, which must carry the validators they were answered with
+    if etag and 200 <= response.status_code < 400:
+        response.headers.setdefault('ETag', etag)
+        if last_modified:
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+    return response
+
+
+def conditional(validators):
+    """
+    Decorator adding ETag and Last-Modified to a GET view and answering 304 Not Modified to a client whose copy is
+    still current, before the view runs.
+
+    validators(**view_kwargs) returns a queryset of at most one dict row, meant to be a cheap query (a primary key
+    lookup or an aggregate) whose values change whenever the response would. The ETag is built from all of its
+    values and Last-Modified is its `last_modified` value. Without a row the view runs as usual. Works on sync and
+    async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                response, etag, last_modified = _respond(request, await validators(**kwargs).afirst())
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return set_validator_headers(response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            response, etag, last_modified = _respond(request, validators(**kwargs).first())
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return set_validator_headers(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+"""
+Denormalized counters: Lesson.card_count, User.lesson_count and User.public_lesson_count.
+
+lessons.signals adjusts them with F() updates as lessons and flashcards are saved and deleted, in the transaction of
+the write, and recounts a lesson's cards when they were written in bulk (deck_changed). reconcile() recounts them
+from the Lesson and Flashcard tables in batches to repair drift from writes that bypass signals.
+"""
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from flashcards.models import Flashcard
+from users import cache as user_cache
+from users.models import User
+
+from .models import Lesson
+
+
+def _count(queryset, column, **filters):
+    counts = queryset.filter(**{column: OuterRef('pk')}, **filters).order_by().values(column).annotate(
+        count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def _expected():
+    # Counter columns of each model with the expression recounting them
+    return {
+        Lesson: {'card_count': _count(Flashcard.objects, 'lesson')},
+        User: {'lesson_count': _count(Lesson.objects, 'created_by'),
+               'public_lesson_count': _count(Lesson.objects, 'created_by', is_public=True)},
+    }
+
+
+def adjust_cards(lesson_id, delta):
+    Lesson.objects.filter(id=lesson_id).update(card_count=F('card_count') + delta)
+
+
+def adjust_lessons(user_id, delta, public_delta):
+    if delta or public_delta:
+        User.objects.filter(id=user_id).update(lesson_count=F('lesson_count') + delta,
+                                               public_lesson_count=F('public_lesson_count') + public_delta)
+        # The user cache holds the row the current user endpoint serializes
+        transaction.on_commit(lambda: user_cache.invalidate(user_id))
+
+
+def recount_cards(lesson_id):
+    Lesson.objects.filter(id=lesson_id).update(card_count=_expected()[Lesson]['card_count'])
+
+
+def reconcile(batch_size=1000, progress=None):
+    """
+    Recount every counter, batch_size rows at a time with one transaction per batch, and return the number of rows
+    fixed per model name. progress(model_name, last_id, fixed) is called after every batch.
+    """
+    fixed = {}
+    for model, counters in _expected().items():
+        name = model._meta.model_name
+        fixed[name] = 0
+        last_id = 0
+        while True:
+            ids = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            last_id = ids[-1]
+            drift = Q()
+            for column in counters:
+                drift |= ~Q(**{column: F(f'expected_{column}')})
+            with transaction.atomic():
+                drifted = list(model.objects.filter(id__in=ids).annotate(
+                    **{f'expected_{column}': expression for column, expression in counters.items()}
+                ).filter(drift).values_list('id', flat=True))
+                if drifted:
+                    model.objects.filter(id__in=drifted).update(**counters)
+            if model is User:
+                for user_id in drifted:
+                    user_cache.invalidate(user_id)
+            fixed[name] += len(drifted)
+            if progress:
+                progress(name, last_id, fixed[name])
+    return fixed
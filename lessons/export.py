@@ -0,0 +1,133 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from flashcards.models import Flashcard
+
+from .models import Lesson
+
+LESSON_FIELDS = ['id', 'title', 'description', 'category', 'is_public', 'created_at', 'updated_at']
+FLASHCARD_FIELDS = ['id', 'lesson_id', 'front_text', 'back_text', 'position', 'created_at', 'updated_at']
+CSV_HEADER = ['lesson_id', 'lesson_title', 'lesson_description', 'category', 'is_public',
+              'flashcard_id', 'front_text', 'back_text']
+
+# Rows are joined into chunks of roughly this many characters before being handed to the server
+BUFFER_SIZE = 64 * 1024
+
+
+def iter_decks(user_id):
+    """
+    Yield (lesson, flashcards) for every lesson of a user, where lesson is a dict and flashcards an iterator of dicts
+    that must be consumed before moving on to the next lesson.
+
+    Lessons and flashcards are read with two chunked server-side cursors, both ordered by lesson id (the cards of a
+    lesson in deck order), and merged as they stream, so memory use and the number of queries do not depend on how
+    many lessons or cards the user owns.
+    """
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    lessons = Lesson.objects.filter(created_by=user_id).order_by('id').values(*LESSON_FIELDS)
+    flashcards = Flashcard.objects.filter(lesson__created_by=user_id).order_by(
+        'lesson_id', 'position', 'id').values(*FLASHCARD_FIELDS).iterator(chunk_size=chunk_size)
+    pending = [next(flashcards, None)]
+
+    def deck(lesson_id):
+        while pending[0] is not None and pending[0]['lesson_id'] <= lesson_id:
+            flashcard = pending[0]
+            pending[0] = next(flashcards, None)
+            if flashcard['lesson_id'] == lesson_id:
+                yield flashcard
+
+    for lesson in lessons.iterator(chunk_size=chunk_size):
+        flashcards_of_lesson = deck(lesson['id'])
+        yield lesson, flashcards_of_lesson
+        for _ in flashcards_of_lesson:
+            pass
+
+
+def _buffered(strings):
+    # The first row goes out on its own so the client gets the first byte without waiting for a full buffer
+    strings = iter(strings)
+    first = next(strings, None)
+    if first is not None:
+        yield first
+    buffer = []
+    size = 0
+    for string in strings:
+        buffer.append(string)
+        size += len(string)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _json_line(row_type, row):
+    row = {key: value.isoformat() if hasattr(value, 'isoformat') else value for key, value in row.items()}
+    return json.dumps({'type': row_type, **row}) + '\n'
+
+
+def _ndjson_lines(user_id):
+    for lesson, flashcards in iter_decks(user_id):
+        yield _json_line('lesson', lesson)
+        for flashcard in flashcards:
+            flashcard['lesson'] = flashcard.pop('lesson_id')
+            yield _json_line('flashcard', flashcard)
+
+
+def iter_ndjson(user_id):
+    """
+    One JSON object per line: each lesson ("type": "lesson") followed by its flashcards ("type": "flashcard")
+    """
+    return _buffered(_ndjson_lines(user_id))
+
+
+class _Echo:
+    """
+    File-like object whose write() returns the value, so csv.writer produces strings instead of buffering them
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_rows(user_id):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for lesson, flashcards in iter_decks(user_id):
+        lesson_columns = [lesson['id'], lesson['title'], lesson['description'], lesson['category'],
+                          lesson['is_public']]
+        empty = True
+        for flashcard in flashcards:
+            empty = False
+            yield writer.writerow(lesson_columns + [flashcard['id'], flashcard['front_text'], flashcard['back_text']])
+        if empty:
+            yield writer.writerow(lesson_columns + ['', '', ''])
+
+
+def iter_csv(user_id):
+    """
+    One row per flashcard with its lesson's columns repeated. Lessons without flashcards get a single row with
+    empty flashcard columns.
+    """
+    return _buffered(_csv_rows(user_id))
+
+
+async def aiter_sync(chunks):
+    """
+    Iterate the chunks of iter_ndjson() or iter_csv() from async code.
+
+    Under ASGI Django reads a StreamingHttpResponse over a sync iterator into a list before sending any of it; handing
+    it this async iterator instead keeps the export streaming. Every chunk is produced in the request's sync thread,
+    so the server-side cursors stay on the connection that opened them.
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
@@ -0,0 +1,137 @@
+import csv
+import itertools
+import json
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from flashcards.models import Flashcard
+from flashcards.signals import deck_changed
+
+from .models import ImportJob
+
+FORMATS = ('csv', 'ndjson')
+CSV_HEADERS = {('front', 'back'), ('front_text', 'back_text')}
+
+
+class DeckImportError(Exception):
+    pass
+
+
+def guess_format(file_name):
+    """
+    Return the import format matching a file name's extension, or None
+    """
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    if extension in ('csv', 'tsv', 'txt'):
+        return 'csv'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_csv_cards(lines):
+    """
+    Yield (front_text, back_text) from CSV rows, one row at a time.
+
+    Accepts two column files (tab separated Anki text exports included, with their '#' header lines), with or
+    without a front/back header, as well as the CSV produced by the lesson export.
+    """
+    lines = itertools.dropwhile(lambda line: line.startswith('#'), lines)
+    first_line = next(lines, None)
+    if first_line is None:
+        return
+    delimiter = '\t' if '\t' in first_line else ','
+    reader = csv.reader(itertools.chain([first_line], lines), delimiter=delimiter)
+    rows = reader
+
+    front, back = 0, 1
+    first_row = next(reader)
+    header = [column.strip().lower() for column in first_row]
+    if 'front_text' in header and 'back_text' in header:
+        front, back = header.index('front_text'), header.index('back_text')
+    elif tuple(header[:2]) not in CSV_HEADERS:
+        rows = itertools.chain([first_row], reader)
+
+    for row in rows:
+        if len(row) <= max(front, back):
+            if any(row):
+                raise DeckImportError(f'Line {reader.line_num}: expected a front and a back column')
+            continue
+        if not row[front] and not row[back]:
+            # Lessons without cards in the lesson export
+            continue
+        yield row[front], row[back]
+
+
+def iter_ndjson_cards(lines):
+    """
+    Yield (front_text, back_text) from one JSON object per line. Lesson lines of the lesson export are skipped.
+    """
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise DeckImportError(f'Line {line_number}: invalid JSON')
+        if not isinstance(row, dict):
+            raise DeckImportError(f'Line {line_number}: expected an object')
+        if row.get('type') == 'lesson':
+            continue
+        front_text, back_text = row.get('front_text'), row.get('back_text')
+        if not isinstance(front_text, str) or not isinstance(back_text, str):
+            raise DeckImportError(f'Line {line_number}: front_text and back_text must be strings')
+        yield front_text, back_text
+
+
+def iter_cards(lines, file_format):
+    if file_format == 'csv':
+        return iter_csv_cards(lines)
+    return iter_ndjson_cards(lines)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def run_import(job, lines, progress=None):
+    """
+    Import the cards read from `lines` (any iterable of text lines, such as a text mode file) into the job's lesson.
+
+    Rows are parsed lazily and inserted with bulk_create in chunks of job.chunk_size. Every chunk commits together
+    with the job's checkpoint, so peak memory is one chunk whatever the file size. If the job already has rows
+    imported, that many rows are skipped first, so re-running a failed job with the same file resumes it.
+    progress(job) is called after every chunk.
+    """
+    cards = iter_cards(lines, job.file_format)
+    try:
+        for _ in itertools.islice(cards, job.rows_imported):
+            pass
+        for chunk in _chunks(cards, job.chunk_size):
+            with transaction.atomic():
+                Flashcard.objects.bulk_create(
+                    Flashcard(front_text=front_text, back_text=back_text, lesson_id=job.lesson_id,
+                              created_by_id=job.created_by_id)
+                    for front_text, back_text in chunk
+                )
+                ImportJob.objects.filter(id=job.id).update(rows_imported=F('rows_imported') + len(chunk),
+                                                           chunks_committed=F('chunks_committed') + 1,
+                                                           updated_at=timezone.now())
+            job.rows_imported += len(chunk)
+            job.chunks_committed += 1
+            if progress:
+                progress(job)
+    except (DeckImportError, UnicodeDecodeError, csv.Error) as e:
+        job.status = ImportJob.FAILED
+        job.error = f'{e} (after {job.rows_imported} imported rows)'
+    else:
+        job.status = ImportJob.COMPLETED
+        job.error = ''
+    job.save(update_fields=['status', 'error', 'updated_at'])
+    if job.chunks_committed:
+        deck_changed.send(sender=Flashcard, lesson_id=job.lesson_id)
+    return job
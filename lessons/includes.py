@@ -0,0 +1,65 @@
+"""
+Optional extras of the lesson listings, requested with include=card_count,preview.
+
+card_count is a column of every lesson since the counters were denormalized (see lessons.counters), so it is
+accepted but changes nothing. preview is the first LESSON_PREVIEW_SIZE flashcards of every lesson of the page,
+fetched together in one query ranking each lesson's cards with a window function (which reads all the cards of those
+lessons from the (lesson, position) index). A page costs the same number of queries whatever its size.
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from flashcards.models import Flashcard
+from flashcards.serializers import flashcard_values_serializer
+
+INCLUDES = ('card_count', 'preview')
+
+
+class IncludeError(Exception):
+    pass
+
+
+def get_includes(request):
+    """
+    Read the include query parameter into a set of INCLUDES
+    """
+    include = request.GET.get('include')
+    if not include:
+        return set()
+    includes = {name.strip() for name in include.split(',') if name.strip()}
+    unknown = includes.difference(INCLUDES)
+    if unknown:
+        raise IncludeError(f'Unknown include: {", ".join(sorted(unknown))} (expected {", ".join(INCLUDES)})')
+    return includes
+
+
+def _preview_queryset(rows):
+    ranked = Flashcard.objects.filter(lesson__in=[row['id'] for row in rows]).annotate(
+        rank=Window(RowNumber(), partition_by=F('lesson'), order_by=[F('position').asc(), F('id').asc()]))
+    return flashcard_values_serializer.values(ranked.filter(rank__lte=settings.LESSON_PREVIEW_SIZE).order_by(
+        'lesson', 'position', 'id'))
+
+
+def _add_previews(rows, flashcards):
+    previews = {row['id']: [] for row in rows}
+    for flashcard in flashcard_values_serializer.serialize(flashcards):
+        previews[flashcard['lesson']].append(flashcard)
+    for row in rows:
+        row['preview'] = previews[row['id']]
+    return rows
+
+
+def add_previews(rows):
+    """
+    Add the preview flashcards to serialized lesson rows
+    """
+    if not rows:
+        return rows
+    return _add_previews(rows, list(_preview_queryset(rows)))
+
+
+async def aadd_previews(rows):
+    if not rows:
+        return rows
+    return _add_previews(rows, [flashcard async for flashcard in _preview_queryset(rows)])
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import CategoryCount, Lesson
+
+_lock = threading.Lock()
+_cache = {'rows': None, 'expires_at': 0}
+
+
+def get_top_categories(n):
+    """
+    Return the n categories with the most lessons as [{'category': ..., 'count': ...}], largest first.
+
+    The ranking (up to TOP_CATEGORIES_MAX entries) is cached in-process for TOP_CATEGORIES_CACHE_TTL seconds and
+    dropped as soon as a count changes.
+    """
+    with _lock:
+        rows = _cache['rows']
+        if rows is None or _cache['expires_at'] <= time.monotonic():
+            rows = [
+                {'category': category, 'count': count}
+                for category, count in CategoryCount.objects.filter(lesson_count__gt=0).order_by(
+                    '-lesson_count', 'category').values_list('category', 'lesson_count')[:settings.TOP_CATEGORIES_MAX]
+            ]
+            _cache['rows'] = rows
+            _cache['expires_at'] = time.monotonic() + settings.TOP_CATEGORIES_CACHE_TTL
+    return rows[:n]
+
+
+def invalidate():
+    with _lock:
+        _cache['rows'] = None
+
+
+def adjust(category, delta):
+    """
+    Add delta to the lesson count of a category, creating its row on first use
+    """
+    updated = CategoryCount.objects.filter(category=category).update(lesson_count=F('lesson_count') + delta)
+    if not updated and delta > 0:
+        try:
+            with transaction.atomic():
+                CategoryCount.objects.create(category=category, lesson_count=delta)
+        except IntegrityError:
+            # Another request created the row first
+            CategoryCount.objects.filter(category=category).update(lesson_count=F('lesson_count') + delta)
+    transaction.on_commit(invalidate)
+
+
+@transaction.atomic
+def rebuild():
+    """
+    Recount every category from the Lesson table
+    """
+    CategoryCount.objects.all().delete()
+    CategoryCount.objects.bulk_create(
+        CategoryCount(category=row['category'], lesson_count=row['lesson_count'])
+        for row in Lesson.objects.values('category').annotate(lesson_count=Count('id'))
+    )
+    transaction.on_commit(invalidate)
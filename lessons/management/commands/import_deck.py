@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from lessons import importer
+from lessons.models import ImportJob, Lesson
+
+
+class Command(BaseCommand):
+    help = 'Import a CSV or NDJSON deck of flashcards into a new or existing lesson, streaming the file in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Deck file to import')
+        parser.add_argument('--user', help='Username of the owner of the imported cards (required for new imports)')
+        parser.add_argument('--lesson', type=int, help='Existing lesson to import into')
+        parser.add_argument('--title', help='Title of the lesson to create')
+        parser.add_argument('--description', help='Description of the lesson to create')
+        parser.add_argument('--category', help='Category of the lesson to create')
+        parser.add_argument('--public', action='store_true', help='Make the created lesson public')
+        parser.add_argument('--file-format', choices=importer.FORMATS,
+                            help='Format of the file (defaults to the one matching its extension)')
+        parser.add_argument('--chunk-size', type=int, default=settings.IMPORT_CHUNK_SIZE,
+                            help='Number of cards committed together')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Resume a failed import from its checkpoint')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            job = ImportJob.objects.filter(id=options['resume']).first()
+            if job is None:
+                raise CommandError(f'Import job {options["resume"]} does not exist')
+            if job.status == ImportJob.COMPLETED:
+                raise CommandError(f'Import job {job.id} has already completed')
+            self.stdout.write(f'Resuming import job {job.id} after {job.rows_imported} rows')
+        else:
+            job = self.create_job(options)
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            importer.run_import(job, lines, progress=self.report_progress)
+
+        if job.status == ImportJob.FAILED:
+            raise CommandError(f'Import job {job.id} failed: {job.error}. Fix the file and run again with '
+                               f'--resume {job.id}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {job.rows_imported} cards into lesson {job.lesson_id} (job {job.id})'))
+
+    def create_job(self, options):
+        file_format = options['file_format'] or importer.guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot tell the format from the file name, please pass --file-format')
+        user = get_user_model().objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError('Please pass the --user owning the imported cards')
+
+        if options['lesson']:
+            lesson = Lesson.objects.filter(id=options['lesson']).first()
+            if lesson is None:
+                raise CommandError(f'Lesson {options["lesson"]} does not exist')
+        elif options['title'] and options['category']:
+            lesson = Lesson.objects.create(title=options['title'], description=options['description'],
+                                           category=options['category'], created_by=user,
+                                           is_public=options['public'])
+        else:
+            raise CommandError('Please pass --lesson, or --title and --category')
+
+        return ImportJob.objects.create(lesson=lesson, created_by=user, file_name=options['path'],
+                                        file_format=file_format, chunk_size=options['chunk_size'])
+
+    def report_progress(self, job):
+        self.stdout.write(f'  chunk {job.chunks_committed}: {job.rows_imported} cards imported')
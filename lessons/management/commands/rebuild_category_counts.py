@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from lessons import leaderboard
+from lessons.models import CategoryCount
+
+
+class Command(BaseCommand):
+    help = 'Recount the lessons in every category from scratch, repairing the top categories leaderboard'
+
+    def handle(self, *args, **options):
+        leaderboard.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counts for {CategoryCount.objects.count()} categories'))
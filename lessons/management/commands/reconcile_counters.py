@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lessons import counters
+
+
+class Command(BaseCommand):
+    help = ('Recount Lesson.card_count and the lesson counts of every user, in batches, repairing counters that '
+            'drifted from writes bypassing the signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.COUNTER_RECONCILE_BATCH_SIZE,
+                            help='Rows recounted per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        fixed = counters.reconcile(options['batch_size'], progress=self.report if options['verbosity'] > 1 else None)
+        for name, count in fixed.items():
+            self.stdout.write(f'Fixed the counters of {count} {name} rows')
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
+
+    def report(self, name, last_id, fixed):
+        self.stdout.write(f'{name}: up to id {last_id}, {fixed} fixed')
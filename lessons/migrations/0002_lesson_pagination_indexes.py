@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['-created_at', '-id'], name='lesson_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['is_public', '-created_at', '-id'], name='lesson_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='lesson_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='lesson_category_created_idx'),
+        ),
+    ]
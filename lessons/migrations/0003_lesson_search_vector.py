@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:31
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # tsvector and GIN only exist on Postgres, elsewhere lessons.search falls back to an in-process index
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE INDEX lesson_search_vector_idx ON lessons_lesson USING GIN (search_vector)')
+    schema_editor.execute("""
+        UPDATE lessons_lesson AS lesson SET search_vector =
+            setweight(to_tsvector('simple', lesson.title), 'A')
+            || setweight(to_tsvector('simple', coalesce(lesson.description, '')), 'B')
+            || setweight(to_tsvector('simple', coalesce((
+                SELECT string_agg(flashcard.front_text || ' ' || flashcard.back_text, ' ')
+                FROM flashcards_flashcard AS flashcard
+                WHERE flashcard.lesson_id = lesson.id
+            ), '')), 'C')
+    """)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS lesson_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0002_lesson_pagination_indexes'),
+        ('flashcards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:33
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_lessons(apps, schema_editor):
+    Lesson = apps.get_model('lessons', 'Lesson')
+    CategoryCount = apps.get_model('lessons', 'CategoryCount')
+    CategoryCount.objects.bulk_create(
+        CategoryCount(category=row['category'], lesson_count=row['lesson_count'])
+        for row in Lesson.objects.values('category').annotate(lesson_count=Count('id'))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0003_lesson_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=64, unique=True)),
+                ('lesson_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-lesson_count', 'category'], name='category_count_rank_idx')],
+            },
+        ),
+        migrations.RunPython(count_existing_lessons, migrations.RunPython.noop),
+    ]
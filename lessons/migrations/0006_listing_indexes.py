@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 15:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0005_import_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='lesson',
+            name='lesson_public_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-created_at', '-id'], name='lesson_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['created_by', '-created_at', '-id'], name='lesson_user_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['category', '-created_at', '-id'], name='lesson_category_public_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:25
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(queryset, column, **filters):
+    counts = queryset.filter(**{column: OuterRef('pk')}, **filters).order_by().values(column).annotate(
+        count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+def count_existing(apps, schema_editor):
+    Lesson = apps.get_model('lessons', 'Lesson')
+    Flashcard = apps.get_model('flashcards', 'Flashcard')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Lesson.objects.update(card_count=_count(Flashcard.objects, 'lesson'))
+    User.objects.update(lesson_count=_count(Lesson.objects, 'created_by'),
+                        public_lesson_count=_count(Lesson.objects, 'created_by', is_public=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0006_listing_indexes'),
+        ('flashcards', '0003_listing_indexes'),
+        ('users', '0002_user_lesson_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='card_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
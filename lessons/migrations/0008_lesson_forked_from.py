@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0007_lesson_card_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='forked_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='forks', to='lessons.lesson'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lessons', '0008_lesson_forked_from'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='categorycount',
+            name='lesson_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,16 @@
+class CounterFieldsMixin:
+    """
+    Model mixin for denormalized counters that are only ever written with F() updates (see lessons.counters), listed
+    in the model's counter_fields.
+
+    save() of an existing instance leaves them out of the UPDATE, so saving an instance loaded before one of its
+    counters changed does not write the stale value back.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [field.attname for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.attname not in self.counter_fields
+                                       and field.attname in self.__dict__]
+        super().save(*args, **kwargs)
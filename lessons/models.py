@@ -1,8 +1,18 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
 
+from .mixins import CounterFieldsMixin
+
+
+class LessonManager(models.Manager):
+    def get_queryset(self):
+        # The search vector can be large and is only ever read by the database, so don't load it with the lesson
+        return super().get_queryset().defer('search_vector')
+
+
 # Create your models here.
-class Lesson(models.Model):
+class Lesson(CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     category = models.CharField(max_length=64)
@@ -10,3 +20,68 @@ class Lesson(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lessons') #link to the user who created the lesson
     is_public = models.BooleanField(default=False)
+    # The lesson this one was copied from by the fork endpoint, for attribution
+    forked_from = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='forks')
+    # Number of flashcards, kept up to date by lessons.signals (see lessons.counters). Not a PositiveIntegerField so
+    # that a counter which drifted to 0 cannot make a delete fail, reconcile_counters repairs drift.
+    card_count = models.IntegerField(default=0)
+    # Full-text search document over the title, description and flashcards, maintained by lessons.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = LessonManager()
+
+    counter_fields = ('card_count',)
+
+    class Meta:
+        # These back the keyset pagination of the lesson listings, which always order by (created_at, id). Listings
+        # of public lessons, by far the most common, get partial indexes holding only the public rows.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='lesson_created_idx'),
+            models.Index(fields=['-created_at', '-id'], condition=models.Q(is_public=True),
+                         name='lesson_public_created_idx'),
+            models.Index(fields=['created_by', '-created_at', '-id'], name='lesson_user_created_idx'),
+            models.Index(fields=['created_by', '-created_at', '-id'], condition=models.Q(is_public=True),
+                         name='lesson_user_public_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='lesson_category_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], condition=models.Q(is_public=True),
+                         name='lesson_category_public_idx'),
+        ]
+
+
+class CategoryCount(models.Model):
+    """
+    Number of lessons in each category, kept up to date by lessons.signals so the leaderboard never has to group the
+    whole Lesson table
+    """
+    category = models.CharField(max_length=64, unique=True)
+    # Not a PositiveIntegerField: a decrement racing a rebuild may take a count below zero for a moment, which must
+    # not fail the lesson write that sent it. The leaderboard skips counts under one.
+    lesson_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-lesson_count', 'category'], name='category_count_rank_idx'),
+        ]
+
+
+class ImportJob(models.Model):
+    """
+    Progress of a deck import. Cards are committed in chunks and rows_imported is the checkpoint a failed import
+    resumes from.
+    """
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(RUNNING, 'Running'), (COMPLETED, 'Completed'), (FAILED, 'Failed')]
+
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='import_jobs')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='import_jobs')
+    file_name = models.CharField(max_length=255, blank=True)
+    file_format = models.CharField(max_length=8)
+    chunk_size = models.PositiveIntegerField()
+    rows_imported = models.PositiveIntegerField(default=0)
+    chunks_committed = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=RUNNING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
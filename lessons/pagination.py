@@ -0,0 +1,101 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class PaginationError(Exception):
+    pass
+
+
+def encode_cursor(*values):
+    """
+    Pack the given values into an opaque, URL safe cursor string
+    """
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, count):
+    """
+    Unpack a cursor produced by encode_cursor into exactly `count` string values
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError('Invalid cursor')
+    if len(values) != count:
+        raise PaginationError('Invalid cursor')
+    return values
+
+
+def get_page_size(request):
+    """
+    Read the page_size query parameter, falling back to the default and capping it at the maximum
+    """
+    page_size = request.GET.get('page_size')
+    if page_size is None:
+        return settings.LESSONS_PAGE_SIZE
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise PaginationError('Invalid page_size')
+    if page_size < 1:
+        raise PaginationError('Invalid page_size')
+    return min(page_size, settings.LESSONS_MAX_PAGE_SIZE)
+
+
+class KeysetPaginator:
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Instead of OFFSET, every page filters on the position of the last row of the previous page, so with an index on
+    (created_at, id) the cost of a page does not depend on how deep the client has paged. Querysets of model
+    instances and of .values() rows are both supported.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.page_size = get_page_size(request)
+        self.next_cursor = None
+
+    def paginate_queryset(self, queryset):
+        return self._page(list(self._page_queryset(queryset)))
+
+    async def apaginate_queryset(self, queryset):
+        return self._page([row async for row in self._page_queryset(queryset)])
+
+    def _page_queryset(self, queryset):
+        cursor = self.request.GET.get('cursor')
+        if cursor:
+            created_at, pk = decode_cursor(cursor, 2)
+            try:
+                created_at = parse_datetime(created_at)
+                pk = int(pk)
+            except ValueError:
+                raise PaginationError('Invalid cursor')
+            if created_at is None:
+                raise PaginationError('Invalid cursor')
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        # Fetch one extra row to find out whether there is a next page without a COUNT query
+        return queryset.order_by('-created_at', '-id')[:self.page_size + 1]
+
+    def _page(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            last = rows[-1]
+            if isinstance(last, dict):
+                self.next_cursor = encode_cursor(last['created_at'].isoformat(), last['id'])
+            else:
+                self.next_cursor = encode_cursor(last.created_at.isoformat(), last.id)
+        return rows
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.next_cursor,
+            'results': data,
+        }
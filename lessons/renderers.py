@@ -0,0 +1,47 @@
+import re
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson writes floats from 1e-5 to 1e-4 without an exponent and exponents without a sign or leading zero (1e16 where
+# json writes 1e+16), and writes every other float the same. Output where one of those may appear is rendered again.
+_FLOAT_MISMATCH = re.compile(rb'\d[eE]|0\.0000')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    DRF's JSON renderer with orjson doing the encoding, producing the same bytes as JSONRenderer with the default
+    (compact, unicode, strict) settings, except that NaN and infinity become null instead of raising.
+
+    Requests asking for an indented response, data orjson cannot encode (integers over 64 bits, lone surrogates),
+    output that may hold floats orjson writes differently and installs without orjson go through JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return render_json(data)
+
+
+def render_json(data):
+    """
+    Encode data like JSONRenderer().render(data)
+    """
+    if orjson is None:
+        return JSONRenderer().render(data)
+    try:
+        # Dates and times go to DRF's encoder, which writes them its own way (milliseconds, Z for UTC)
+        rendered = orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data)
+    if _FLOAT_MISMATCH.search(rendered):
+        return JSONRenderer().render(data)
+    # Escaped by JSONRenderer as they end lines in javascript
+    return rendered.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,193 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+
+from flashcards.models import Flashcard
+
+from .models import Lesson
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a match in each part of a lesson, highest first
+TITLE_WEIGHT = 'A'
+DESCRIPTION_WEIGHT = 'B'
+FLASHCARD_WEIGHT = 'C'
+
+
+def tokenize(text):
+    """
+    Split text into lowercase word tokens
+    """
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class PostgresSearchBackend:
+    """
+    Full-text search on the GIN indexed Lesson.search_vector column.
+
+    Terms are matched as prefixes with the 'simple' configuration, so partial words match the way the old
+    title__icontains search did for word beginnings.
+    """
+    config = 'simple'
+
+    def vector(self):
+        """
+        Expression computing the search vector of a lesson row
+        """
+        flashcard_text = Flashcard.objects.filter(lesson=OuterRef('pk')).values('lesson').annotate(
+            text=StringAgg(Concat('front_text', Value(' '), 'back_text', output_field=TextField()), delimiter=' ')
+        ).values('text')
+        description = Coalesce('description', Value(''), output_field=TextField())
+        flashcard_text = Coalesce(Subquery(flashcard_text), Value(''), output_field=TextField())
+        return (SearchVector('title', weight=TITLE_WEIGHT, config=self.config)
+                + SearchVector(description, weight=DESCRIPTION_WEIGHT, config=self.config)
+                + SearchVector(flashcard_text, weight=FLASHCARD_WEIGHT, config=self.config))
+
+    def index_lesson(self, lesson_id):
+        Lesson.objects.filter(id=lesson_id).update(search_vector=self.vector())
+
+    def reindex_all(self):
+        Lesson.objects.update(search_vector=self.vector())
+
+    def remove_lesson(self, lesson_id):
+        # The vector lives on the lesson row, so it goes away with it
+        pass
+
+    def search(self, terms, lessons, offset, limit):
+        query = SearchQuery(' | '.join(f'{term}:*' for term in terms), search_type='raw', config=self.config)
+        lessons = lessons.filter(search_vector=query).annotate(rank=SearchRank(F('search_vector'), query))
+        rows = list(lessons.order_by('-rank', '-id')[offset:offset + limit + 1])
+        next_offset = offset + limit if len(rows) > limit else None
+        return rows[:limit], next_offset
+
+
+class InvertedIndexSearchBackend:
+    """
+    In-process inverted index used where Postgres full-text search is unavailable (the sqlite test settings).
+
+    The index maps every token to the lessons containing it and keeps a sorted vocabulary, so a prefix lookup is a
+    binary search and a query only touches the postings of matching tokens. It is built from the database on the
+    first search and kept up to date by the same signals as the Postgres column. Each process holds its own copy, so
+    this backend is not meant for multi-worker deployments.
+    """
+    weights = {TITLE_WEIGHT: 3, DESCRIPTION_WEIGHT: 2, FLASHCARD_WEIGHT: 1}
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.postings = defaultdict(dict)  # token -> {lesson id: score}
+        self.documents = {}  # lesson id -> (created_at, tokens)
+        self.vocabulary = []  # every token ever indexed, sorted
+
+    def build(self):
+        with self.lock:
+            self.postings.clear()
+            self.documents.clear()
+            self.vocabulary = []
+            flashcard_text = defaultdict(list)
+            for lesson_id, front_text, back_text in Flashcard.objects.values_list(
+                    'lesson_id', 'front_text', 'back_text').iterator(chunk_size=2000):
+                flashcard_text[lesson_id] += [front_text, back_text]
+            for lesson_id, title, description, created_at in Lesson.objects.values_list(
+                    'id', 'title', 'description', 'created_at').iterator(chunk_size=2000):
+                self._add(lesson_id, created_at, title, description, flashcard_text.pop(lesson_id, []))
+            self.built = True
+
+    def reindex_all(self):
+        self.build()
+
+    def index_lesson(self, lesson_id):
+        with self.lock:
+            if not self.built:
+                # The first search builds the whole index, this lesson included
+                return
+            self.remove_lesson(lesson_id)
+            lesson = Lesson.objects.filter(id=lesson_id).values_list('title', 'description', 'created_at').first()
+            if lesson is None:
+                return
+            title, description, created_at = lesson
+            flashcard_text = []
+            for front_text, back_text in Flashcard.objects.filter(lesson=lesson_id).values_list('front_text',
+                                                                                                 'back_text'):
+                flashcard_text += [front_text, back_text]
+            self._add(lesson_id, created_at, title, description, flashcard_text)
+
+    def remove_lesson(self, lesson_id):
+        with self.lock:
+            document = self.documents.pop(lesson_id, None)
+            if document is None:
+                return
+            for token in document[1]:
+                self.postings[token].pop(lesson_id, None)
+
+    def _add(self, lesson_id, created_at, title, description, flashcard_text):
+        scores = defaultdict(int)
+        for weight, texts in ((TITLE_WEIGHT, [title]), (DESCRIPTION_WEIGHT, [description]),
+                              (FLASHCARD_WEIGHT, flashcard_text)):
+            for text in texts:
+                for token in tokenize(text):
+                    scores[token] += self.weights[weight]
+        for token, score in scores.items():
+            if token not in self.postings:
+                self.vocabulary.insert(bisect_left(self.vocabulary, token), token)
+            self.postings[token][lesson_id] = score
+        self.documents[lesson_id] = (created_at, tuple(scores))
+
+    def _score(self, terms):
+        scores = defaultdict(int)
+        for term in terms:
+            position = bisect_left(self.vocabulary, term)
+            while position < len(self.vocabulary) and self.vocabulary[position].startswith(term):
+                for lesson_id, score in self.postings[self.vocabulary[position]].items():
+                    scores[lesson_id] += score
+                position += 1
+        return scores
+
+    def search(self, terms, lessons, offset, limit):
+        with self.lock:
+            if not self.built:
+                self.build()
+            scores = self._score(terms)
+            stamps = {lesson_id: self.documents[lesson_id][0] for lesson_id in scores}
+        ranked = sorted(scores, key=lambda lesson_id: (-scores[lesson_id], -lesson_id))
+
+        # Walk the ranking in chunks and keep the candidates the caller is allowed to see, until the page is full
+        page = []
+        position = offset
+        while position < len(ranked) and len(page) < limit:
+            chunk = ranked[position:position + limit * 2]
+            found = {lesson.id: lesson for lesson in lessons.filter(id__in=chunk)}
+            for lesson_id in chunk:
+                position += 1
+                lesson = found.get(lesson_id)
+                if lesson is None:
+                    continue
+                if lesson.created_at != stamps[lesson_id]:
+                    # The id was reused by a lesson this index has not seen, so the postings are stale
+                    self.index_lesson(lesson_id)
+                    continue
+                page.append(lesson)
+                if len(page) == limit:
+                    break
+        next_offset = position if position < len(ranked) else None
+        return page, next_offset
+
+
+_backends = {}
+
+
+def get_search_backend():
+    """
+    Return the search backend matching the default database
+    """
+    vendor = connection.vendor
+    if vendor not in _backends:
+        _backends[vendor] = PostgresSearchBackend() if vendor == 'postgresql' else InvertedIndexSearchBackend()
+    return _backends[vendor]
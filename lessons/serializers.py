@@ -1,9 +1,82 @@
 import rest_framework.serializers as serializers
+from rest_framework import ISO_8601
+from rest_framework.settings import api_settings
 
-from .models import Lesson
+from .models import ImportJob, Lesson
+
+
+class ValuesSerializer:
+    """
+    Read-only stand-in for `serializer_class(queryset, many=True).data` on list endpoints, working on .values() rows.
+
+    The columns and the few fields needing conversion (dates) are worked out once from the ModelSerializer, so
+    serializing a row only converts those values in place instead of going through every field of the serializer.
+    ISO 8601 datetimes, the costliest, resolve their timezone once per call rather than once per value.
+    The output is the same as the ModelSerializer's. Only plain model fields and primary key relations are
+    supported.
+    """
+    # Fields whose to_representation returns .values() results unchanged
+    PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                          serializers.PrimaryKeyRelatedField)
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        self.converted_fields = []
+        for name, field in serializer_class().fields.items():
+            nested = isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField))
+            if nested or field.source != name:
+                raise TypeError(f'{serializer_class.__name__}.{name} cannot be read from .values()')
+            self.columns.append(name)
+            if not isinstance(field, self.PASSTHROUGH_FIELDS):
+                self.converted_fields.append((name, field))
+
+    @staticmethod
+    def converter(field):
+        """
+        A function doing field.to_representation() for non-null values
+        """
+        if not isinstance(field, serializers.DateTimeField):
+            return field.to_representation
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if not isinstance(output_format, str) or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def to_representation(value):
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return to_representation
+
+    def values(self, queryset):
+        return queryset.values(*self.columns)
+
+    def serialize(self, rows):
+        """
+        Convert rows from values() in place and return them as a list
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        converters = [(name, self.converter(field)) for name, field in self.converted_fields]
+        for row in rows:
+            for name, to_representation in converters:
+                value = row[name]
+                if value is not None:
+                    row[name] = to_representation(value)
+        return rows
 
 
 class LessonSerializer(serializers.ModelSerializer):
     class Meta:
         model = Lesson
-        fields = '__all__'
+        exclude = ['search_vector']
+
+
+lesson_values_serializer = ValuesSerializer(LessonSerializer)
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'lesson', 'file_name', 'file_format', 'chunk_size', 'rows_imported', 'chunks_committed',
+                  'status', 'error', 'created_at', 'updated_at']
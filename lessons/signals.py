@@ -0,0 +1,114 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from flashcards.models import Flashcard
+from flashcards.signals import deck_changed
+
+from users.models import User
+
+from . import counters, leaderboard
+from .models import Lesson
+from .search import get_search_backend
+
+
+@receiver(post_init, sender=Lesson)
+def remember_category(sender, instance, **kwargs):
+    # Read through __dict__ so a deferred category is not loaded just for this
+    instance._saved_category = instance.__dict__.get('category')
+    instance._saved_owner = (instance.__dict__.get('created_by_id'), instance.__dict__.get('is_public'))
+
+
+@receiver(post_save, sender=Lesson)
+def count_saved_lesson(sender, instance, created, **kwargs):
+    if created:
+        leaderboard.adjust(instance.category, 1)
+    elif instance._saved_category is not None and instance._saved_category != instance.category:
+        leaderboard.adjust(instance._saved_category, -1)
+        leaderboard.adjust(instance.category, 1)
+    instance._saved_category = instance.category
+
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    leaderboard.adjust(instance.category, -1)
+
+
+def _owner(instance):
+    # is_public can still be the raw value it was assigned (such as 'True' from a form), as saved by the database
+    return instance.created_by_id, Lesson._meta.get_field('is_public').to_python(instance.is_public)
+
+
+@receiver(post_save, sender=Lesson)
+def count_saved_lesson_for_owner(sender, instance, created, **kwargs):
+    saved_user_id, saved_is_public = instance._saved_owner
+    user_id, is_public = _owner(instance)
+    if created:
+        counters.adjust_lessons(user_id, 1, int(is_public))
+    elif saved_user_id is not None and saved_is_public is not None and (saved_user_id, saved_is_public) != (
+            user_id, is_public):
+        counters.adjust_lessons(saved_user_id, -1, -int(saved_is_public))
+        counters.adjust_lessons(user_id, 1, int(is_public))
+    instance._saved_owner = (user_id, is_public)
+
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson_for_owner(sender, instance, origin=None, **kwargs):
+    # Nothing to count when the owner is being deleted
+    if not (isinstance(origin, User) and origin.id == instance.created_by_id):
+        user_id, is_public = _owner(instance)
+        counters.adjust_lessons(user_id, -1, -int(is_public))
+
+
+@receiver(post_save, sender=Lesson)
+def index_saved_lesson(sender, instance, **kwargs):
+    get_search_backend().index_lesson(instance.id)
+
+
+@receiver(post_delete, sender=Lesson)
+def unindex_deleted_lesson(sender, instance, **kwargs):
+    get_search_backend().remove_lesson(instance.id)
+
+
+@receiver(post_save, sender=Flashcard)
+def index_saved_flashcard_lesson(sender, instance, **kwargs):
+    get_search_backend().index_lesson(instance.lesson_id)
+
+
+@receiver(post_delete, sender=Flashcard)
+def index_deleted_flashcard_lesson(sender, instance, origin=None, **kwargs):
+    # Only single card deletes are handled here. Cascades from a lesson or its owner remove the lesson as well, and
+    # bulk deletes send deck_changed once for the whole batch instead of reindexing once per card
+    if isinstance(origin, Flashcard):
+        get_search_backend().index_lesson(instance.lesson_id)
+
+
+@receiver(deck_changed)
+def index_changed_deck(sender, lesson_id, **kwargs):
+    get_search_backend().index_lesson(lesson_id)
+
+
+@receiver(post_init, sender=Flashcard)
+def remember_lesson(sender, instance, **kwargs):
+    instance._saved_lesson_id = instance.__dict__.get('lesson_id')
+
+
+@receiver(post_save, sender=Flashcard)
+def count_saved_flashcard(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_cards(instance.lesson_id, 1)
+    elif instance._saved_lesson_id is not None and instance._saved_lesson_id != instance.lesson_id:
+        counters.adjust_cards(instance._saved_lesson_id, -1)
+        counters.adjust_cards(instance.lesson_id, 1)
+    instance._saved_lesson_id = instance.lesson_id
+
+
+@receiver(post_delete, sender=Flashcard)
+def count_deleted_flashcard(sender, instance, origin=None, **kwargs):
+    # Cards deleted with their lesson need no count. Those deleted with their author can belong to other lessons.
+    if not (isinstance(origin, Lesson) and origin.id == instance.lesson_id):
+        counters.adjust_cards(instance.lesson_id, -1)
+
+
+@receiver(deck_changed)
+def count_changed_deck(sender, lesson_id, **kwargs):
+    counters.recount_cards(lesson_id)
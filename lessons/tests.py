@@ -1,7 +1,32 @@
+import csv
+import json
+import os
+import tempfile
+import warnings
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken as PlainRefreshToken
+from flashcards import positions
+from flashcards.models import Flashcard
 from users.models import User
-from .models import Lesson
+from users.tokens import RefreshToken
+from . import async_views, importer, leaderboard, views
+from .models import CategoryCount, ImportJob, Lesson
+from .pagination import encode_cursor
+from .renderers import FastJSONRenderer, render_json
+from .serializers import LessonSerializer, lesson_values_serializer
 
 class LessonViewTests(APITestCase):
     def setUp(self):
@@ -106,4 +131,577 @@ class LessonViewTests(APITestCase):
             'lesson_id': lesson.id
         }
         response = self.client.delete('/lessons/delete', data)
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class LessonPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        for i in range(5):
+            Lesson.objects.create(title=f'Lesson {i}', description='Description', category='Category',
+                                  created_by=self.user, is_public=True)
+
+    def test_pages_cover_every_lesson_once(self):
+        titles = []
+        url = '/lessons/public?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            titles += [lesson['title'] for lesson in response.data['results']]
+            url = f"/lessons/public?page_size=2&cursor={response.data['next']}" if response.data['next'] else None
+        self.assertEqual(titles, [f'Lesson {i}' for i in reversed(range(5))])
+
+    def test_last_page_has_no_next_cursor(self):
+        response = self.client.get('/lessons/public?page_size=5')
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertIsNone(response.data['next'])
+
+    def test_page_size_is_capped(self):
+        with self.settings(LESSONS_MAX_PAGE_SIZE=3):
+            response = self.client.get('/lessons/public?page_size=50')
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/lessons/public?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Characters str.isdigit() accepts but int() does not
+        for cursor in (encode_cursor('2024-01-01T00:00:00+00:00', '\u00b2'), encode_cursor('2024-13-01T00:00:00', 1)):
+            response = self.client.get(f'/lessons/public?cursor={cursor}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LessonIncludeTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.lessons = [Lesson.objects.create(title=f'Lesson {i}', category='Math', created_by=self.user,
+                                              is_public=True) for i in range(4)]
+        for lesson, count in zip(self.lessons, [0, 1, 3, 5]):
+            for i in range(count):
+                Flashcard.objects.create(front_text=f'Question {i}', back_text='Answer', lesson=lesson,
+                                         created_by=self.user)
+
+    def test_card_count_and_preview(self):
+        response = self.client.get('/lessons/public', {'include': 'card_count,preview'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {lesson['id']: lesson for lesson in response.data['results']}
+        for lesson, count in zip(self.lessons, [0, 1, 3, 5]):
+            self.assertEqual(results[lesson.id]['card_count'], count)
+            preview = results[lesson.id]['preview']
+            self.assertEqual([card['front_text'] for card in preview],
+                             [f'Question {i}' for i in range(min(count, settings.LESSON_PREVIEW_SIZE))])
+            self.assertTrue(all(card['lesson'] == lesson.id for card in preview))
+        self.assertNotIn('preview', self.client.get('/lessons/public', {'include': 'card_count'}).data['results'][0])
+
+    def test_queries_do_not_depend_on_the_page_size(self):
+        with self.assertNumQueries(2):
+            self.client.get('/lessons/public', {'include': 'card_count,preview', 'page_size': 1})
+        with self.assertNumQueries(2):
+            self.client.get('/lessons/public', {'include': 'card_count,preview', 'page_size': 4})
+
+    def test_unknown_include(self):
+        response = self.client.get('/lessons/public', {'include': 'card_count,owner'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('owner', response.data['error'])
+
+    def test_async_listing_matches_sync(self):
+        path = '/lessons/public?include=card_count,preview&page_size=3'
+        response = async_to_sync(async_views.list_public_lessons)(AsyncRequestFactory().get(path))
+        self.assertEqual(response.content, self.client.get(path).content)
+
+
+class CounterTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+    def assertCounts(self, lesson_count, public_lesson_count):
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.lesson_count, self.user.public_lesson_count), (lesson_count, public_lesson_count))
+
+    def test_lesson_counts(self):
+        data = {'title': 'Lesson', 'description': 'Description', 'category': 'Math'}
+        lesson_id = self.client.post('/lessons/new', data, format='json').data['id']
+        self.client.post('/lessons/new', {**data, 'is_public': True}, format='json')
+        self.assertCounts(2, 1)
+        self.client.patch('/lessons/update', {'lesson_id': lesson_id, 'is_public': True}, format='json')
+        self.assertCounts(2, 2)
+        self.client.delete('/lessons/delete', {'lesson_id': lesson_id}, format='json')
+        self.assertCounts(1, 1)
+        self.assertEqual(self.client.get('/users/').data['lesson_count'], 1)
+
+    def test_card_count(self):
+        lesson = Lesson.objects.create(title='Lesson', category='Math', created_by=self.user)
+        card = {'front_text': 'Question', 'back_text': 'Answer', 'lesson': lesson.id, 'created_by': self.user.id}
+        card_id = self.client.post('/flashcards/', card, format='json').data['id']
+        self.client.post('/flashcards/bulk/', {'lesson': lesson.id, 'cards': [card, card]}, format='json')
+        self.client.delete(f'/flashcards/{card_id}/')
+        lesson_data = self.client.get(f'/lessons/id/{lesson.id}').data
+        self.assertEqual(lesson_data['card_count'], 2)
+
+        # Saving an instance loaded before the cards were added keeps the count
+        lesson.title = 'Renamed'
+        lesson.save()
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.card_count, 2)
+
+    def test_card_count_changes_the_etag(self):
+        lesson = Lesson.objects.create(title='Lesson', category='Math', created_by=self.user)
+        etag = self.client.get(f'/lessons/id/{lesson.id}')['ETag']
+        Flashcard.objects.create(front_text='Question', back_text='Answer', lesson=lesson, created_by=self.user)
+        response = self.client.get(f'/lessons/id/{lesson.id}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['card_count'], 1)
+
+    def test_reconcile_counters(self):
+        lessons = [Lesson.objects.create(title=f'Lesson {i}', category='Math', created_by=self.user, is_public=True)
+                   for i in range(3)]
+        Flashcard.objects.bulk_create(Flashcard(front_text='Question', back_text='Answer', lesson=lessons[0],
+                                                created_by=self.user) for _ in range(4))
+        User.objects.filter(id=self.user.id).update(lesson_count=0, public_lesson_count=7)
+
+        out = StringIO()
+        call_command('reconcile_counters', batch_size=2, stdout=out)
+        self.assertIn('Fixed the counters of 1 lesson rows', out.getvalue())
+        self.assertIn('Fixed the counters of 1 user rows', out.getvalue())
+        self.assertEqual([lesson.card_count for lesson in Lesson.objects.order_by('id')], [4, 0, 0])
+        self.assertCounts(3, 3)
+
+
+class ForkTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='password123')
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.lesson = Lesson.objects.create(title='Lesson', description='Description', category='Math',
+                                            created_by=self.author, is_public=True)
+        self.flashcards = Flashcard.objects.bulk_create(
+            Flashcard(front_text=f'Question {i}', back_text=f'Answer {i}', lesson=self.lesson, created_by=self.author)
+            for i in range(50))
+        self.client.force_authenticate(user=self.user)
+
+    def test_fork_copies_the_deck(self):
+        response = self.client.post('/lessons/fork', {'lesson_id': self.lesson.id, 'title': 'Mine'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        fork = Lesson.objects.get(id=response.data['id'])
+        self.assertEqual((fork.title, fork.category, fork.created_by_id, fork.is_public), ('Mine', 'Math',
+                                                                                           self.user.id, False))
+        self.assertEqual((fork.forked_from_id, response.data['forked_from']), (self.lesson.id, self.lesson.id))
+        self.assertEqual(response.data['card_count'], 50)
+
+        copies = list(Flashcard.objects.filter(lesson=fork).order_by('position', 'id'))
+        self.assertEqual([card.front_text for card in copies], [card.front_text for card in self.flashcards])
+        self.assertTrue(all(card.created_by_id == self.user.id for card in copies))
+        self.assertEqual(Flashcard.objects.filter(lesson=self.lesson).count(), 50)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.lesson_count, 1)
+
+    def test_fork_query_count_does_not_grow_with_the_deck(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/lessons/fork', {'lesson_id': self.lesson.id}, format='json')
+        Flashcard.objects.bulk_create(Flashcard(front_text='More', back_text='Cards', lesson=self.lesson,
+                                                created_by=self.author) for _ in range(500))
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/lessons/fork', {'lesson_id': self.lesson.id}, format='json')
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len([query for query in large if query['sql'].startswith('INSERT INTO "flashcards')]), 1)
+
+    def test_private_lessons_cannot_be_forked_by_others(self):
+        Lesson.objects.filter(id=self.lesson.id).update(is_public=False)
+        response = self.client.post('/lessons/fork', {'lesson_id': self.lesson.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.post('/lessons/fork', {'lesson_id': 0}, format='json').status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    def test_fork_validation(self):
+        for data in [{'lesson_id': 'abc'}, {'lesson_id': True}, {'lesson_id': [self.lesson.id]},
+                     {'lesson_id': self.lesson.id, 'title': ['x']}, {'lesson_id': self.lesson.id, 'title': 'x' * 256}]:
+            response = self.client.post('/lessons/fork', data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Lesson.objects.filter(forked_from=self.lesson).count(), 0)
+
+    def test_deleting_the_source_keeps_the_fork(self):
+        fork_id = self.client.post('/lessons/fork', {'lesson_id': self.lesson.id}, format='json').data['id']
+        self.lesson.delete()
+        fork = Lesson.objects.get(id=fork_id)
+        self.assertIsNone(fork.forked_from_id)
+        self.assertEqual(fork.card_count, 50)
+
+
+class LessonSearchTests(APITestCase):
+    def setUp(self):
+        from flashcards.models import Flashcard
+
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.other_user = User.objects.create_user(username='otheruser', password='12345', email='other@example.com')
+        self.python = Lesson.objects.create(title='Python Basics', description='Loops and functions',
+                                            category='Programming', created_by=self.user, is_public=True)
+        self.snakes = Lesson.objects.create(title='Reptiles', description='Pythons and other snakes',
+                                            category='Biology', created_by=self.user, is_public=True)
+        self.private = Lesson.objects.create(title='Python Secrets', description='Private notes',
+                                             category='Programming', created_by=self.other_user, is_public=False)
+        Flashcard.objects.create(front_text='What is a decorator?', back_text='A function wrapping a function',
+                                 lesson=self.snakes, created_by=self.user)
+
+    def search(self, keywords, **params):
+        response = self.client.get(f'/lessons/keywords/{keywords}', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [lesson['id'] for lesson in response.data['results']]
+
+    def test_title_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('python'), [self.python.id, self.snakes.id])
+
+    def test_matches_flashcard_text(self):
+        self.assertEqual(self.search('decorator'), [self.snakes.id])
+
+    def test_private_lessons_are_hidden_from_other_users(self):
+        self.assertNotIn(self.private.id, self.search('secrets'))
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.search('secrets'), [self.private.id])
+
+    def test_index_follows_updates(self):
+        self.search('python')
+        self.python.title = 'Rust Basics'
+        self.python.save()
+        self.assertEqual(self.search('rust'), [self.python.id])
+        self.assertEqual(self.search('python'), [self.snakes.id])
+
+    def test_results_are_paginated(self):
+        response = self.client.get('/lessons/keywords/python', {'page_size': 1})
+        self.assertEqual([lesson['id'] for lesson in response.data['results']], [self.python.id])
+        self.assertEqual(self.search('python', page_size=1, cursor=response.data['next']), [self.snakes.id])
+
+
+class TopCategoriesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        leaderboard.invalidate()
+        for category, count in [('Math', 3), ('History', 2), ('Art', 1)]:
+            for i in range(count):
+                Lesson.objects.create(title=f'{category} {i}', category=category, created_by=self.user)
+
+    def top_categories(self, **params):
+        leaderboard.invalidate()
+        response = self.client.get('/lessons/top-categories', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(row['category'], row['count']) for row in response.data]
+
+    def test_counts_created_lessons(self):
+        self.assertEqual(self.top_categories(), [('Math', 3), ('History', 2), ('Art', 1)])
+
+    def test_n_limits_the_result(self):
+        self.assertEqual(self.top_categories(n=2), [('Math', 3), ('History', 2)])
+
+    def test_invalid_n(self):
+        for n in [0, 'abc', '\u00b2', 1000]:
+            response = self.client.get('/lessons/top-categories', {'n': n})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_count_may_drop_below_zero(self):
+        CategoryCount.objects.filter(category='Art').update(lesson_count=0)
+        Lesson.objects.filter(category='Art').delete()
+        self.assertEqual(CategoryCount.objects.get(category='Art').lesson_count, -1)
+        self.assertEqual(self.top_categories(), [('Math', 3), ('History', 2)])
+
+    def test_follows_category_changes_and_deletes(self):
+        lesson = Lesson.objects.filter(category='Math').first()
+        lesson.category = 'Art'
+        lesson.save()
+        Lesson.objects.filter(category='History').first().delete()
+        self.assertEqual(self.top_categories(), [('Art', 2), ('Math', 2), ('History', 1)])
+
+    def test_cached_until_invalidated(self):
+        self.client.get('/lessons/top-categories')
+        with self.assertNumQueries(0):
+            self.client.get('/lessons/top-categories')
+        with self.captureOnCommitCallbacks(execute=True):
+            Lesson.objects.create(title='Art 2', category='Art', created_by=self.user)
+        with self.assertNumQueries(1):
+            self.client.get('/lessons/top-categories')
+
+    def test_rebuild_command(self):
+        CategoryCount.objects.all().delete()
+        call_command('rebuild_category_counts', stdout=StringIO())
+        self.assertEqual(self.top_categories(), [('Math', 3), ('History', 2), ('Art', 1)])
+
+
+class LessonExportTests(APITestCase):
+    def setUp(self):
+        from flashcards.models import Flashcard
+
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.other_user = User.objects.create_user(username='otheruser', password='12345', email='other@example.com')
+        self.first = Lesson.objects.create(title='First', category='Category', created_by=self.user)
+        self.empty = Lesson.objects.create(title='Empty', category='Category', created_by=self.user)
+        self.last = Lesson.objects.create(title='Last', category='Category', created_by=self.user)
+        Lesson.objects.create(title='Not mine', category='Category', created_by=self.other_user)
+        for lesson, count in [(self.first, 2), (self.last, 1)]:
+            for i in range(count):
+                Flashcard.objects.create(front_text=f'{lesson.title} {i}', back_text='Answer, with a comma',
+                                         lesson=lesson, created_by=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def test_ndjson_export(self):
+        response = self.client.get('/lessons/export')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(row['type'], row.get('title') or row['front_text']) for row in rows], [
+            ('lesson', 'First'), ('flashcard', 'First 0'), ('flashcard', 'First 1'),
+            ('lesson', 'Empty'),
+            ('lesson', 'Last'), ('flashcard', 'Last 0'),
+        ])
+        self.assertEqual(rows[1]['lesson'], self.first.id)
+
+    def test_flashcards_are_exported_in_deck_order(self):
+        first, second = Flashcard.objects.filter(lesson=self.first).order_by('id')
+        Flashcard.objects.filter(id=first.id).update(position=positions.between(second.position, None))
+        response = self.client.get('/lessons/export')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows[1:3]], [second.id, first.id])
+        self.assertLess(rows[1]['position'], rows[2]['position'])
+
+    def test_csv_export(self):
+        response = self.client.get('/lessons/export', {'output': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['lesson_title'], row['front_text']) for row in rows],
+                         [('First', 'First 0'), ('First', 'First 1'), ('Empty', ''), ('Last', 'Last 0')])
+        self.assertEqual(rows[0]['back_text'], 'Answer, with a comma')
+
+    def test_export_other_user_unauthorized(self):
+        response = self.client.get('/lessons/export', {'user_id': self.other_user.id})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_streams_under_asgi(self):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        request = AsyncRequestFactory().get('/lessons/export', {'output': 'csv'}, headers=headers)
+        response = views.export_lessons(request)
+        # A sync iterator would be read into a list before the first byte went out
+        self.assertTrue(response.is_async)
+
+        async def read(response):
+            return [chunk async for chunk in response]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            content = b''.join(async_to_sync(read)(response))
+        self.assertEqual(content, b''.join(self.client.get('/lessons/export', {'output': 'csv'}).streaming_content))
+
+    def test_export_invalid_parameters(self):
+        for params in [{'output': 'xml'}, {'user_id': 'abc'}, {'user_id': '\u00b2'}]:
+            response = self.client.get('/lessons/export', params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DeckImportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.lesson = Lesson.objects.create(title='Deck', category='Category', created_by=self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def cards(self, lesson=None):
+        from flashcards.models import Flashcard
+
+        return list(Flashcard.objects.filter(lesson=lesson or self.lesson).order_by('id').values_list(
+            'front_text', 'back_text'))
+
+    def new_job(self, file_format, chunk_size=2):
+        return ImportJob.objects.create(lesson=self.lesson, created_by=self.user, file_format=file_format,
+                                        chunk_size=chunk_size)
+
+    def test_csv_with_header_in_chunks(self):
+        progress = []
+        job = importer.run_import(self.new_job('csv'), StringIO('front,back\nQ1,A1\nQ2,"A2, long"\nQ3,A3\n'),
+                                  progress=lambda job: progress.append(job.rows_imported))
+        self.assertEqual(job.status, ImportJob.COMPLETED)
+        self.assertEqual(progress, [2, 3])
+        self.assertEqual(self.cards(), [('Q1', 'A1'), ('Q2', 'A2, long'), ('Q3', 'A3')])
+
+    def test_anki_tab_separated_text(self):
+        importer.run_import(self.new_job('csv'), StringIO('#separator:tab\n#html:false\nQ1\tA1\nQ2\tA2\n'))
+        self.assertEqual(self.cards(), [('Q1', 'A1'), ('Q2', 'A2')])
+
+    def test_failed_import_resumes_from_checkpoint(self):
+        job = importer.run_import(self.new_job('ndjson'), StringIO(
+            '{"front_text": "Q1", "back_text": "A1"}\n{"front_text": "Q2", "back_text": "A2"}\nnot json\n'))
+        self.assertEqual((job.status, job.rows_imported), (ImportJob.FAILED, 2))
+
+        job = importer.run_import(job, StringIO(
+            '{"front_text": "Q1", "back_text": "A1"}\n{"front_text": "Q2", "back_text": "A2"}\n'
+            '{"front_text": "Q3", "back_text": "A3"}\n'))
+        self.assertEqual((job.status, job.rows_imported), (ImportJob.COMPLETED, 3))
+        self.assertEqual(self.cards(), [('Q1', 'A1'), ('Q2', 'A2'), ('Q3', 'A3')])
+
+    def test_export_can_be_imported(self):
+        from flashcards.models import Flashcard
+
+        Flashcard.objects.create(front_text='Q1', back_text='A1', lesson=self.lesson, created_by=self.user)
+        exported = b''.join(self.client.get('/lessons/export').streaming_content).decode()
+        target = Lesson.objects.create(title='Copy', category='Category', created_by=self.user)
+        job = ImportJob.objects.create(lesson=target, created_by=self.user, file_format='ndjson', chunk_size=10)
+        importer.run_import(job, StringIO(exported))
+        self.assertEqual(self.cards(target), [('Q1', 'A1')])
+
+    def test_upload_into_new_lesson(self):
+        upload = SimpleUploadedFile('deck.csv', b'Q1,A1\nQ2,A2\n', content_type='text/csv')
+        response = self.client.post('/lessons/import', {'file': upload, 'title': 'Imported', 'category': 'Category'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rows_imported'], 2)
+        lesson = Lesson.objects.get(title='Imported')
+        self.assertEqual(self.cards(lesson), [('Q1', 'A1'), ('Q2', 'A2')])
+        response = self.client.get(f"/lessons/import/{response.data['id']}")
+        self.assertEqual(response.data['status'], ImportJob.COMPLETED)
+
+    def test_upload_into_someone_elses_lesson(self):
+        other_user = User.objects.create_user(username='otheruser', password='12345', email='other@example.com')
+        self.client.force_authenticate(user=other_user)
+        upload = SimpleUploadedFile('deck.csv', b'Q1,A1\n', content_type='text/csv')
+        response = self.client.post('/lessons/import', {'file': upload, 'lesson_id': self.lesson.id})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_upload_with_invalid_ids(self):
+        for data in [{'job_id': 'x'}, {'lesson_id': 'x'}, {'lesson_id': '\u00b2'}]:
+            upload = SimpleUploadedFile('deck.csv', b'Q1,A1\n', content_type='text/csv')
+            response = self.client.post('/lessons/import', {'file': upload, **data})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImportJob.objects.exists())
+
+    def test_import_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as deck:
+            deck.write('front_text,back_text\nQ1,A1\n')
+        self.addCleanup(os.remove, deck.name)
+        call_command('import_deck', deck.name, user='testuser', lesson=self.lesson.id, stdout=StringIO())
+        self.assertEqual(self.cards(), [('Q1', 'A1')])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked on Postgres (TEST_DATABASE=postgres)')
+class ListingIndexTests(APITestCase):
+    def setUp(self):
+        from flashcards.models import Flashcard
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        for i in range(50):
+            lesson = Lesson.objects.create(title=f'Lesson {i}', category='Math' if i % 2 else 'History',
+                                           created_by=self.user, is_public=i % 3 == 0)
+            Flashcard.objects.create(front_text='Q', back_text='A', lesson=lesson, created_by=self.user)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE lessons_lesson')
+            cursor.execute('ANALYZE flashcards_flashcard')
+            # The tables are tiny, so make sure the planner only picks a sequential scan when no index applies
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertIndexScan(self, queryset, index_name=None):
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan)
+        if index_name:
+            self.assertIn(index_name, plan)
+
+    def page(self, lessons):
+        return lessons.order_by('-created_at', '-id')[:21]
+
+    def test_lesson_listings(self):
+        self.assertIndexScan(self.page(Lesson.objects.filter(is_public=True)), 'lesson_public_created_idx')
+        self.assertIndexScan(self.page(Lesson.objects.filter(created_by=self.user.id)), 'lesson_user_created_idx')
+        self.assertIndexScan(self.page(Lesson.objects.filter(created_by=self.user.id, is_public=True)),
+                             'lesson_user_public_created_idx')
+        self.assertIndexScan(self.page(Lesson.objects.filter(category='Math', is_public=True)),
+                             'lesson_category_public_idx')
+
+    def test_flashcard_listings(self):
+        from flashcards.models import Flashcard
+        lesson = Lesson.objects.first()
+        self.assertIndexScan(Flashcard.objects.filter(lesson=lesson.id).order_by('position'), 'flashcard_position_idx')
+        self.assertIndexScan(Flashcard.objects.filter(lesson__is_public=True))
+
+
+class AsyncLessonViewTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123',
+                                                        email='admin@example.com')
+        for i in range(3):
+            self.lesson = Lesson.objects.create(title=f'Lesson {i}', description='Description', category='Category',
+                                                created_by=self.user, is_public=i != 1)
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, path, user=None, **kwargs):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'} if user else {}
+        return async_to_sync(view)(self.factory.get(path, headers=headers), **kwargs)
+
+    def test_same_response_as_sync_views(self):
+        self.client.force_authenticate(user=self.admin_user)
+        for view, path, kwargs in [(async_views.list_public_lessons, '/lessons/public?page_size=1', {}),
+                                   (async_views.list_lessons, '/lessons/', {}),
+                                   (async_views.get_lesson_by_id, f'/lessons/id/{self.lesson.id}',
+                                    {'id': self.lesson.id})]:
+            response = self.call(view, path, self.admin_user, **kwargs)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, self.client.get(path).content)
+
+    def test_token_without_claims(self):
+        headers = {'Authorization': f'Bearer {PlainRefreshToken.for_user(self.admin_user).access_token}'}
+        response = async_to_sync(async_views.list_lessons)(self.factory.get('/lessons/', headers=headers))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_conditional_get(self):
+        path = f'/lessons/id/{self.lesson.id}'
+        etag = self.client.get(path)['ETag']
+        request = self.factory.get(path, headers={'If-None-Match': etag})
+        response = async_to_sync(async_views.get_lesson_by_id)(request, id=self.lesson.id)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.lesson.title = 'Changed'
+        self.lesson.save()
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_paginates(self):
+        response = self.call(async_views.list_public_lessons, '/lessons/public?page_size=1')
+        cursor = json.loads(response.content)['next']
+        response = self.call(async_views.list_public_lessons, f'/lessons/public?page_size=1&cursor={cursor}')
+        self.assertEqual([lesson['title'] for lesson in json.loads(response.content)['results']], ['Lesson 0'])
+
+    def test_errors(self):
+        self.assertEqual(self.call(async_views.list_lessons, '/lessons/').status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.call(async_views.list_lessons, '/lessons/', self.user).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.call(async_views.get_lesson_by_id, '/lessons/id/0', id=0).status_code,
+                         status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.call(async_views.list_public_lessons, '/lessons/public?cursor=bad').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class ValuesSerializerTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        Lesson.objects.create(title='Ünïcode \u2028 "quoted" \\ \x01 😀', description=None, category='Math',
+                              created_by=self.user, is_public=True)
+        Lesson.objects.create(title='Plain', description='Text\nwith lines', category='Math', created_by=self.user)
+
+    def test_output_matches_model_serializer(self):
+        lessons = Lesson.objects.order_by('id')
+        expected = JSONRenderer().render(LessonSerializer(lessons, many=True).data)
+        rows = lesson_values_serializer.serialize(lesson_values_serializer.values(lessons))
+        self.assertEqual(render_json(rows), expected)
+
+    def test_listing_matches_model_serializer(self):
+        response = self.client.get('/lessons/public')
+        lessons = Lesson.objects.filter(is_public=True)
+        expected = JSONRenderer().render({'next': None, 'results': LessonSerializer(lessons, many=True).data})
+        self.assertEqual(response.content, expected)
+
+    def test_renderer_falls_back_for_indented_output(self):
+        data = {'big': 2 ** 70, 'text': 'a\u2029b'}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+    def test_renderer_matches_json_renderer_on_dates_and_floats(self):
+        moment = datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+        data = {
+            'datetimes': [moment, moment.replace(microsecond=0), moment.replace(tzinfo=None),
+                          moment.astimezone(timezone(timedelta(hours=2)))],
+            'date': moment.date(), 'time': moment.time(),
+            'floats': [0.1, 1.0, -0.0, 100000.0, 1e15, 1e16, 1.5e300, 1e-4, 1e-5, 2.5e-5, 1e-7, 5e-324, 1 / 3],
+            'text': 'version 2e, 0.00001 of a second',
+        }
+        self.assertEqual(render_json(data), JSONRenderer().render(data))
+        for value in [*data['datetimes'], *data['floats']]:
+            self.assertEqual(render_json([value]), JSONRenderer().render([value]))
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.urls import path
 
 from .views import list_lessons, list_public_lessons, list_lessons_by_user, list_lessons_by_category, \
-    list_lessons_by_keywords, create_lesson, update_lesson, delete_lesson, get_top_categories, get_lesson_by_id
+    list_lessons_by_keywords, create_lesson, update_lesson, delete_lesson, get_top_categories, get_lesson_by_id, \
+    export_lessons, import_lessons, get_import_job, fork_lesson
+
+if settings.ASYNC_VIEWS:
+    from .async_views import list_lessons, list_public_lessons, get_lesson_by_id  # noqa: F811
 
 urlpatterns = [
     path("", list_lessons),
@@ -13,5 +18,9 @@ urlpatterns = [
     path("new", create_lesson),
     path("update", update_lesson),
     path("delete", delete_lesson),
+    path("fork", fork_lesson),
     path("top-categories", get_top_categories),
+    path("export", export_lessons),
+    path("import", import_lessons),
+    path("import/<int:job_id>", get_import_job),
 ]
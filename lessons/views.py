@@ -1,21 +1,57 @@
+import io
 from datetime import datetime
 
-from django.db.models import Count
-from drf_yasg import openapi
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from rest_framework.decorators import permission_classes, api_view
+from rest_framework.decorators import parser_classes, permission_classes, api_view
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from users.models import User
 # Create your views here.
-from .models import Lesson
-from .serializers import LessonSerializer
+from . import export, fork, importer, leaderboard, search
+from .conditional import conditional
+from .models import ImportJob, Lesson
+from .pagination import KeysetPaginator, PaginationError, decode_cursor, encode_cursor, get_page_size
+from .includes import IncludeError, add_previews, get_includes
+from .serializers import ImportJobSerializer, LessonSerializer, lesson_values_serializer
+
+pagination_parameters = [
+    openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Opaque cursor returned as "next" by the previous page'),
+    openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of lessons per page'),
+]
+listing_parameters = pagination_parameters + [
+    openapi.Parameter('include', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description='Comma separated extras per lesson: card_count, preview (its first flashcards)'),
+]
+
+
+def paginated_lessons_response(request, lessons):
+    """
+    Serialize one keyset page of the given lessons queryset, with the extras asked for by include
+    """
+    paginator = KeysetPaginator(request)
+    try:
+        includes = get_includes(request)
+        page = paginator.paginate_queryset(lesson_values_serializer.values(lessons))
+    except (PaginationError, IncludeError) as e:
+        return Response({'error': str(e)}, status=400)
+    rows = lesson_values_serializer.serialize(page)
+    if 'preview' in includes:
+        add_previews(rows)
+    return Response(paginator.get_paginated_data(rows))
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=listing_parameters,
     responses={
         200: 'List of lessons',
         401: 'Invalid credentials'
@@ -30,8 +66,7 @@ def list_lessons(request):
     if not request.user.is_staff:
         return Response({'error': 'Unauthorized'}, status=401)
     lessons = Lesson.objects.all()
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    return paginated_lessons_response(request, lessons)
 
 
 @swagger_auto_schema(
@@ -65,14 +100,17 @@ def create_lesson(request):
     if title is None or description is None or category is None:
         return Response({'error': 'Please provide title, description and category'}, status=401)
 
-    lesson = Lesson.objects.create(title=title, description=description, category=category, created_by=request.user,
-                                   is_public=is_public)
+    # The owner's lesson counters are adjusted by lessons.signals, in the same transaction
+    with transaction.atomic():
+        lesson = Lesson.objects.create(title=title, description=description, category=category,
+                                       created_by_id=request.user.id, is_public=is_public)
     serializer = LessonSerializer(lesson)
     return Response(serializer.data)
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=listing_parameters,
     responses={
         200: 'List of public lessons',
         401: 'Invalid credentials'
@@ -84,12 +122,12 @@ def list_public_lessons(request):
     List all public lessons
     """
     lessons = Lesson.objects.filter(is_public=True)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    return paginated_lessons_response(request, lessons)
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=listing_parameters,
     responses={
         200: 'List of public lessons created by a specified user',
         401: 'Invalid credentials'
@@ -100,19 +138,21 @@ def list_lessons_by_user(request, user_id):
     """
     List all public lessons created by a specified user
     """
-    if not User.objects.filter(id=user_id).exists():
-        return Response({'error': 'User not found'}, status=401)
-
     if request.user.is_staff or request.user.id == user_id:
         lessons = Lesson.objects.filter(created_by=user_id)
     else:
         lessons = Lesson.objects.filter(created_by=user_id, is_public=True)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    response = paginated_lessons_response(request, lessons)
+
+    # Only an empty page can mean the user does not exist, so the extra lookup is skipped otherwise
+    if response.status_code == 200 and not response.data['results'] and not User.objects.filter(id=user_id).exists():
+        return Response({'error': 'User not found'}, status=401)
+    return response
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=listing_parameters,
     responses={
         200: 'List of lessons created by category',
         401: 'Unauthorized'
@@ -129,28 +169,48 @@ def list_lessons_by_category(request, category):
         lessons = Lesson.objects.filter(category=category)
     else:
         lessons = Lesson.objects.filter(category=category, is_public=True)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    return paginated_lessons_response(request, lessons)
 
 
 @swagger_auto_schema(
     method='get',
+    manual_parameters=pagination_parameters,
     responses={
-        200: 'List of lessons created containing keywords',
-        401: 'Unauthorized'
+        200: 'List of lessons matching the keywords, best match first',
+        400: 'Invalid keywords or cursor'
     }
 )
 @api_view(['GET'])
 def list_lessons_by_keywords(request, keywords):
     """
-    List all lessons created containing keywords
+    Search the title, description and flashcards of the lessons visible to the user for any of the keywords
     """
-    keywords = keywords.split()
-    lessons = Lesson.objects.filter(title__icontains=keywords[0])
-    for keyword in keywords[1:]:
-        lessons = lessons | Lesson.objects.filter(title__icontains=keyword)
-    serializer = LessonSerializer(lessons, many=True)
-    return Response(serializer.data)
+    terms = search.tokenize(keywords)
+    if not terms:
+        return Response({'error': 'Please provide at least one keyword'}, status=400)
+
+    if request.user.is_staff:
+        lessons = Lesson.objects.all()
+    elif request.user.is_authenticated:
+        lessons = Lesson.objects.filter(Q(is_public=True) | Q(created_by=request.user.id))
+    else:
+        lessons = Lesson.objects.filter(is_public=True)
+
+    try:
+        page_size = get_page_size(request)
+        cursor = request.query_params.get('cursor')
+        offset = int(decode_cursor(cursor, 1)[0]) if cursor else 0
+        if offset < 0:
+            raise PaginationError('Invalid cursor')
+    except (PaginationError, ValueError):
+        return Response({'error': 'Invalid cursor or page_size'}, status=400)
+
+    page, next_offset = search.get_search_backend().search(terms, lessons, offset, page_size)
+    serializer = LessonSerializer(page, many=True)
+    return Response({
+        'next': encode_cursor(next_offset) if next_offset is not None else None,
+        'results': serializer.data,
+    })
 
 
 @swagger_auto_schema(
@@ -186,7 +246,7 @@ def update_lesson(request):
         return Response({'error': 'Please provide lesson_id'}, status=401)
 
     lesson = Lesson.objects.get(id=lesson_id)
-    if lesson.created_by != request.user and not request.user.is_staff:
+    if lesson.created_by_id != request.user.id and not request.user.is_staff:
         return Response({'error': 'Unauthorized'}, status=401)
 
     if title is not None:
@@ -198,12 +258,62 @@ def update_lesson(request):
 
     lesson.is_public = is_public
     lesson.updated_at = datetime.now()
-    lesson.save()
+    with transaction.atomic():
+        lesson.save()
 
     serializer = LessonSerializer(lesson)
     return Response(serializer.data)
 
 
+@swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'lesson_id': openapi.Schema(type=openapi.TYPE_INTEGER, description='Lesson to copy'),
+            'title': openapi.Schema(type=openapi.TYPE_STRING,
+                                    description='Title of the copy (defaults to the original title)'),
+        },
+        required=['lesson_id']
+    ),
+    responses={
+        200: 'Lesson forked',
+        400: 'Invalid lesson_id or title',
+        401: 'Unauthorized',
+        404: 'Lesson not found'
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def fork_lesson(request):
+    """
+    Copy a public lesson, or one of your own, and all its flashcards into a new private lesson of yours
+    """
+    lesson_id = request.data.get('lesson_id')
+    if lesson_id is None:
+        return Response({'error': 'Please provide lesson_id'}, status=400)
+    try:
+        # Form data sends ids as strings, JSON as numbers, and true is an int to Python
+        lesson_id = int(lesson_id) if isinstance(lesson_id, (int, str)) and not isinstance(lesson_id, bool) else None
+    except ValueError:
+        lesson_id = None
+    if lesson_id is None:
+        return Response({'error': 'lesson_id must be a lesson id'}, status=400)
+    title = request.data.get('title')
+    max_length = Lesson._meta.get_field('title').max_length
+    if title is not None and (not isinstance(title, str) or len(title) > max_length):
+        return Response({'error': f'title must be a string of at most {max_length} characters'}, status=400)
+
+    source = Lesson.objects.filter(id=lesson_id).first()
+    if source is None:
+        return Response({'error': 'Lesson not found'}, status=404)
+    if not source.is_public and source.created_by_id != request.user.id and not request.user.is_staff:
+        return Response({'error': 'Unauthorized'}, status=401)
+
+    lesson = fork.fork(source, request.user.id, title=title)
+    return Response(LessonSerializer(lesson).data)
+
+
 @swagger_auto_schema(
     method='delete',
     responses={
@@ -228,25 +338,172 @@ def delete_lesson(request):
         return Response({'error': 'Please provide lesson_id'}, status=401)
 
     lesson = Lesson.objects.get(id=lesson_id)
-    if lesson.created_by != request.user and not request.user.is_staff:
+    if lesson.created_by_id != request.user.id and not request.user.is_staff:
         return Response({'error': 'Unauthorized'}, status=401)
 
+    # Deletes run in a transaction together with their signals, which adjust the owner's lesson counters
     lesson.delete()
     return Response({'message': 'Lesson deleted successfully'})
 
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('n', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of categories (default 5)'),
+    ],
+    responses={
+        200: 'List of categories with their number of lessons',
+        400: 'Invalid n'
+    }
+)
 @api_view(['GET'])
 def get_top_categories(request):
     """
-    Get the top 5 categories by number of lessons
+    Get the top n categories by number of lessons
     """
-    categories = Lesson.objects.values('category').annotate(count=Count('category')).order_by('-count')[:4]
-    return Response(categories)
+    try:
+        n = int(request.query_params.get('n', '5'))
+    except ValueError:
+        n = 0
+    if not 1 <= n <= settings.TOP_CATEGORIES_MAX:
+        return Response({'error': f'n must be between 1 and {settings.TOP_CATEGORIES_MAX}'}, status=400)
+    return Response(leaderboard.get_top_categories(n))
+
+def lesson_validators(id):
+    # card_count is serialized but only changes with F() updates, which leave updated_at alone
+    return Lesson.objects.filter(id=id).values('id', 'card_count', last_modified=F('updated_at'))
+
 
 @api_view(['GET'])
+@conditional(lesson_validators)
 def get_lesson_by_id(request, id):
     """
     Get a lesson by ID
     """
-    lesson = Lesson.objects.get(id=id)
+    lesson = Lesson.objects.filter(id=id).first()
+    if lesson is None:
+        return Response({'error': 'Lesson not found'}, status=404)
     serializer = LessonSerializer(lesson)
-    return Response(serializer.data)
\ No newline at end of file
+    return Response(serializer.data)
+
+
+@swagger_auto_schema(
+    method='get',
+    manual_parameters=[
+        openapi.Parameter('output', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['ndjson', 'csv'],
+                          description='Export format (default ndjson)'),
+        openapi.Parameter('user_id', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                          description='User to export (staff only, defaults to the current user)'),
+    ],
+    responses={
+        200: 'Streamed lessons and flashcards',
+        400: 'Invalid parameters',
+        401: 'Unauthorized'
+    }
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_lessons(request):
+    """
+    Stream every lesson and flashcard of a user as NDJSON or CSV
+    """
+    output = request.query_params.get('output', 'ndjson')
+    try:
+        user_id = int(request.query_params.get('user_id', request.user.id))
+    except ValueError:
+        user_id = None
+    if output not in ('ndjson', 'csv') or user_id is None:
+        return Response({'error': 'Please provide a valid output and user_id'}, status=400)
+    if user_id != request.user.id and not request.user.is_staff:
+        return Response({'error': 'Unauthorized'}, status=401)
+
+    chunks = export.iter_csv(user_id) if output == 'csv' else export.iter_ndjson(user_id)
+    if isinstance(request._request, ASGIRequest):
+        chunks = export.aiter_sync(chunks)
+    content_type = 'text/csv' if output == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="lessons-{user_id}.{output}"'
+    return response
+
+
+@swagger_auto_schema(
+    method='post',
+    manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True,
+                          description='CSV (front,back) or NDJSON ({"front_text", "back_text"}) deck'),
+        openapi.Parameter('file_format', openapi.IN_FORM, type=openapi.TYPE_STRING, enum=list(importer.FORMATS),
+                          description='Defaults to the format matching the file extension'),
+        openapi.Parameter('lesson_id', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                          description='Existing lesson to import into'),
+        openapi.Parameter('title', openapi.IN_FORM, type=openapi.TYPE_STRING, description='Title of a new lesson'),
+        openapi.Parameter('description', openapi.IN_FORM, type=openapi.TYPE_STRING,
+                          description='Description of a new lesson'),
+        openapi.Parameter('category', openapi.IN_FORM, type=openapi.TYPE_STRING, description='Category of a new lesson'),
+        openapi.Parameter('job_id', openapi.IN_FORM, type=openapi.TYPE_INTEGER,
+                          description='Failed import to resume with the corrected file'),
+    ],
+    responses={
+        200: 'Import completed',
+        400: 'Invalid parameters, or the import failed (the job tells how many rows were imported)',
+        401: 'Unauthorized'
+    }
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def import_lessons(request):
+    """
+    Import a deck of flashcards from an uploaded file into a new or existing lesson
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Please provide a file'}, status=400)
+
+    job_id = request.data.get('job_id')
+    if job_id:
+        try:
+            job_id = int(job_id)
+        except ValueError:
+            return Response({'error': 'job_id must be an import job id'}, status=400)
+        job = ImportJob.objects.filter(id=job_id).first()
+        if job is None or (job.created_by_id != request.user.id and not request.user.is_staff):
+            return Response({'error': 'Unauthorized'}, status=401)
+        if job.status == ImportJob.COMPLETED:
+            return Response({'error': 'This import has already completed'}, status=400)
+    else:
+        file_format = request.data.get('file_format') or importer.guess_format(upload.name)
+        if file_format not in importer.FORMATS:
+            return Response({'error': f'file_format must be one of {", ".join(importer.FORMATS)}'}, status=400)
+
+        lesson_id = request.data.get('lesson_id')
+        if lesson_id:
+            try:
+                lesson_id = int(lesson_id)
+            except ValueError:
+                return Response({'error': 'lesson_id must be a lesson id'}, status=400)
+            lesson = Lesson.objects.filter(id=lesson_id).first()
+            if lesson is None or (lesson.created_by_id != request.user.id and not request.user.is_staff):
+                return Response({'error': 'Unauthorized'}, status=401)
+        else:
+            title = request.data.get('title')
+            category = request.data.get('category')
+            if title is None or category is None:
+                return Response({'error': 'Please provide lesson_id, or title and category'}, status=400)
+            lesson = Lesson.objects.create(title=title, description=request.data.get('description'),
+                                           category=category, created_by_id=request.user.id)
+        job = ImportJob.objects.create(lesson=lesson, created_by_id=request.user.id, file_name=upload.name,
+                                       file_format=file_format, chunk_size=settings.IMPORT_CHUNK_SIZE)
+
+    importer.run_import(job, io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline=''))
+    return Response(ImportJobSerializer(job).data, status=200 if job.status == ImportJob.COMPLETED else 400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_import_job(request, job_id):
+    """
+    Get the progress of a deck import
+    """
+    job = ImportJob.objects.filter(id=job_id).first()
+    if job is None or (job.created_by_id != request.user.id and not request.user.is_staff):
+        return Response({'error': 'Unauthorized'}, status=401)
+    return Response(ImportJobSerializer(job).data)
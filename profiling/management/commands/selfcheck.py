@@ -0,0 +1,73 @@
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+
+
+class Command(BaseCommand):
+    help = ('Report the effective server settings and check the database is reachable. Run at startup: fails on '
+            'settings unsafe for the production profile.')
+
+    def handle(self, *args, **options):
+        database = connection.settings_dict
+        pool = database.get('OPTIONS', {}).get('pool')
+        deck_cache = settings.CACHES['decks']
+        ratelimit_cache = settings.CACHES['ratelimit']['BACKEND']
+        rows = [
+            ('Profile', 'production' if settings.PRODUCTION else 'development'),
+            ('DEBUG', settings.DEBUG),
+            ('ALLOWED_HOSTS', ', '.join(settings.ALLOWED_HOSTS)),
+            ('Database', ' '.join(str(part) for part in (connection.vendor, database.get('HOST'), database['NAME'])
+                                  if part)),
+            ('Connection pool', pool if pool else 'off'),
+            ('CONN_MAX_AGE', database['CONN_MAX_AGE']),
+            ('CONN_HEALTH_CHECKS', database['CONN_HEALTH_CHECKS']),
+            ('ASYNC_VIEWS', settings.ASYNC_VIEWS),
+            ('Deck cache', f"{deck_cache['BACKEND'].rsplit('.', 1)[-1]}, {deck_cache['TIMEOUT']}s"),
+            ('Password hasher', settings.PASSWORD_HASHERS[0].rsplit('.', 1)[-1]),
+            ('Login hash workers', f'{settings.LOGIN_HASH_WORKERS} (+{settings.LOGIN_HASH_QUEUE_SIZE} queued)'),
+            ('Login rate limit', f'{ratelimit_cache.rsplit(".", 1)[-1]}' if settings.LOGIN_RATE_LIMIT_ENABLED
+             else 'off'),
+            ('QUERY_PROFILING_ENABLED', settings.QUERY_PROFILING_ENABLED),
+        ]
+        errors = []
+        warnings = []
+
+        if settings.PRODUCTION:
+            if settings.DEBUG:
+                errors.append('DEBUG is on in production: it exposes stack traces and keeps every query in memory')
+            if settings.SECRET_KEY == settings.INSECURE_SECRET_KEY:
+                errors.append('SECRET_KEY is the development key, set the SECRET_KEY environment variable')
+            if not pool and not database['CONN_MAX_AGE']:
+                warnings.append('Every request opens a new database connection, set DB_POOL or DB_CONN_MAX_AGE')
+            if deck_cache['BACKEND'].endswith('LocMemCache'):
+                warnings.append('Every worker has its own deck cache and serves changed decks for up to '
+                                f"{deck_cache['TIMEOUT']}s, set DECK_CACHE_BACKEND to a shared cache")
+            if settings.LOGIN_RATE_LIMIT_ENABLED and ratelimit_cache.endswith('LocMemCache'):
+                warnings.append('Every worker has its own login rate limits, set RATELIMIT_CACHE_BACKEND to a shared '
+                                'cache')
+            if settings.QUERY_PROFILING_ENABLED:
+                warnings.append('Query profiling adds overhead to every request')
+
+        try:
+            start = perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            rows.append(('Database round trip', f'{(perf_counter() - start) * 1000:.1f}ms'))
+            executor = MigrationExecutor(connection)
+            pending = executor.migration_plan(executor.loader.graph.leaf_nodes())
+            if pending:
+                warnings.append(f'{len(pending)} migrations are not applied')
+        except DatabaseError as e:
+            errors.append(f'Cannot reach the database: {e}')
+
+        width = max(len(name) for name, _ in rows)
+        for name, value in rows:
+            self.stdout.write(f'{name:<{width}}  {value}')
+        for warning in warnings:
+            self.stdout.write(self.style.WARNING(f'Warning: {warning}'))
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Self-check passed'))
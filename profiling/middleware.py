@@ -0,0 +1,39 @@
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import stats
+
+
+class QueryProfilingMiddleware:
+    """
+    Count and time the SQL queries of every request when QUERY_PROFILING_ENABLED is set.
+
+    Each response gets a Server-Timing header with the database time, the number of queries and the total time
+    spent in the view, and the numbers are aggregated per URL route for the staff stats endpoint. Queries run
+    while a streaming response is being consumed happen after the view returns and are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = stats.QueryRecorder()
+        start = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_time = perf_counter() - start
+
+        match = request.resolver_match
+        endpoint = f'{request.method} /{match.route}' if match else f'{request.method} (unresolved)'
+        stats.record(endpoint, recorder, total_time)
+        response['Server-Timing'] = (f'db;dur={recorder.duration * 1000:.3f};desc="{recorder.count} queries", '
+                                     f'total;dur={total_time * 1000:.3f}')
+        return response
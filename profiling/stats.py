@@ -0,0 +1,87 @@
+import heapq
+import threading
+from time import perf_counter
+
+from django.conf import settings
+
+
+class QueryRecorder:
+    """
+    connection.execute_wrapper callable counting and timing the queries of one request
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []  # min-heap of (duration, sql), at most QUERY_PROFILING_SLOWEST long
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            keep(self.slowest, (duration, sql))
+
+
+def keep(heap, item):
+    if len(heap) < settings.QUERY_PROFILING_SLOWEST:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.total_time = 0.0
+        self.slowest = []
+
+    def as_dict(self, endpoint):
+        return {
+            'endpoint': endpoint,
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 2),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time * 1000 / self.requests, 3),
+            'avg_total_ms': round(self.total_time * 1000 / self.requests, 3),
+            'slowest_queries': [{'duration_ms': round(duration * 1000, 3), 'sql': sql}
+                                for duration, sql in sorted(self.slowest, reverse=True)],
+        }
+
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+def record(endpoint, recorder, total_time):
+    with _lock:
+        stats = _endpoints.get(endpoint)
+        if stats is None:
+            stats = _endpoints[endpoint] = EndpointStats()
+        stats.requests += 1
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.db_time += recorder.duration
+        stats.total_time += total_time
+        for item in recorder.slowest:
+            keep(stats.slowest, item)
+
+
+def snapshot():
+    """
+    Aggregated stats of every endpoint seen by this process, most total database time first
+    """
+    with _lock:
+        rows = [stats.as_dict(endpoint) for endpoint, stats in _endpoints.items()]
+    return sorted(rows, key=lambda row: row['avg_db_ms'] * row['requests'], reverse=True)
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
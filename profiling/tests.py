@@ -0,0 +1,65 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from lessons.models import Lesson
+from users.models import User
+
+from . import stats
+
+
+@override_settings(QUERY_PROFILING_ENABLED=True)
+class QueryProfilingTests(APITestCase):
+    def setUp(self):
+        stats.reset()
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123',
+                                                        email='admin@example.com')
+        Lesson.objects.create(title='Lesson', category='Category', created_by=self.user, is_public=True)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/lessons/public')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="1 queries", total;dur=[\d.]+$')
+
+    def test_stats_are_aggregated_per_route(self):
+        for user_id in (self.user.id, self.admin_user.id):
+            self.client.get(f'/lessons/user/{user_id}')
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get('/profiling/stats')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        endpoint = next(row for row in response.data if row['endpoint'] == 'GET /lessons/user/<int:user_id>')
+        self.assertEqual(endpoint['requests'], 2)
+        # The user lookup only runs when the page is empty
+        self.assertEqual(endpoint['max_queries'], 2)
+        self.assertEqual(endpoint['avg_queries'], 1.5)
+        self.assertTrue(endpoint['slowest_queries'])
+
+    def test_stats_are_staff_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/profiling/stats')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryProfilingDisabledTests(APITestCase):
+    def test_no_header_when_disabled(self):
+        response = self.client.get('/lessons/public')
+        self.assertNotIn('Server-Timing', response)
+
+
+class SelfCheckTests(TestCase):
+    def test_reports_effective_settings(self):
+        output = StringIO()
+        call_command('selfcheck', stdout=output)
+        self.assertIn('CONN_MAX_AGE', output.getvalue())
+        self.assertIn('Database round trip', output.getvalue())
+        self.assertIn('Self-check passed', output.getvalue())
+
+    @override_settings(PRODUCTION=True, DEBUG=True)
+    def test_fails_on_unsafe_production_settings(self):
+        with self.assertRaisesMessage(CommandError, 'DEBUG is on in production'):
+            call_command('selfcheck', stdout=StringIO())
@@ -0,0 +1,7 @@
+from django.urls import path
+
+from .views import query_stats
+
+urlpatterns = [
+    path("stats", query_stats),
+]
@@ -0,0 +1,17 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import stats
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def query_stats(request):
+    """
+    Per endpoint query counts and database time recorded by this server process (staff only). DELETE resets them.
+    """
+    if request.method == 'DELETE':
+        stats.reset()
+        return Response({'message': 'Query stats reset'})
+    return Response(stats.snapshot())
@@ -0,0 +1,9 @@
+#!/bin/sh
+# Start the API: gunicorn with uvicorn workers in the production profile (PRODUCTION=True), runserver otherwise
+set -e
+
+if [ "$PRODUCTION" = "True" ]; then
+    python manage.py selfcheck
+    exec gunicorn -c gunicorn.conf.py QuizWhiz_backend.asgi:application
+fi
+exec python manage.py runserver "0.0.0.0:${PORT:-8080}"
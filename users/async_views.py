@@ -0,0 +1,17 @@
+"""
+Async twins of read views in views.py, routed instead of them under ASGI (see lessons.async_views)
+"""
+from .async_api import async_api_view, is_authenticated, json_response
+from .cache import aget_user
+from .serializers import UserSerializer
+
+
+@async_api_view(permission=is_authenticated)
+async def get_user(request):
+    """
+    Get details for the current user
+    """
+    user = await aget_user(request.user.id)
+    if user is None:
+        return json_response({'detail': 'User not found', 'code': 'user_not_found'}, status=401)
+    return json_response(UserSerializer(user).data)
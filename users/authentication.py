@@ -0,0 +1,91 @@
+from django.utils.functional import LazyObject, empty
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import cache
+
+
+# Claims users.tokens.RefreshToken adds to its tokens and TokenUser reads
+CLAIMS = ['username', 'is_staff']
+
+
+def _claim(name):
+    def get(self):
+        token = self.__dict__['token']
+        if name in token:
+            return token[name]
+        # Tokens issued before the claim was added
+        return getattr(self._user(), name)
+    return property(get)
+
+
+class TokenUser(LazyObject):
+    """
+    request.user built from the claims of an access token (see users.tokens.RefreshToken).
+
+    id, pk, username and is_staff are read from the token. Anything else, as well as using the object as a model
+    instance (assigning it to a foreign key, comparing it to a User), loads the user's row from users.cache.
+    """
+
+    def __init__(self, token):
+        super().__init__()
+        self.__dict__['token'] = token
+
+    def _setup(self):
+        user = cache.get_user(self.id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        self._wrapped = user
+
+    def _user(self):
+        if self._wrapped is empty:
+            self._setup()
+        return self._wrapped
+
+    async def aload_missing_claims(self):
+        """
+        Load the user's row, without blocking, if the token lacks one of the claims (tokens issued before they were
+        added), so async views can read them without a synchronous query
+        """
+        token = self.__dict__['token']
+        if self._wrapped is empty and not all(name in token for name in CLAIMS):
+            user = await cache.aget_user(self.id)
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            self._wrapped = user
+
+    @property
+    def id(self):
+        return self.__dict__['token'][api_settings.USER_ID_CLAIM]
+
+    pk = id
+    username = _claim('username')
+    is_staff = _claim('is_staff')
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        return True
+
+
+class JWTClaimsAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request SELECT of the user: request.user is a TokenUser, and the user's row
+    is only loaded, through the in-process cache, by views that need more than the token claims.
+
+    A deleted or deactivated user is rejected as soon as this process learns about it, from a signal or from a row
+    lookup that comes back empty. Until then their access token keeps working for views that only need the claims,
+    at most for ACCESS_TOKEN_LIFETIME.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if cache.is_revoked(user_id):
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return TokenUser(validated_token)
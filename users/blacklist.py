@@ -0,0 +1,94 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+class BloomFilter:
+    """
+    Set of strings answering "definitely not in" or "maybe in", with false positives at about error_rate once
+    capacity items were added
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+_lock = threading.Lock()
+_state = {'bloom': None, 'synced_at': 0, 'synced_since': None}
+
+
+def _rebuild():
+    # Only unexpired tokens matter: an expired one fails verification anyway
+    now = timezone.now()
+    jtis = BlacklistedToken.objects.filter(token__expires_at__gt=now).values_list('token__jti', flat=True)
+    count = jtis.count()
+    bloom = BloomFilter(max(count * 2, settings.TOKEN_BLACKLIST_BLOOM_CAPACITY),
+                        settings.TOKEN_BLACKLIST_BLOOM_ERROR_RATE)
+    for jti in jtis.iterator():
+        bloom.add(jti)
+    _state.update(bloom=bloom, synced_at=time.monotonic(), synced_since=now)
+
+
+def _sync():
+    # Re-read a margin before the last sync so rows committed late by slow transactions are not missed
+    now = timezone.now()
+    since = _state['synced_since'] - timedelta(seconds=settings.TOKEN_BLACKLIST_SYNC_INTERVAL)
+    bloom = _state['bloom']
+    for jti in BlacklistedToken.objects.filter(blacklisted_at__gte=since).values_list('token__jti', flat=True):
+        bloom.add(jti)
+    _state.update(synced_at=time.monotonic(), synced_since=now)
+
+
+def _current():
+    if _state['bloom'] is None or _state['bloom'].count > _state['bloom'].capacity:
+        _rebuild()
+    elif time.monotonic() - _state['synced_at'] >= settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+        _sync()
+    return _state['bloom']
+
+
+def is_blacklisted(jti):
+    """
+    Whether the refresh token with this jti was blacklisted.
+
+    A Bloom filter of the blacklisted jtis answers most checks without a query: only a "maybe" is confirmed
+    against the BlacklistedToken table. The filter is built on first use, picks up tokens blacklisted by this
+    process immediately and those blacklisted by other processes every TOKEN_BLACKLIST_SYNC_INTERVAL seconds.
+    """
+    with _lock:
+        maybe = jti in _current()
+    return maybe and BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+
+def add(jti):
+    with _lock:
+        if _state['bloom'] is not None:
+            _state['bloom'].add(jti)
+
+
+def reset():
+    with _lock:
+        _state.update(bloom=None, synced_at=0, synced_since=None)
@@ -0,0 +1,83 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import User
+
+_lock = threading.Lock()
+# user id -> (expires_at, user), least recently used first. A None user marks a deleted or deactivated account.
+_users = OrderedDict()
+
+
+def _lookup(user_id):
+    entry = _users.get(user_id)
+    if entry is None:
+        return False, None
+    if entry[0] <= time.monotonic():
+        del _users[user_id]
+        return False, None
+    _users.move_to_end(user_id)
+    return True, entry[1]
+
+
+def _store(user_id, user):
+    _users[user_id] = (time.monotonic() + settings.USER_CACHE_TTL, user)
+    _users.move_to_end(user_id)
+    while len(_users) > settings.USER_CACHE_SIZE:
+        _users.popitem(last=False)
+
+
+def get_user(user_id):
+    """
+    Return the active user with this id, or None, from the in-process LRU of user rows.
+
+    Rows are kept for USER_CACHE_TTL seconds and dropped as soon as the user is saved or deleted in this process.
+    Every caller gets its own copy, so changing it does not change the cached row.
+    """
+    with _lock:
+        found, user = _lookup(user_id)
+    if not found:
+        user = User.objects.filter(id=user_id, is_active=True).first()
+        with _lock:
+            _store(user_id, user)
+    return copy.copy(user)
+
+
+async def aget_user(user_id):
+    """
+    Async version of get_user
+    """
+    with _lock:
+        found, user = _lookup(user_id)
+    if not found:
+        user = await User.objects.filter(id=user_id, is_active=True).afirst()
+        with _lock:
+            _store(user_id, user)
+    return copy.copy(user)
+
+
+def is_revoked(user_id):
+    """
+    Whether this process knows the user to be deleted or deactivated. Never queries the database.
+    """
+    with _lock:
+        found, user = _lookup(user_id)
+    return found and user is None
+
+
+def invalidate(user_id):
+    with _lock:
+        _users.pop(user_id, None)
+
+
+def revoke(user_id):
+    with _lock:
+        _store(user_id, None)
+
+
+def clear():
+    with _lock:
+        _users.clear()
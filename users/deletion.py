@@ -0,0 +1,147 @@
+"""
+Deleting accounts in the background.
+
+Deleting a user through the ORM collects every lesson, flashcard, review and token of the account in Python and
+deletes them in one transaction, which for a heavy user outlasts the request and locks all those rows meanwhile. The
+delete endpoint only deactivates the account, blacklists its refresh tokens and queues a UserDeletionJob; run() then
+removes the account's rows a batch of ids at a time, one short transaction per batch, with the job's progress saved in
+the same transaction.
+
+The leaf tables (study data, reviews, import jobs, tokens) and the flashcards are removed with raw deletes, which
+skip collecting and signals. Every step only removes rows nothing left references, children before their parents,
+so the database never has to cascade. For flashcards, whose signals keep counters, caches and the search index up to
+date, deck_changed is sent once per lesson of the batch instead. Lessons are few and have signals of their own
+(category counts, search), so they go through the ORM, a batch at a time, once their cards are gone. The user row is
+deleted last, with the few rows still pointing at it (allauth's email addresses and social accounts).
+
+Every step deletes whatever still matches, so running a job again after a failure, or after its worker died, simply
+carries on.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from flashcards.models import Flashcard, LessonStudyStats, QuizSession, ReviewState, StudyAttempt
+from flashcards.signals import deck_changed
+from lessons.models import ImportJob, Lesson
+
+from . import blacklist as jti_blacklist
+from .models import User, UserDeletionJob
+
+
+def _steps(user_id):
+    # (name, queryset), in an order where no step leaves rows referencing the rows of a later one
+    return [
+        ('study_attempts', StudyAttempt.objects.filter(
+            Q(user=user_id) | Q(lesson__created_by=user_id) | Q(flashcard__created_by=user_id)
+            | Q(flashcard__lesson__created_by=user_id))),
+        ('study_stats', LessonStudyStats.objects.filter(Q(user=user_id) | Q(lesson__created_by=user_id))),
+        ('quiz_sessions', QuizSession.objects.filter(Q(user=user_id) | Q(lesson__created_by=user_id))),
+        ('review_states', ReviewState.objects.filter(
+            Q(user=user_id) | Q(flashcard__created_by=user_id) | Q(flashcard__lesson__created_by=user_id))),
+        ('import_jobs', ImportJob.objects.filter(Q(created_by=user_id) | Q(lesson__created_by=user_id))),
+        ('flashcards', Flashcard.objects.filter(Q(created_by=user_id) | Q(lesson__created_by=user_id))),
+        ('lessons', Lesson.objects.filter(created_by=user_id)),
+        ('blacklisted_tokens', BlacklistedToken.objects.filter(token__user=user_id)),
+        ('outstanding_tokens', OutstandingToken.objects.filter(user=user_id)),
+    ]
+
+
+def _delete_batch(name, model, ids):
+    batch = model.objects.filter(id__in=ids)
+    if name == 'lessons':
+        # Forks of these lessons lose their forked_from, and the lesson signals update the category counts and the
+        # search index
+        batch.delete()
+        return
+    lesson_ids = set(batch.values_list('lesson', flat=True)) if name == 'flashcards' else ()
+    batch._raw_delete(batch.db)
+    for lesson_id in lesson_ids:
+        deck_changed.send(sender=Flashcard, lesson_id=lesson_id)
+
+
+def run(job, batch_size=1000, progress=None):
+    """
+    Delete the rows of job's user batch_size at a time, then the user. progress(job) is called after every batch.
+    The job must have been claimed first. Raises whatever a batch raised, after marking the job failed.
+    """
+    try:
+        for name, queryset in _steps(job.user_id):
+            while True:
+                ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+                if not ids:
+                    break
+                with transaction.atomic():
+                    _delete_batch(name, queryset.model, ids)
+                    job.step = name
+                    job.deleted[name] = job.deleted.get(name, 0) + len(ids)
+                    job.save(update_fields=['step', 'deleted', 'updated_at'])
+                if progress:
+                    progress(job)
+
+        with transaction.atomic():
+            user = User.objects.filter(id=job.user_id).first()
+            if user is not None:
+                # Only small relations are left, such as allauth's email addresses
+                user.delete()
+            job.step = 'user'
+            job.deleted['user'] = 1 if user is not None else 0
+            job.status = UserDeletionJob.COMPLETED
+            job.error = ''
+            job.save(update_fields=['step', 'deleted', 'status', 'error', 'updated_at'])
+    except Exception as e:
+        job.status = UserDeletionJob.FAILED
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        raise
+    return job
+
+
+def _blacklist_tokens(user_id):
+    tokens = list(OutstandingToken.objects.filter(user=user_id, blacklistedtoken__isnull=True,
+                                                  expires_at__gt=timezone.now()).values_list('id', 'jti'))
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id) for token_id, _ in tokens],
+                                         ignore_conflicts=True)
+    for _, jti in tokens:
+        transaction.on_commit(lambda jti=jti: jti_blacklist.add(jti))
+
+
+def schedule(user):
+    """
+    Deactivate a user, blacklist their refresh tokens and queue the deletion of the account, returning its job.
+    Scheduling an account already queued returns the job queued before.
+    """
+    with transaction.atomic():
+        job = UserDeletionJob.objects.filter(user_id=user.id).exclude(status=UserDeletionJob.COMPLETED).first()
+        if job is None:
+            job = UserDeletionJob.objects.create(user_id=user.id, username=user.username)
+        if user.is_active:
+            # Saving revokes the user in this process's user cache (see users.signals), so their tokens stop working
+            # here. Other processes see the blacklisted refresh tokens within TOKEN_BLACKLIST_SYNC_INTERVAL.
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+        _blacklist_tokens(user.id)
+    return job
+
+
+def claimable():
+    """
+    Jobs a worker may take: pending and failed ones, and running ones whose worker has not saved any progress for
+    USER_DELETION_STALE_AFTER seconds, as it most likely died
+    """
+    stale = timezone.now() - timedelta(seconds=settings.USER_DELETION_STALE_AFTER)
+    return UserDeletionJob.objects.filter(
+        Q(status__in=[UserDeletionJob.PENDING, UserDeletionJob.FAILED])
+        | Q(status=UserDeletionJob.RUNNING, updated_at__lt=stale))
+
+
+def claim(job_id):
+    """
+    Mark a claimable job running, returning whether this caller got it (and no other worker did)
+    """
+    # update() skips auto_now, and a fresh updated_at is what keeps a second worker off a stale job just claimed
+    return bool(claimable().filter(id=job_id).update(status=UserDeletionJob.RUNNING, updated_at=timezone.now()))
@@ -0,0 +1,74 @@
+"""
+Password checks of the login endpoint, run on a small bounded pool of threads.
+
+Hashing a password is deliberately expensive (hundreds of milliseconds of CPU with the default hasher), so a burst of
+logins would otherwise take every worker thread and all of the CPU. Here at most LOGIN_HASH_WORKERS checks run at
+once per process and at most LOGIN_HASH_QUEUE_SIZE more wait for a thread. A login that finds the queue full, or
+that is not done within LOGIN_HASH_TIMEOUT seconds, fails fast with LoginBusy instead of adding to the pile. The
+hashers release the GIL, so the threads do run in parallel. With LOGIN_HASH_WORKERS = 0 checks run inline.
+
+Authentication goes through django.contrib.auth.authenticate() as before, which also rehashes the password with the
+preferred hasher (the first of PASSWORD_HASHERS) when it was stored with another one or with fewer iterations.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.contrib.auth import authenticate as django_authenticate
+from django.db import connections
+
+_lock = threading.Lock()
+_pool = {'executor': None, 'slots': None}
+
+
+class LoginBusy(Exception):
+    pass
+
+
+def _get_pool():
+    # Created on first use rather than at import, so worker processes forked by the server each get their own
+    with _lock:
+        if _pool['executor'] is None:
+            _pool['executor'] = ThreadPoolExecutor(max_workers=settings.LOGIN_HASH_WORKERS,
+                                                   thread_name_prefix='login-hash')
+            _pool['slots'] = threading.BoundedSemaphore(settings.LOGIN_HASH_WORKERS + settings.LOGIN_HASH_QUEUE_SIZE)
+        return _pool['executor'], _pool['slots']
+
+
+def _authenticate(credentials):
+    try:
+        return django_authenticate(**credentials)
+    finally:
+        # Looking the user up opened a connection for this pool thread, which no request cycle will close
+        connections.close_all()
+
+
+def authenticate(**credentials):
+    """
+    authenticate() on the login pool. Raises LoginBusy when the pool is saturated.
+    """
+    if not settings.LOGIN_HASH_WORKERS:
+        return django_authenticate(**credentials)
+    executor, slots = _get_pool()
+    if not slots.acquire(blocking=False):
+        raise LoginBusy
+    future = executor.submit(_authenticate, credentials)
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings.LOGIN_HASH_TIMEOUT)
+    except FutureTimeoutError:
+        # A check still waiting for a thread is dropped, one already hashing finishes and frees its slot then
+        future.cancel()
+        raise LoginBusy
+
+
+def reset():
+    """
+    Shut the pool down, the next login creates a new one from the current settings
+    """
+    with _lock:
+        executor = _pool['executor']
+        _pool['executor'] = _pool['slots'] = None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
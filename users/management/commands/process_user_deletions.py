@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users import deletion
+from users.models import UserDeletionJob
+
+
+class Command(BaseCommand):
+    help = ('Delete the accounts queued by the delete endpoint, with their lessons, flashcards, study data and '
+            'tokens, in batches. Failed jobs, and jobs whose worker stopped, are resumed. Meant to run periodically, '
+            'e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.USER_DELETION_BATCH_SIZE,
+                            help='Rows deleted per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        job_ids = list(deletion.claimable().order_by('id').values_list('id', flat=True))
+        completed = failed = 0
+        for job_id in job_ids:
+            # Another worker may have taken it meanwhile
+            if not deletion.claim(job_id):
+                continue
+            job = UserDeletionJob.objects.get(id=job_id)
+            try:
+                deletion.run(job, options['batch_size'], progress=self.report if options['verbosity'] > 1 else None)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'User {job.user_id} ({job.username}): {e}')
+                continue
+            completed += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {completed} users') + (f', {failed} failed' if failed else ''))
+
+    def report(self, job):
+        self.stdout.write(f'User {job.user_id}: {job.step}, {job.deleted[job.step]} deleted')
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='lesson_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='public_lesson_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -1,10 +1,39 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from lessons.mixins import CounterFieldsMixin
+
 
 # Create your models here.
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     # AbstractUser is a built-in Django model that provides a lot of the functionality we need for a user
     # So here we'll just add some additional information that we may or may not use
     bio = models.TextField(null=True, blank=True, max_length=500)
     google_id = models.CharField(max_length=255, null=True, blank=True)
+    # Number of lessons and of public lessons the user created, kept up to date by lessons.signals
+    lesson_count = models.IntegerField(default=0)
+    public_lesson_count = models.IntegerField(default=0)
+
+    counter_fields = ('lesson_count', 'public_lesson_count')
+
+
+class UserDeletionJob(models.Model):
+    """
+    Deletion of a deactivated account, carried out in batches by the process_user_deletions command (see
+    users.deletion). `deleted` counts the rows removed so far per step, and a failed job resumes where it stopped.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (COMPLETED, 'Completed'), (FAILED, 'Failed')]
+
+    # Not a foreign key, the job outlives the user
+    user_id = models.BigIntegerField(db_index=True)
+    username = models.CharField(max_length=150)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    step = models.CharField(max_length=32, blank=True)
+    deleted = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
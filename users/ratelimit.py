@@ -0,0 +1,51 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+ALIAS = 'ratelimit'
+
+# Serializes the read-modify-write of a bucket within this process. Across processes sharing a cache two requests
+# can race on the same bucket and both get the last token, which only matters during a burst that is limited anyway.
+_lock = threading.Lock()
+
+
+def take(key, capacity, per_minute):
+    """
+    Take one token from the token bucket stored under key, which holds up to `capacity` tokens and gets `per_minute`
+    back every minute. Return 0 if a token was taken, or the number of seconds until one will be available.
+    """
+    cache = caches[ALIAS]
+    rate = per_minute / 60
+    with _lock:
+        now = time.time()
+        tokens, updated_at = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated_at) * rate)
+        if tokens < 1:
+            return (1 - tokens) / rate
+        # A bucket left alone until it is full again is the same as no bucket
+        cache.set(key, (tokens - 1, now), timeout=int(capacity / rate) + 1)
+    return 0
+
+
+def _key(kind, value):
+    return f'login:{kind}:{hashlib.sha256(value.encode()).hexdigest()}'
+
+
+def take_login(request, username):
+    """
+    Take a login attempt from the buckets of the client's IP address and of the username, returning the number of
+    seconds to wait before trying again, or 0
+    """
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return 0
+    # get_ident() reads the client address the way DRF's throttles do, honouring REST_FRAMEWORK['NUM_PROXIES']
+    wait = take(_key('ip', BaseThrottle().get_ident(request)), settings.LOGIN_IP_BURST,
+                settings.LOGIN_IP_PER_MINUTE)
+    if not wait:
+        wait = take(_key('username', username.lower()), settings.LOGIN_USERNAME_BURST,
+                    settings.LOGIN_USERNAME_PER_MINUTE)
+    return wait
@@ -1,9 +1,21 @@
 import rest_framework.serializers as serializers
 
-from .models import User
+from lessons.serializers import ValuesSerializer
+
+from .models import User, UserDeletionJob
 
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'bio', 'google_id']
+        fields = ['id', 'username', 'email', 'bio', 'google_id', 'lesson_count', 'public_lesson_count']
+        read_only_fields = ['lesson_count', 'public_lesson_count']
+
+
+user_values_serializer = ValuesSerializer(UserSerializer)
+
+
+class UserDeletionJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserDeletionJob
+        fields = ['id', 'user_id', 'username', 'status', 'step', 'deleted', 'error', 'created_at', 'updated_at']
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def refresh_cached_user(sender, instance, **kwargs):
+    if instance.is_active:
+        cache.invalidate(instance.id)
+    else:
+        cache.revoke(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def revoke_cached_user(sender, instance, **kwargs):
+    cache.revoke(instance.id)
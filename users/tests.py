@@ -1,9 +1,27 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
+
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import QuerySet
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
 from rest_framework import status
-from rest_framework.test import APITestCase
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken as PlainRefreshToken
 
-from .models import User
+from flashcards.models import Flashcard, ReviewState, StudyAttempt
+from lessons.models import CategoryCount, Lesson
+
+from . import async_views, blacklist, cache, deletion, hashing, ratelimit
+from .models import User, UserDeletionJob
+from .tokens import RefreshToken
 
 
 class UserModelTests(TestCase):
@@ -181,7 +199,9 @@ class UserViewTests(APITestCase):
         url = '/users/delete'
         data = {'user_id': self.user.id}
         response = self.client.delete(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(User.objects.get(id=self.user.id).is_active)
+        call_command('process_user_deletions', stdout=StringIO())
         self.assertEqual(User.objects.filter(id=self.user.id).count(), 0)
 
     def test_delete_other_user(self):
@@ -197,5 +217,336 @@ class UserViewTests(APITestCase):
         url = '/users/delete'
         data = {'user_id': self.user.id}
         response = self.client.delete(url, data, format='json')
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(User.objects.get(id=self.user.id).is_active)
+        call_command('process_user_deletions', stdout=StringIO())
         self.assertEqual(User.objects.filter(id=self.user.id).count(), 0)
+
+
+class UserDeletionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.other = User.objects.create_user(username='other', password='12345')
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123')
+        self.lessons = [Lesson.objects.create(title=f'Lesson {i}', category='Math', created_by=self.user,
+                                              is_public=True) for i in range(3)]
+        Flashcard.objects.bulk_create(Flashcard(front_text='Q', back_text='A', lesson=lesson, created_by=self.user)
+                                      for lesson in self.lessons for _ in range(5))
+        # Rows of other users pointing at the user's lessons and cards
+        self.other_lesson = Lesson.objects.create(title='Other', category='Math', created_by=self.other)
+        self.authored = Flashcard.objects.create(front_text='Q', back_text='A', lesson=self.other_lesson,
+                                                 created_by=self.user)
+        self.kept = Flashcard.objects.create(front_text='Q', back_text='A', lesson=self.other_lesson,
+                                             created_by=self.other)
+        card = Flashcard.objects.filter(lesson=self.lessons[0]).first()
+        ReviewState.objects.create(user=self.other, flashcard=card, due_at=timezone.now())
+        StudyAttempt.objects.create(user=self.other, flashcard=card, lesson=self.lessons[0], correct=True,
+                                    response_time_ms=100)
+        self.fork = Lesson.objects.create(title='Fork', category='Math', created_by=self.other,
+                                          forked_from=self.lessons[0])
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def test_delete_deactivates_and_queues(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.delete('/users/delete', {'user_id': self.user.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['job']['status'], UserDeletionJob.PENDING)
+        self.assertEqual(Lesson.objects.filter(created_by=self.user).count(), 3)
+        self.assertFalse(self.client.login(username='testuser', password='12345'))
+        # Deleting again returns the same job
+        again = self.client.delete('/users/delete', {'user_id': self.user.id}, format='json')
+        self.assertEqual(again.data['job']['id'], response.data['job']['id'])
+
+    def test_delete_blacklists_refresh_tokens(self):
+        self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            deletion.schedule(self.user)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=self.refresh['jti']).exists())
+        # Even in a process whose user cache still holds the user as active
+        cache.clear()
+        with mock.patch.object(cache, 'get_user', return_value=self.user):
+            response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stale_running_job_is_taken_over(self):
+        job = deletion.schedule(self.user)
+        self.assertTrue(deletion.claim(job.id))
+        self.assertFalse(deletion.claim(job.id))
+        with override_settings(USER_DELETION_STALE_AFTER=60):
+            UserDeletionJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=30))
+            call_command('process_user_deletions', stdout=StringIO())
+            job.refresh_from_db()
+            self.assertEqual(job.status, UserDeletionJob.RUNNING)
+            UserDeletionJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=90))
+            call_command('process_user_deletions', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserDeletionJob.COMPLETED)
+
+    def test_worker_deletes_in_batches(self):
+        self.client.force_authenticate(user=self.admin_user)
+        job_id = self.client.delete('/users/delete', {'user_id': self.user.id}, format='json').data['job']['id']
+        call_command('process_user_deletions', batch_size=4, stdout=StringIO())
+
+        job = self.client.get(f'/users/delete/{job_id}').data
+        self.assertEqual(job['status'], UserDeletionJob.COMPLETED)
+        self.assertEqual(job['deleted']['flashcards'], 16)
+        self.assertEqual((job['deleted']['lessons'], job['deleted']['user']), (3, 1))
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertFalse(Flashcard.objects.filter(created_by=self.user.id).exists())
+        self.assertFalse(OutstandingToken.objects.filter(user=self.user.id).exists())
+        self.assertFalse(ReviewState.objects.exists() or StudyAttempt.objects.exists())
+
+        # Other users keep their rows, with their counters and the fork updated
+        self.assertEqual(list(Flashcard.objects.filter(lesson=self.other_lesson)), [self.kept])
+        self.other_lesson.refresh_from_db()
+        self.assertEqual(self.other_lesson.card_count, 1)
+        self.fork.refresh_from_db()
+        self.assertIsNone(self.fork.forked_from_id)
+        self.assertEqual(CategoryCount.objects.get(category='Math').lesson_count, 2)
+
+    def test_attempts_on_cards_moved_into_the_users_lessons_are_deleted(self):
+        # Recorded on another user's card, which was then moved into one of the user's lessons
+        StudyAttempt.objects.create(user=self.other, flashcard=self.kept, lesson=self.other_lesson, correct=True,
+                                    response_time_ms=100)
+        self.kept.lesson = self.lessons[1]
+        self.kept.save()
+        job = deletion.schedule(self.user)
+        self.assertTrue(deletion.claim(job.id))
+        deletion.run(job, batch_size=100)
+        self.assertEqual(job.status, UserDeletionJob.COMPLETED)
+        self.assertFalse(StudyAttempt.objects.exists())
+
+    def test_failed_job_resumes(self):
+        job = deletion.schedule(self.user)
+        self.assertTrue(deletion.claim(job.id))
+        with mock.patch.object(QuerySet, 'delete', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                deletion.run(job, batch_size=100)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.step), (UserDeletionJob.FAILED, 'boom', 'flashcards'))
+
+        call_command('process_user_deletions', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, UserDeletionJob.COMPLETED)
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+
+
+class JWTClaimsAuthenticationTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.authorize(self.user)
+
+    def authorize(self, user, token_class=RefreshToken):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token_class.for_user(user).access_token}')
+
+    def test_claims_only_requests_skip_the_user_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/lessons/public')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_row_is_cached(self):
+        self.client.get('/users/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/users/')
+        self.assertEqual(response.data['email'], 'testuser@example.com')
+
+    def test_update_invalidates_cached_user(self):
+        self.client.get('/users/')
+        self.client.patch('/users/update', {'bio': 'Updated bio'}, format='json')
+        response = self.client.get('/users/')
+        self.assertEqual(response.data['bio'], 'Updated bio')
+
+    def test_deleted_user_is_rejected(self):
+        response = self.client.delete('/users/delete', {'user_id': self.user.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        response = self.client.get('/lessons/public')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_claim(self):
+        admin_user = User.objects.create_superuser(username='admin', password='admin123', email='admin@example.com')
+        self.authorize(admin_user)
+        with self.assertNumQueries(0):
+            response = self.client.get('/profiling/stats')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_copies_claims_from_the_user_row(self):
+        admin_user = User.objects.create_superuser(username='admin', password='admin123', email='admin@example.com')
+        refresh = RefreshToken.for_user(admin_user)
+        admin_user.is_staff = False
+        admin_user.username = 'demoted'
+        admin_user.save()
+        response = self.client.post('/users/refresh', {'refresh': str(refresh)}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get('/lessons/').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get('/users/').data['username'], 'demoted')
+
+    def test_token_without_claims(self):
+        self.authorize(self.user, token_class=PlainRefreshToken)
+        response = self.client.get('/lessons/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/users/')
+        self.assertEqual(response.data['username'], 'testuser')
+
+
+class TokenBlacklistTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+        self.refresh = RefreshToken.for_user(self.user)
+        blacklist.reset()
+
+    def test_bloom_filter(self):
+        bloom = blacklist.BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f'jti-{i}' for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_refresh(self):
+        response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        response = self.client.get('/users/')
+        self.assertEqual(response.data['username'], 'testuser')
+
+    def test_refresh_checks_skip_the_database(self):
+        self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_refresh_after_logout(self):
+        self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/users/logout', {'refresh': str(self.refresh)}, format='json')
+        response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=0)
+    def test_picks_up_tokens_blacklisted_elsewhere(self):
+        self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        # As another process would, without going through this process' filter
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=self.refresh['jti']))
+        response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_of_inactive_or_deleted_user(self):
+        self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.user.delete()
+        cache.clear()
+        response = self.client.post('/users/refresh', {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_without_token(self):
+        response = self.client.post('/users/refresh', {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_tokens(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        self.refresh.blacklist()
+
+        call_command('prune_tokens', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.refresh['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class AsyncUserViewTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345', email='testuser@example.com')
+
+    def get_user(self, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        return async_to_sync(async_views.get_user)(AsyncRequestFactory().get('/users/', headers=headers))
+
+    def test_get_user(self):
+        response = self.get_user(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(response.content, self.client.get('/users/').content)
+
+    def test_authentication_errors(self):
+        response = self.get_user()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.content, self.client.get('/users/').content)
+        response = self.get_user('not-a-token')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content)['code'], 'token_not_valid')
+
+
+@override_settings(LOGIN_RATE_LIMIT_ENABLED=True, LOGIN_IP_BURST=3, LOGIN_IP_PER_MINUTE=1, LOGIN_USERNAME_BURST=2,
+                   LOGIN_USERNAME_PER_MINUTE=1)
+class LoginRateLimitTests(APITestCase):
+    def setUp(self):
+        caches[ratelimit.ALIAS].clear()
+        User.objects.create_user(username='testuser', password='12345')
+
+    def login(self, username, password='wrong'):
+        return self.client.post('/users/login', {'username': username, 'password': password}, format='json')
+
+    def test_username_bucket(self):
+        self.assertEqual(self.login('testuser').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('TestUser', '12345').status_code, status.HTTP_200_OK)
+        response = self.login('testuser', '12345')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_ip_bucket(self):
+        for username in ('first', 'second', 'third'):
+            self.assertEqual(self.login(username).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.login('testuser', '12345').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.client.defaults['REMOTE_ADDR'] = '10.0.0.2'
+        self.assertEqual(self.login('testuser', '12345').status_code, status.HTTP_200_OK)
+
+    def test_tokens_come_back(self):
+        self.assertEqual(ratelimit.take('bucket', 1, 60), 0)
+        self.assertAlmostEqual(ratelimit.take('bucket', 1, 60), 1, places=1)
+
+
+class PasswordHasherTests(APITestCase):
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher',
+                                         'django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_login_upgrades_the_hash(self):
+        user = User.objects.create_user(username='testuser')
+        user.password = make_password('12345', hasher='md5')
+        user.save(update_fields=['password'])
+
+        response = self.client.post('/users/login', {'username': 'testuser', 'password': '12345'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('12345'))
+
+
+@override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_QUEUE_SIZE=0)
+class LoginPoolTests(TransactionTestCase):
+    def setUp(self):
+        hashing.reset()
+        self.addCleanup(hashing.reset)
+        User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+
+    def login(self):
+        return self.client.post('/users/login', {'username': 'testuser', 'password': '12345'}, format='json')
+
+    def test_login_on_the_pool(self):
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_saturated_pool_fails_fast(self):
+        _, slots = hashing._get_pool()
+        slots.acquire()
+        try:
+            response = self.login()
+        finally:
+            slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
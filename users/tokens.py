@@ -0,0 +1,29 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import blacklist as jti_blacklist
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    Refresh token carrying the username and staff flag, which its access tokens copy, so authenticating a request
+    does not need the user's row (see users.authentication). Blacklist checks go through users.blacklist.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.username
+        token['is_staff'] = user.is_staff
+        return token
+
+    def check_blacklist(self):
+        if jti_blacklist.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        blacklisted_token = super().blacklist()
+        jti_blacklist.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted_token
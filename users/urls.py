@@ -1,14 +1,21 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import list_users, login, logout, get_user, signup, get_user_by_id, update_user, delete_user
+from .views import list_users, login, logout, refresh, get_user, signup, get_user_by_id, update_user, delete_user, \
+    get_deletion_job
+
+if settings.ASYNC_VIEWS:
+    from .async_views import get_user  # noqa: F811
 
 urlpatterns = [
     path("", get_user),
     path("list", list_users),
     path("login", login),
     path("logout", logout),
+    path("refresh", refresh),
     path("signup", signup),
     path("update", update_user),
     path("delete", delete_user),
+    path("delete/<int:job_id>", get_deletion_job),
     path("user/<int:user_id>", get_user_by_id),
 ]
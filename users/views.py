@@ -1,16 +1,19 @@
+import math
+
 from django.shortcuts import render
-# import check_password
-from django.contrib.auth import authenticate
 from django.core.validators import validate_email
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import permission_classes, api_view
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 
-from .models import User
-from .serializers import UserSerializer
+from . import cache, deletion, hashing, ratelimit
+from .models import User, UserDeletionJob
+from .serializers import UserDeletionJobSerializer, UserSerializer, user_values_serializer
+from .tokens import RefreshToken
 # Create your views here.
 @api_view(['GET'])
 # This should be changed to IsAdminUser later, when using a cloud db
@@ -19,9 +22,8 @@ def list_users(request):
     """
     List all users (Admin only)
     """
-    users = User.objects.all()
-    serializer = UserSerializer(users, many=True)
-    return Response(serializer.data)
+    users = user_values_serializer.values(User.objects.all())
+    return Response(user_values_serializer.serialize(users))
 
 @swagger_auto_schema(
     method='post',
@@ -35,7 +37,9 @@ def list_users(request):
     ),
     responses={
         200: 'Login successful',
-        401: 'Invalid credentials'
+        401: 'Invalid credentials',
+        429: 'Too many login attempts from this address or for this username',
+        503: 'Too many logins in progress'
     }
 )
 @api_view(['POST'])
@@ -50,7 +54,15 @@ def login(request):
     if username is None or password is None:
         return Response({'error': 'Please provide both username and password'}, status=401)
 
-    user = authenticate(username=username, password=password)
+    wait = ratelimit.take_login(request, str(username))
+    if wait:
+        return Response({'error': 'Too many login attempts, try again later'}, status=429,
+                        headers={'Retry-After': str(math.ceil(wait))})
+    try:
+        user = hashing.authenticate(username=username, password=password)
+    except hashing.LoginBusy:
+        return Response({'error': 'Too many logins in progress, try again shortly'}, status=503,
+                        headers={'Retry-After': '1'})
     if user is None:
         return Response({'error': 'Invalid credentials'}, status=401)
 
@@ -92,6 +104,43 @@ def logout(request):
         return Response({"error": str(e)}, status=400)
 
 
+@swagger_auto_schema(
+    method='post',
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'refresh': openapi.Schema(type=openapi.TYPE_STRING, description='Refresh token')
+        },
+        required=['refresh']
+    ),
+    responses={
+        200: 'New access token',
+        400: 'Missing refresh token',
+        401: 'Invalid, expired or blacklisted refresh token'
+    }
+)
+@api_view(['POST'])
+def refresh(request):
+    """
+    Get a new access token for a refresh token that was not blacklisted by logging out, of a user still active
+    """
+    refresh_token = request.data.get('refresh')
+    if not refresh_token:
+        return Response({'error': 'Please provide the refresh token'}, status=400)
+    try:
+        token = RefreshToken(refresh_token)
+    except TokenError as e:
+        return Response({'error': str(e)}, status=401)
+    user = cache.get_user(token.get(api_settings.USER_ID_CLAIM))
+    if user is None:
+        return Response({'error': 'User not found'}, status=401)
+    access = token.access_token
+    # The claims views trust (see users.authentication) come from the row, which may have changed since the login
+    access['username'] = user.username
+    access['is_staff'] = user.is_staff
+    return Response({'access': str(access)})
+
+
 @swagger_auto_schema(
     method='get',
     responses={
@@ -212,7 +261,8 @@ def update_user(request):
             return Response({'error': 'You do not have permission to update this user'}, status=403)
         user_to_update = User.objects.get(id=user_data['user_id'])
     else:
-        user_to_update = user
+        # request.user can be a cached row up to USER_CACHE_TTL old, so save over a fresh one
+        user_to_update = User.objects.get(id=user.id)
 
     if 'password' in user_data:
         user_to_update.set_password(user_data['password'])
@@ -245,8 +295,9 @@ def update_user(request):
         required=['user_id']
     ),
     responses={
-        200: 'User deleted successfully',
-        403: 'You do not have permission to delete this user'
+        202: 'User deactivated, the account is deleted in the background',
+        403: 'You do not have permission to delete this user',
+        404: 'User not found'
     },
     security=[{'Bearer': []}],
 )
@@ -254,15 +305,29 @@ def update_user(request):
 @permission_classes([IsAuthenticated])
 def delete_user(request):
     """
-    Delete a user
+    Delete a user. The account is deactivated at once and its data deleted in the background by the
+    process_user_deletions command.
     """
     user = request.user
     user_id_to_delete = request.data.get('user_id')
     if not user.is_staff and user.id != user_id_to_delete:
         return Response({'error': 'You do not have permission to delete this user'}, status=403)
 
-    user_to_delete = User.objects.get(id=user_id_to_delete)
+    user_to_delete = User.objects.filter(id=user_id_to_delete).first()
     if user_to_delete is None:
         return Response({'error': 'User not found'}, status=404)
-    user_to_delete.delete()
-    return Response({'message': 'User deleted successfully'}, status=200)
\ No newline at end of file
+    job = deletion.schedule(user_to_delete)
+    return Response({'message': 'User scheduled for deletion', 'job': UserDeletionJobSerializer(job).data},
+                    status=202)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_deletion_job(request, job_id):
+    """
+    Get the progress of an account deletion (Admin only)
+    """
+    job = UserDeletionJob.objects.filter(id=job_id).first()
+    if job is None:
+        return Response({'error': 'Deletion job not found'}, status=404)
+    return Response(UserDeletionJobSerializer(job).data)
\ No newline at end of file